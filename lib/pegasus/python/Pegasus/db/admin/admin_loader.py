@@ -19,7 +19,7 @@ log = logging.getLogger(__name__)
 #-------------------------------------------------------------------
 # DB Admin configuration
 #-------------------------------------------------------------------
-CURRENT_DB_VERSION = 6
+CURRENT_DB_VERSION = 8
 DB_MIN_VERSION = 4
 
 COMPATIBILITY = {
@@ -27,7 +27,7 @@ COMPATIBILITY = {
     '4.4.0': 2, '4.4.1': 2, '4.4.2': 2,
     '4.5.0': 4, '4.5.1': 4, '4.5.2': 4, '4.5.3': 4, '4.5.4': 5,
     '4.6.0': 6, '4.6.1': 6, '4.6.2': 6,
-    '4.7.0': 6
+    '4.7.0': 8
 }
 #-------------------------------------------------------------------
 
@@ -0,0 +1,515 @@
+"""
+Query plan analysis of a workflow (STAMPEDE) database.
+
+The queries of StampedeStatistics, StampedeWorkflowStatistics, the
+dashboard and the monitoring REST API are run once for a workflow of the
+database, and every SELECT statement they send is recorded. Each
+statement is then explained by the database, and the tables it reads
+without an index are reported, along with the indexes of the schema that
+are missing from the database and the columns an index could cover, when
+no existing index covers them already.
+
+Usage::
+ analysis = analyze(session, dburi)
+ print format_report(analysis)
+"""
+
+import re
+import logging
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.expression import BinaryExpression, ClauseElement, Select
+from sqlalchemy.schema import Column, Table
+
+from Pegasus.db.schema import *
+from Pegasus.db.admin.admin_loader import DBAdminError
+
+log = logging.getLogger(__name__)
+
+# Tables of the workflow database the report looks at
+WORKFLOW_TABLES = [st_workflow, st_workflowstate, st_workflow_meta, st_workflow_files, st_host, st_job,
+                   st_job_edge, st_job_instance, st_jobstate, st_task, st_task_edge, st_task_meta,
+                   st_invocation, st_job_instance_summary]
+
+_EQUALITY_OPERATORS = set([operators.eq, operators.in_op, operators.is_])
+_RANGE_OPERATORS = set([operators.lt, operators.le, operators.gt, operators.ge, operators.between_op])
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+# A statement sent by the query set, and the plan of the database for it
+Statement = namedtuple('Statement', ['sql', 'parameters', 'clauseelement', 'sources'])
+Scan = namedtuple('Scan', ['table', 'detail', 'statement'])
+
+
+class _Collector(object):
+    """
+    Records the SELECT statements sent to the database while it is the
+    active collector.
+    """
+    def __init__(self):
+        self.source = None
+        self.clauseelement = None
+        self.statements = []
+        self._by_sql = {}
+
+    def add(self, sql, parameters):
+        # Only the statements of the queries, not the ones of the
+        # constructors (e.g. the schema check of the connection)
+        if self.source is None or not sql.lstrip().upper().startswith("SELECT"):
+            return
+        statement = self._by_sql.get(sql)
+        if statement is None:
+            statement = Statement(sql, parameters, self.clauseelement, [])
+            self._by_sql[sql] = statement
+            self.statements.append(statement)
+        if self.source not in statement.sources:
+            statement.sources.append(self.source)
+
+_collector = None
+_listening = False
+
+def _before_execute(conn, clauseelement, multiparams, params):
+    if _collector is not None:
+        _collector.clauseelement = clauseelement if isinstance(clauseelement, ClauseElement) else None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collector is not None and not executemany:
+        _collector.add(statement, parameters)
+
+def _listen():
+    # event.remove is not available in all the SQLAlchemy versions we
+    # support, so the listeners stay, and only record while a collector
+    # is active
+    global _listening
+    if not _listening:
+        event.listen(Engine, "before_execute", _before_execute)
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        _listening = True
+
+
+def _sample(session, wf_uuid=None):
+    """
+    Returns the ids of a workflow of the database, and of one of its jobs,
+    job instances, invocations, tasks and hosts, to run the queries with.
+    """
+    q = session.query(Workflow)
+    if wf_uuid is not None:
+        q = q.filter(Workflow.wf_uuid == wf_uuid)
+    else:
+        q = q.filter(Workflow.wf_id == Workflow.root_wf_id).order_by(Workflow.wf_id)
+    wf = q.first()
+    if wf is None:
+        if wf_uuid is not None:
+            raise DBAdminError("Workflow %s not found in the database" % wf_uuid)
+        raise DBAdminError("There is no workflow in the database to analyze the queries with")
+
+    sample = {"wf_uuid": wf.wf_uuid, "wf_id": wf.wf_id, "root_wf_id": wf.root_wf_id,
+              "job_id": None, "job_instance_id": None, "invocation_id": None, "task_id": None, "host_id": None}
+
+    q = session.query(Job.job_id, JobInstance.job_instance_id, JobInstance.host_id)
+    q = q.filter(Job.wf_id == wf.wf_id).filter(Job.job_id == JobInstance.job_id)
+    row = q.order_by(JobInstance.job_instance_id).first()
+    if row is not None:
+        sample["job_id"], sample["job_instance_id"], sample["host_id"] = row
+        q = session.query(Invocation.invocation_id).filter(Invocation.job_instance_id == row.job_instance_id)
+        sample["invocation_id"] = q.order_by(Invocation.invocation_id).limit(1).scalar()
+
+    q = session.query(Task.task_id).filter(Task.wf_id == wf.wf_id)
+    sample["task_id"] = q.order_by(Task.task_id).limit(1).scalar()
+
+    return sample
+
+def _statistics_queries(dburi, sample):
+    from Pegasus.db.workflow.stampede_statistics import StampedeStatistics
+    from Pegasus.db.workflow.stampede_wf_statistics import StampedeWorkflowStatistics
+
+    def run(name, stats):
+        yield "%s.get_workflow_states" % name, stats.get_workflow_states
+        yield "%s.get_workflow_retries" % name, stats.get_workflow_retries
+        yield "%s.get_workflow_cum_job_wall_time" % name, stats.get_workflow_cum_job_wall_time
+        yield "%s.get_submit_side_job_wall_time" % name, stats.get_submit_side_job_wall_time
+        for job_filter in ["nonsub", "subwf"]:
+            yield "%s.set_job_filter" % name, lambda: stats.set_job_filter(job_filter)
+            yield "%s.get_total_tasks_status" % name, stats.get_total_tasks_status
+            yield "%s.get_total_succeeded_tasks_status" % name, stats.get_total_succeeded_tasks_status
+            yield "%s.get_total_failed_tasks_status" % name, stats.get_total_failed_tasks_status
+            yield "%s.get_total_tasks_retries" % name, stats.get_total_tasks_retries
+            yield "%s.get_total_jobs_status" % name, stats.get_total_jobs_status
+            yield "%s.get_total_succeeded_failed_jobs_status" % name, stats.get_total_succeeded_failed_jobs_status
+            yield "%s.get_total_jobs_retries" % name, stats.get_total_jobs_retries
+        yield "%s.set_job_filter" % name, lambda: stats.set_job_filter('all')
+        yield "%s.get_transformation_statistics" % name, stats.get_transformation_statistics
+        if hasattr(stats, "get_job_statistics"):
+            yield "%s.get_job_statistics" % name, stats.get_job_statistics
+        yield "%s.set_time_filter" % name, lambda: stats.set_time_filter('hour')
+        yield "%s.get_jobs_run_by_time" % name, stats.get_jobs_run_by_time
+        yield "%s.get_invocation_by_time" % name, stats.get_invocation_by_time
+        yield "%s.get_jobs_run_by_time_per_host" % name, stats.get_jobs_run_by_time_per_host
+        yield "%s.get_invocation_by_time_per_host" % name, stats.get_invocation_by_time_per_host
+
+    for name, expand in [("StampedeStatistics", False), ("StampedeStatistics(expanded)", True)]:
+        stats = StampedeStatistics(dburi, expand)
+        try:
+            stats.initialize(sample["wf_uuid"])
+            for query in run(name, stats):
+                yield query
+            yield "%s.get_descendant_workflow_ids" % name, stats.get_descendant_workflow_ids
+        finally:
+            stats.close()
+
+    stats = StampedeWorkflowStatistics(dburi)
+    try:
+        stats.initialize([sample["wf_uuid"]])
+        for query in run("StampedeWorkflowStatistics", stats):
+            yield query
+    finally:
+        stats.close()
+
+def _dashboard_queries(dburi, sample):
+    from Pegasus.service.dashboard.queries import WorkflowInfo
+
+    info = WorkflowInfo(dburi, wf_id=sample["wf_id"])
+    try:
+        yield "WorkflowInfo.get_workflow_information", info.get_workflow_information
+        yield "WorkflowInfo.get_workflow_job_counts", info.get_workflow_job_counts
+        yield "WorkflowInfo.get_failed_jobs", info.get_failed_jobs
+        yield "WorkflowInfo.get_successful_jobs", info.get_successful_jobs
+        yield "WorkflowInfo.get_other_jobs", info.get_other_jobs
+        yield "WorkflowInfo.get_failing_jobs", info.get_failing_jobs
+        yield "WorkflowInfo.get_sub_workflows", info.get_sub_workflows
+        if sample["job_instance_id"] is not None:
+            job_id, job_instance_id = sample["job_id"], sample["job_instance_id"]
+            yield "WorkflowInfo.get_job_information", lambda: info.get_job_information(job_id, job_instance_id)
+            yield "WorkflowInfo.get_job_instances", lambda: info.get_job_instances(job_id)
+            yield "WorkflowInfo.get_job_states", lambda: info.get_job_states(job_id, job_instance_id)
+            yield "WorkflowInfo.get_successful_job_invocations", \
+                lambda: info.get_successful_job_invocations(job_id, job_instance_id)
+            yield "WorkflowInfo.get_failed_job_invocations", \
+                lambda: info.get_failed_job_invocations(job_id, job_instance_id)
+    finally:
+        info.close()
+
+def _monitoring_queries(dburi, sample):
+    from Pegasus.service.monitoring.queries import StampedeWorkflowQueries
+
+    queries = StampedeWorkflowQueries(dburi, use_cache=False)
+    try:
+        wf_id, job_id, job_instance_id = sample["wf_id"], sample["job_id"], sample["job_instance_id"]
+        yield "StampedeWorkflowQueries.get_workflows", lambda: queries.get_workflows(sample["root_wf_id"])
+        yield "StampedeWorkflowQueries.get_workflow", lambda: queries.get_workflow(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_meta", lambda: queries.get_workflow_meta(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_files", lambda: queries.get_workflow_files(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_state", lambda: queries.get_workflow_state(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_state(recent)", \
+            lambda: queries.get_workflow_state(wf_id, recent=True)
+        yield "StampedeWorkflowQueries.get_workflow_jobs", lambda: queries.get_workflow_jobs(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_hosts", lambda: queries.get_workflow_hosts(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_tasks", lambda: queries.get_workflow_tasks(wf_id)
+        yield "StampedeWorkflowQueries.get_workflow_invocations", lambda: queries.get_workflow_invocations(wf_id)
+        yield "StampedeWorkflowQueries.get_running_jobs", lambda: queries.get_running_jobs(wf_id)
+        yield "StampedeWorkflowQueries.get_successful_jobs", lambda: queries.get_successful_jobs(wf_id)
+        yield "StampedeWorkflowQueries.get_failed_jobs", lambda: queries.get_failed_jobs(wf_id)
+        yield "StampedeWorkflowQueries.get_failing_jobs", lambda: queries.get_failing_jobs(wf_id)
+        if job_instance_id is not None:
+            yield "StampedeWorkflowQueries.get_job", lambda: queries.get_job(job_id)
+            yield "StampedeWorkflowQueries.get_job_tasks", lambda: queries.get_job_tasks(wf_id, job_id)
+            yield "StampedeWorkflowQueries.get_job_instances", lambda: queries.get_job_instances(wf_id, job_id)
+            yield "StampedeWorkflowQueries.get_job_instances(recent)", \
+                lambda: queries.get_job_instances(wf_id, job_id, recent=True)
+            yield "StampedeWorkflowQueries.get_job_instance", lambda: queries.get_job_instance(job_instance_id)
+            yield "StampedeWorkflowQueries.get_job_instance_states", \
+                lambda: queries.get_job_instance_states(wf_id, job_id, job_instance_id)
+            yield "StampedeWorkflowQueries.get_job_instance_states(recent)", \
+                lambda: queries.get_job_instance_states(wf_id, job_id, job_instance_id, recent=True)
+            yield "StampedeWorkflowQueries.get_job_instance_invocations", \
+                lambda: queries.get_job_instance_invocations(wf_id, job_id, job_instance_id)
+        if sample["invocation_id"] is not None:
+            yield "StampedeWorkflowQueries.get_invocation", lambda: queries.get_invocation(sample["invocation_id"])
+        if sample["host_id"] is not None:
+            yield "StampedeWorkflowQueries.get_host", lambda: queries.get_host(sample["host_id"])
+        if sample["task_id"] is not None:
+            yield "StampedeWorkflowQueries.get_task", lambda: queries.get_task(sample["task_id"])
+            yield "StampedeWorkflowQueries.get_task_meta", lambda: queries.get_task_meta(sample["task_id"])
+    finally:
+        queries.close()
+
+# The query set: each entry generates (name, callable) pairs for a sample
+QUERY_SETS = [
+    ("statistics", _statistics_queries),
+    ("dashboard", _dashboard_queries),
+    ("monitoring", _monitoring_queries),
+]
+
+def collect_statements(dburi, sample):
+    """
+    Runs the query set for the sample workflow, and returns the distinct
+    SELECT statements sent to the database.
+    """
+    global _collector
+    _listen()
+    collector = _Collector()
+
+    for set_name, query_set in QUERY_SETS:
+        _collector = collector
+        try:
+            for name, query in query_set(dburi, sample):
+                collector.source = name
+                try:
+                    query()
+                except Exception, e:
+                    log.warning("Query %s failed: %s" % (name, e))
+                collector.source = None
+        except ImportError, e:
+            # The dashboard and monitoring queries need the service dependencies
+            log.warning("Skipping the %s queries: %s" % (set_name, e))
+        finally:
+            _collector = None
+
+    return collector.statements
+
+
+def explain(session, statement):
+    """
+    Returns the plan of the database for a statement, as a list of scans:
+    (table, detail) tuples, where table is None for the steps that are not
+    full scans of a table.
+    """
+    dialect = session.get_bind().dialect.name
+    cursor = session.connection().connection.cursor()
+    try:
+        if dialect == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + statement.sql, statement.parameters)
+            plan = []
+            for row in cursor.fetchall():
+                detail = row[-1]
+                m = _SQLITE_SCAN.match(detail)
+                # SCAN of a table without an index, or of a whole index
+                if m and m.group(1).upper() not in ("SUBQUERY", "CONSTANT"):
+                    plan.append((m.group(1), detail))
+                else:
+                    plan.append((None, detail))
+            return plan
+
+        if dialect == "mysql":
+            cursor.execute("EXPLAIN " + statement.sql, statement.parameters)
+            columns = [d[0] for d in cursor.description]
+            plan = []
+            for row in cursor.fetchall():
+                row = dict(zip(columns, row))
+                detail = "%s: type=%s key=%s" % (row["table"], row["type"], row["key"])
+                plan.append((row["table"] if row["type"] in ("ALL", "index") else None, detail))
+            return plan
+
+        if dialect == "postgresql":
+            cursor.execute("EXPLAIN " + statement.sql, statement.parameters)
+            plan = []
+            for row in cursor.fetchall():
+                m = _POSTGRES_SCAN.search(row[0])
+                plan.append((m.group(1) if m else None, row[0].strip()))
+            return plan
+
+        raise DBAdminError("Query plans are not supported for %s databases" % dialect)
+    finally:
+        cursor.close()
+
+
+def _table_name(selectable):
+    while not isinstance(selectable, Table):
+        selectable = getattr(selectable, "element", None)
+        if selectable is None:
+            return None
+    return selectable.name
+
+def filter_columns(clauseelement, table_name):
+    """
+    Returns the columns of a table that a statement compares to a value
+    or to another column, in its WHERE and JOIN ON clauses: first the
+    ones compared with =, IN and IS, then the ones compared with ranges.
+    """
+    equality = []
+    ranges = []
+    if clauseelement is None:
+        return equality, ranges
+
+    for element in visitors.iterate(clauseelement, {}):
+        if not isinstance(element, BinaryExpression):
+            continue
+        if element.operator in _EQUALITY_OPERATORS:
+            columns = equality
+        elif element.operator in _RANGE_OPERATORS:
+            columns = ranges
+        else:
+            continue
+        for side in (element.left, element.right):
+            if isinstance(side, Column) and _table_name(side.table) == table_name and side.name not in columns:
+                columns.append(side.name)
+
+    ranges = [c for c in ranges if c not in equality]
+    return equality, ranges
+
+
+def existing_indexes(session):
+    """
+    Returns the indexes, unique constraints and primary keys the database
+    has on the workflow tables, as lists of (column names, unique) tuples
+    by table name.
+    """
+    inspector = Inspector.from_engine(session.get_bind())
+    table_names = set(inspector.get_table_names())
+
+    existing = {}
+    for table in WORKFLOW_TABLES:
+        if table.name not in table_names:
+            continue
+        indexes = [(tuple(index["column_names"]), bool(index.get("unique")))
+                   for index in inspector.get_indexes(table.name)]
+        # Not available in all the SQLAlchemy versions we support
+        if hasattr(inspector, "get_unique_constraints"):
+            indexes.extend((tuple(constraint["column_names"]), True)
+                           for constraint in inspector.get_unique_constraints(table.name))
+        pk = tuple(inspector.get_pk_constraint(table.name).get("constrained_columns", []))
+        if pk:
+            indexes.append((pk, True))
+        existing[table.name] = indexes
+    return existing
+
+
+def missing_indexes(session, existing=None):
+    """
+    Returns the indexes of the schema that the database does not have, as
+    (table name, index name, column names) tuples.
+    """
+    if existing is None:
+        existing = existing_indexes(session)
+
+    missing = []
+    for table in WORKFLOW_TABLES:
+        if table.name not in existing:
+            continue
+        columns_of_indexes = set(columns for columns, unique in existing[table.name])
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            columns = tuple(c.name for c in index.columns)
+            if columns not in columns_of_indexes:
+                missing.append((table.name, index.name, columns))
+    return missing
+
+
+def is_covered(equality, ranges, indexes):
+    """
+    Returns whether one of the indexes can already be used for a lookup on
+    the equality columns and the first range column: the columns are a
+    leading prefix of the index (in any order for the equality columns),
+    or the index is unique and only has equality columns.
+    @param equality : columns compared with =, IN and IS
+    @param ranges   : columns compared with ranges
+    @param indexes  : (column names, unique) tuples, see existing_indexes
+    """
+    columns = list(equality) + list(ranges[:1])
+    for index_columns, unique in indexes:
+        if unique and index_columns and set(index_columns) <= set(equality):
+            return True
+        if len(index_columns) < len(columns):
+            continue
+        if set(index_columns[:len(equality)]) == set(equality) and \
+           list(index_columns[len(equality):len(columns)]) == list(ranges[:1]):
+            return True
+    return False
+
+
+def analyze(session, dburi, wf_uuid=None):
+    """
+    Runs and explains the query set, and returns the full scans found and
+    the missing indexes.
+    @param session : session of the database to analyze
+    @param dburi   : URL of the database, for the query classes
+    @param wf_uuid : workflow to run the queries with, the first root
+                     workflow of the database by default
+    """
+    sample = _sample(session, wf_uuid)
+    statements = collect_statements(dburi, sample)
+
+    scans = []
+    for statement in statements:
+        try:
+            plan = explain(session, statement)
+        except DBAdminError:
+            raise
+        except Exception, e:
+            log.warning("Unable to explain statement of %s: %s" % (", ".join(statement.sources), e))
+            continue
+        for table, detail in plan:
+            # Scans of subqueries have the name of the subquery
+            if table is not None and table in metadata.tables:
+                scans.append(Scan(table, detail, statement))
+
+    indexes = existing_indexes(session)
+    return {
+        "sample": sample,
+        "statements": statements,
+        "scans": scans,
+        "indexes": indexes,
+        "missing_indexes": missing_indexes(session, indexes),
+    }
+
+
+def format_report(analysis, verbose=False):
+    """
+    Formats the result of analyze as a text report.
+    """
+    lines = []
+    statements = analysis["statements"]
+    scans = analysis["scans"]
+    lines.append("Explained %d statements of %d queries, using workflow %s" % (
+        len(statements), len(set(s for statement in statements for s in statement.sources)),
+        analysis["sample"]["wf_uuid"]))
+
+    missing = analysis["missing_indexes"]
+    if missing:
+        lines.append("")
+        lines.append("Indexes of the schema missing from the database, run 'pegasus-db-admin update' to create them:")
+        for table, name, columns in missing:
+            lines.append("    %s on %s(%s)" % (name, table, ", ".join(columns)))
+
+    by_table = {}
+    for scan in scans:
+        by_table.setdefault(scan.table, []).append(scan)
+
+    lines.append("")
+    if not by_table:
+        lines.append("No full scans found.")
+        return "\n".join(lines)
+
+    lines.append("Full scans:")
+    for table in sorted(by_table.keys(), key=lambda t: (-len(by_table[t]), t)):
+        table_scans = by_table[table]
+        sources = []
+        suggestions = []
+        for scan in table_scans:
+            for source in scan.statement.sources:
+                if source not in sources:
+                    sources.append(source)
+            equality, ranges = filter_columns(scan.statement.clauseelement, table)
+            columns = tuple(equality + ranges[:1])
+            # The database chose to scan the table anyway, e.g. because it is small
+            if is_covered(equality, ranges, analysis["indexes"].get(table, [])):
+                continue
+            if columns and columns not in suggestions:
+                suggestions.append(columns)
+
+        lines.append("")
+        lines.append("  %s: %d statements" % (table, len(table_scans)))
+        for source in sources:
+            lines.append("    used by %s" % source)
+        for columns in suggestions:
+            lines.append("    an index on %s(%s) would help" % (table, ", ".join(columns)))
+        if verbose:
+            for scan in table_scans:
+                lines.append("    plan: %s" % scan.detail)
+                lines.append("    sql:  %s" % " ".join(scan.statement.sql.split()))
+
+    return "\n".join(lines)
@@ -189,6 +189,43 @@ class VersionCommand(LoggingCommand):
             exit(1)
 
 
+# ------------------------------------------------------
+class AnalyzeCommand(LoggingCommand):
+    description = "Explain the queries of the statistics and monitoring tools, and report the full table scans."
+    usage = "Usage: %prog analyze [options] [DATABASE_URL]"
+
+    def __init__(self):
+        LoggingCommand.__init__(self)
+        _add_common_options(self)
+        self.parser.add_option("-w", "--wf-uuid", action="store", type="string", dest="wf_uuid",
+                               default=None, help="Workflow to run the queries with (default: first root workflow)")
+        self.parser.add_option("-p", "--plans", action="store_true", dest="plans",
+                               default=False, help="Show the query plan and SQL of the full scans")
+
+    def run(self):
+        # imported here, not to shadow the analyze module in this package
+        from Pegasus.db.admin.analyze import analyze, format_report
+
+        _set_log_level(self.options.debug)
+
+        dburi = None
+        if len(self.args) > 0:
+            dburi = self.args[0]
+
+        try:
+            _validate_conf_type_options(dburi, self.options.properties, self.options.config_properties, self.options.submit_dir,
+                                        self.options.db_type)
+            db = _get_connection(dburi, self.options.properties, self.options.config_properties, self.options.submit_dir,
+                                 self.options.db_type, force=self.options.force)
+            analysis = analyze(db, str(db.get_bind().url), self.options.wf_uuid)
+            db.close()
+            print format_report(analysis, self.options.plans)
+
+        except (DBAdminError, connection.ConnectionError), e:
+            log.error(e)
+            exit(1)
+
+
 # ------------------------------------------------------
 def _print_version(data):
     if data:
@@ -280,14 +317,16 @@ class DBAdminCommand(CompoundCommand):
         ('downgrade', DowngradeCommand),
         ('update', UpdateCommand),
         ('check', CheckCommand),
-        ('version', VersionCommand)
+        ('version', VersionCommand),
+        ('analyze', AnalyzeCommand)
     ]
     aliases = {
         "c": "create",
         "d": "downgrade",
         "u": "update",
         "k": "check",
-        "v": "version"
+        "v": "version",
+        "a": "analyze"
     }
 
 
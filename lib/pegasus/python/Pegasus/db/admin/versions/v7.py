@@ -0,0 +1,77 @@
+import logging
+
+from Pegasus.db.admin.admin_loader import *
+from Pegasus.db.admin.versions.base_version import BaseVersion
+from Pegasus.db.schema import *
+from Pegasus.db.workflow_loader import update_job_instance_summary
+from sqlalchemy.exc import *
+
+DB_VERSION = 7
+
+log = logging.getLogger(__name__)
+
+class Version(BaseVersion):
+
+    def __init__(self, connection):
+        super(Version, self).__init__(connection)
+
+    def update(self, force=False):
+        """
+        Creates the job_instance_summary table, and fills it from the
+        jobstate and invocation tables.
+        :param force:
+        :return:
+        """
+        log.info("Updating to version %s" % DB_VERSION)
+
+        # check if the migration is required
+        try:
+            if check_table_exists(self.db, st_job_instance_summary):
+                return
+        except (OperationalError, ProgrammingError):
+            pass
+        except Exception, e:
+            raise DBAdminError(e)
+
+        # check if previous tables exist. If not, the migration should not continue (for new dbs)
+        try:
+            for table in ["workflow", "job_instance", "jobstate", "invocation"]:
+                self.db.execute("SELECT * FROM %s LIMIT 1" % table)
+        except (OperationalError, ProgrammingError):
+            return
+        except Exception, e:
+            raise DBAdminError(e)
+
+        log.info("Creating 'job_instance_summary' table...")
+        try:
+            st_job_instance_summary.create(self.db.get_bind(), checkfirst=True)
+        except (OperationalError, ProgrammingError), e:
+            raise DBAdminError(e)
+
+        log.info("Updating job_instance_summary...")
+        try:
+            update_job_instance_summary(self.db)
+            self.db.commit()
+        except Exception, e:
+            self.db.rollback()
+            raise DBAdminError(e)
+
+    def downgrade(self, force=False):
+        """
+        :param force:
+        :return:
+        """
+        log.info("Downgrading from version %s" % DB_VERSION)
+        self._drop_table("job_instance_summary")
+        self.db.commit()
+
+    def _drop_table(self, table_name):
+        """
+        Drop a table.
+        :param table_name:
+        :return:
+        """
+        try:
+            self.db.execute("DROP TABLE %s" % table_name)
+        except Exception, e:
+            pass
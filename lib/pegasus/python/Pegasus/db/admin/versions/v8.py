@@ -0,0 +1,83 @@
+import logging
+
+from Pegasus.db.admin.admin_loader import *
+from Pegasus.db.admin.versions.base_version import BaseVersion
+from Pegasus.db.schema import *
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.exc import *
+
+DB_VERSION = 8
+
+# Indexes added in this version, as (table, index name)
+INDEXES = [
+    (st_workflow, "workflow_root_wf_id_COL"),
+    (st_task, "task_job_id_COL"),
+    (st_invocation, "invoc_wf_id_transformation_COL"),
+    (st_workflow_files, "workflow_files_wf_id_COL"),
+]
+
+log = logging.getLogger(__name__)
+
+class Version(BaseVersion):
+
+    def __init__(self, connection):
+        super(Version, self).__init__(connection)
+
+    def update(self, force=False):
+        """
+        Creates the indexes used by the statistics and the monitoring
+        queries of hierarchical workflows.
+        :param force:
+        :return:
+        """
+        log.info("Updating to version %s" % DB_VERSION)
+
+        try:
+            inspector = Inspector.from_engine(self.db.get_bind())
+            table_names = set(inspector.get_table_names())
+        except Exception, e:
+            raise DBAdminError(e)
+
+        for table, index_name in INDEXES:
+            # the tables are created with the index for new dbs
+            if table.name not in table_names:
+                continue
+            if index_name in [index["name"] for index in inspector.get_indexes(table.name)]:
+                continue
+
+            log.info("Creating index '%s' on '%s'..." % (index_name, table.name))
+            try:
+                self._get_index(table, index_name).create(self.db.get_bind())
+            except (OperationalError, ProgrammingError), e:
+                raise DBAdminError(e)
+
+    def downgrade(self, force=False):
+        """
+        :param force:
+        :return:
+        """
+        log.info("Downgrading from version %s" % DB_VERSION)
+        for table, index_name in INDEXES:
+            self._drop_index(table, index_name)
+        self.db.commit()
+
+    def _get_index(self, table, index_name):
+        for index in table.indexes:
+            if index.name == index_name:
+                return index
+        raise DBAdminError("Index %s of table %s is not in the schema" % (index_name, table.name))
+
+    def _drop_index(self, table, index_name):
+        """
+        Drop an index.
+        :param table:
+        :param index_name:
+        :return:
+        """
+        try:
+            if self.db.get_bind().driver == "mysqldb":
+                self.db.execute("DROP INDEX %s ON %s" % (index_name, table.name))
+            else:
+                self.db.execute("DROP INDEX %s" % index_name)
+        except Exception, e:
+            pass
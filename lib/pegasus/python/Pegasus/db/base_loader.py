@@ -16,6 +16,8 @@ class BaseLoader(object):
 
         # flags and state for batching
         self._batch = batch
+        # commit each flushed batch at once, instead of once per statement
+        self._commit_batch = connection.get_sqlite_profile(dburi, props, db_type) == connection.SQLiteProfile.PERFORMANCE
         self._flush_every = flush_every
         self._flush_count = 0
         self._last_flush = time.time()
@@ -26,9 +28,12 @@ class BaseLoader(object):
         """
         pass
 
-    def flush(self):
-        "Try to flush the batch"
-        self.check_flush()
+    def flush(self, force=False):
+        "Try to flush the batch, or always flush it if force is set"
+        if force:
+            self.hard_flush()
+        else:
+            self.check_flush()
 
     def check_flush(self, increment=False):
         """
@@ -2,17 +2,20 @@ import imp
 import logging
 import getpass
 import os
+import threading
 
 from Pegasus.tools import properties
 from Pegasus.tools import utils
 from sqlalchemy import create_engine, orm, event, exc
 from sqlalchemy.engine import Engine
-from sqlite3 import Connection as SQLite3Connection
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from sqlite3 import Connection as SQLite3Connection, Error as SQLite3Error
 from urlparse import urlparse
 
 from Pegasus import user as users
 
-__all__ = ['connect']
+__all__ = ['connect', 'set_pool_options', 'get_sqlite_profile', 'dispose_engines']
 
 log = logging.getLogger(__name__)
 
@@ -29,9 +32,18 @@ PROP_CATALOG_REPLICA_DB_TIMEOUT = "pegasus.catalog.replica.db.timeout"
 PROP_CATALOG_WORKFLOW_URL = "pegasus.catalog.workflow.url"
 PROP_CATALOG_WORKFLOW_TIMEOUT = "pegasus.catalog.workflow.timeout"
 PROP_CATALOG_WORKFLOW_DB_TIMEOUT = "pegasus.catalog.workflow.db.timeout"
+PROP_CATALOG_ALL_SQLITE_PROFILE = "pegasus.catalog.*.sqlite.profile"
+PROP_CATALOG_MASTER_SQLITE_PROFILE = "pegasus.catalog.master.sqlite.profile"
+PROP_CATALOG_WORKFLOW_SQLITE_PROFILE = "pegasus.catalog.workflow.sqlite.profile"
 PROP_DASHBOARD_OUTPUT = "pegasus.dashboard.output"
 PROP_MONITORD_OUTPUT = "pegasus.monitord.output"
 
+# Engine Settings
+DEFAULT_POOL_SIZE = 5
+DEFAULT_POOL_RECYCLE = 3600
+DEFAULT_SQLITE_TIMEOUT = 30
+SQLITE_JOURNAL_MODE = "WAL"
+
 CONNECTION_PROPERTIES = [
     PROP_CATALOG_MASTER_URL,
     PROP_CATALOG_REPLICA_DB_URL,
@@ -55,10 +67,44 @@ class DBKey:
     TIMEOUT = "timeout"
 
 
+class SQLiteProfile:
+    DEFAULT = "default"
+    PERFORMANCE = "performance"
+
+
+# PRAGMA statements run on every new connection, by SQLite profile. The performance
+# profile only syncs to disk on WAL checkpoints, so the last transactions may be lost
+# on a power failure, but the database stays consistent.
+SQLITE_PROFILE_PRAGMAS = {
+    SQLiteProfile.DEFAULT: [],
+    SQLiteProfile.PERFORMANCE: [
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        "cache_size=-65536",
+        "mmap_size=268435456",
+        "temp_store=MEMORY"
+    ]
+}
+
+
+# Engines shared by all the connections of this process, and the database
+# versions verified through them, by engine key
+_engines = {}
+_verified_versions = {}
+_engines_lock = threading.Lock()
+_engines_pid = os.getpid()
+_pool_options = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "pool_recycle": DEFAULT_POOL_RECYCLE
+}
+
+
 def connect(dburi, echo=False, schema_check=True, create=False, pegasus_version=None, force=False, props=None,
             db_type=None, connect_args=None, verbose=True):
     """
-    Connect to the provided URL database.
+    Connect to the provided URL database. The engine, and its pool of connections, is shared by
+    all the connections to the same URL in this process, and the schema is only verified again
+    if the database version has changed since the last verification.
     :param dburi:
     :param echo:
     :param schema_check:
@@ -78,9 +124,9 @@ def connect(dburi, echo=False, schema_check=True, create=False, pegasus_version=
         log.debug("Connecting to: %s" % dburi)
         # parse connection properties
         connect_args = _parse_props(dburi, props, db_type, connect_args)
+        profile = get_sqlite_profile(dburi, props, db_type)
 
-        engine = create_engine(dburi, echo=echo, pool_recycle=True, connect_args=connect_args)
-        engine.connect()
+        engine, key = _get_engine(dburi, echo, connect_args, profile)
 
     except exc.OperationalError, e:
         if "mysql" in dburi and "unknown database" in str(e).lower():
@@ -102,13 +148,68 @@ def connect(dburi, echo=False, schema_check=True, create=False, pegasus_version=
         except exc.OperationalError, e:
             raise ConnectionError("%s (%s)" % (e.message, dburi))
 
+        if key and engine.url.drivername.startswith("sqlite"):
+            _set_journal_mode(engine)
+
     if schema_check:
-        from Pegasus.db.admin.admin_loader import db_verify
-        db_verify(db, pegasus_version=pegasus_version, force=force)
+        _verify(db, key, pegasus_version=pegasus_version, force=force)
 
     return db
 
 
+def set_pool_options(pool_size=None, pool_recycle=None):
+    """
+    Set the pool options of the engines created from now on. SQLite engines do not pool connections.
+    :param pool_size: number of connections kept open by each engine
+    :param pool_recycle: number of seconds after which a pooled connection is reopened
+    """
+    if pool_size is not None:
+        _pool_options["pool_size"] = pool_size
+    if pool_recycle is not None:
+        _pool_options["pool_recycle"] = pool_recycle
+
+
+def get_sqlite_profile(dburi, props=None, db_type=None):
+    """
+    Get the SQLite profile set in the properties for the database type.
+    :param dburi: URL to the db
+    :param props: properties
+    :param db_type: type of the database (e.g., MASTER, WORKFLOW)
+    :return: the profile, SQLiteProfile.DEFAULT if the database is not a SQLite one
+    """
+    dburi = _parse_jdbc_uri(dburi)
+    if not props or not db_type or not dburi.lower().startswith("sqlite"):
+        return SQLiteProfile.DEFAULT
+
+    profile = None
+    if db_type == DBType.MASTER:
+        profile = props.property(PROP_CATALOG_MASTER_SQLITE_PROFILE)
+    elif db_type == DBType.WORKFLOW:
+        profile = props.property(PROP_CATALOG_WORKFLOW_SQLITE_PROFILE)
+    if not profile:
+        profile = props.property(PROP_CATALOG_ALL_SQLITE_PROFILE)
+    if not profile:
+        return SQLiteProfile.DEFAULT
+
+    profile = profile.strip().lower()
+    if profile not in SQLITE_PROFILE_PRAGMAS:
+        raise ConnectionError("Invalid SQLite profile '%s', valid ones are: %s"
+                              % (profile, ", ".join(sorted(SQLITE_PROFILE_PRAGMAS))))
+    return profile
+
+
+def dispose_engines():
+    """
+    Close the pooled connections of all the shared engines, and forget the engines and the schema
+    verifications done through them.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _verified_versions.clear()
+
+
 def connect_by_submitdir(submit_dir, db_type, config_properties=None, echo=False, schema_check=True,
                          create=False, pegasus_version=None, force=False, cl_properties=None):
     """ Connect to the database from submit directory and database type """
@@ -228,6 +329,125 @@ def _set_sqlite_pragma(conn, record):
         cursor.close()
 
 
+def _set_journal_mode(engine):
+    """
+    Set the journal mode of a SQLite database file. The mode is persistent, so it is set by the
+    connections that create or write the database (e.g., pegasus-monitord), and the readers get it too.
+    In WAL mode readers do not block the writer, and vice versa.
+    :param engine: DB engine object
+    """
+    if not SQLITE_JOURNAL_MODE:
+        return
+    try:
+        engine.execute("PRAGMA journal_mode=%s" % SQLITE_JOURNAL_MODE)
+    except exc.DBAPIError, e:
+        log.debug("Unable to set the journal mode: %s" % e)
+
+
+def _set_pragmas(engine, pragmas):
+    """
+    Run the PRAGMA statements on every new connection of a SQLite engine.
+    :param engine: DB engine object
+    :param pragmas: PRAGMA statements, without the PRAGMA keyword
+    """
+    def set_pragmas(conn, record):
+        cursor = conn.cursor()
+        for pragma in pragmas:
+            try:
+                cursor.execute("PRAGMA %s;" % pragma)
+            except SQLite3Error, e:
+                log.debug("Unable to set PRAGMA %s: %s" % (pragma, e))
+        cursor.close()
+
+    if pragmas:
+        event.listen(engine, "connect", set_pragmas)
+
+
+def _get_engine(dburi, echo=False, connect_args=None, profile=SQLiteProfile.DEFAULT):
+    """
+    Get the engine shared by the connections to the database URL, creating it on first use.
+    In-memory SQLite databases are private to each connection, so their engines are not shared.
+    :param dburi: URL to the db
+    :param echo: whether the SQL statements should be logged
+    :param connect_args: arguments passed to the DB-API connect function
+    :param profile: SQLite profile
+    :return: the engine and its key, None if the engine is not shared
+    """
+    global _engines_pid
+
+    url = make_url(dburi)
+    connect_args = dict(connect_args or {})
+    options = {"echo": echo, "connect_args": connect_args}
+    pragmas = SQLITE_PROFILE_PRAGMAS[profile]
+    if url.drivername.startswith("sqlite"):
+        if not url.database or url.database == ":memory:":
+            engine = create_engine(url, **options)
+            _set_pragmas(engine, pragmas)
+            engine.connect().close()
+            return engine, None
+        # The same file may be reached from different working directories
+        url.database = os.path.abspath(url.database)
+        connect_args.setdefault(DBKey.TIMEOUT, DEFAULT_SQLITE_TIMEOUT)
+        if profile != SQLiteProfile.DEFAULT:
+            # Keep the connections open, with their page cache and memory map, instead
+            # of reopening the file for each transaction. The pool hands a connection
+            # to one thread at a time.
+            options["poolclass"] = QueuePool
+            options["pool_size"] = 1
+            connect_args["check_same_thread"] = False
+    else:
+        options.update(_pool_options)
+
+    key = (str(url), echo, tuple(sorted(connect_args.items())), tuple(sorted(_pool_options.items())), profile)
+
+    with _engines_lock:
+        if _engines_pid != os.getpid():
+            # Connections pooled by the parent process must not be used by a forked child
+            _engines.clear()
+            _engines_pid = os.getpid()
+        engine = _engines.get(key)
+
+    if engine is None:
+        engine = create_engine(url, **options)
+        _set_pragmas(engine, pragmas)
+        engine.connect().close()
+        with _engines_lock:
+            shared = _engines.setdefault(key, engine)
+        if shared is not engine:
+            engine.dispose()
+            engine = shared
+
+    return engine, key
+
+
+def _verify(db, key, pegasus_version=None, force=False):
+    """
+    Verify whether the database is compatible to the specified Pegasus version, unless it was
+    already verified through the same engine and its version has not changed since then.
+    :param db: DB session object
+    :param key: key of the engine, None if the engine is not shared
+    :param pegasus_version: version of the Pegasus software (e.g., 4.6.0)
+    :param force: whether operations should be performed despite conflicts
+    """
+    from Pegasus.db.admin.admin_loader import DBAdminError, db_current_version, db_verify
+
+    with _engines_lock:
+        verified_version = _verified_versions.get((key, pegasus_version)) if key else None
+
+    if verified_version is not None:
+        try:
+            if db_current_version(db) == verified_version:
+                return
+        except (DBAdminError, exc.SQLAlchemyError, orm.exc.NoResultFound):
+            db.rollback()
+
+    db_verify(db, pegasus_version=pegasus_version, force=force)
+    if key:
+        current_version = db_current_version(db)
+        with _engines_lock:
+            _verified_versions[(key, pegasus_version)] = current_version
+
+
 def _merge_properties(props, cl_properties):
     if cl_properties:
         for property in cl_properties:
@@ -324,13 +324,8 @@ class DashboardLoader(BaseLoader):
         """
         self.log.debug('Purging caches for: %s', wfs.wf_uuid)
 
-        for k,v in self.wf_id_cache.items():
-            if k == wfs.wf_uuid:
-                del self.wf_id_cache[k]
-
-        for k,v in self.root_wf_id_cache.items():
-            if k == wfs.wf_uuid:
-                del self.root_wf_id_cache[k]
+        self.wf_id_cache.pop(wfs.wf_uuid, None)
+        self.root_wf_id_cache.pop(wfs.wf_uuid, None)
 
 
 
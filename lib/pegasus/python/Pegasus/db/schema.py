@@ -53,6 +53,7 @@ def get_missing_tables(db):
         st_task_edge,
         st_task_meta,
         st_invocation,
+        st_job_instance_summary,
         # MASTER
         pg_workflow,
         pg_workflowstate,
@@ -182,6 +183,9 @@ class TaskMeta(SABase):
 class Invocation(SABase):
     pass
 
+class JobInstanceSummary(SABase):
+    pass
+
 # ---------------------------------------------
 # DASHBOARD
 class DashboardWorkflow(SABase):
@@ -246,6 +250,7 @@ st_workflow = Table('workflow', metadata,
 
 Index('wf_id_KEY', st_workflow.c.wf_id, unique=True)
 Index('wf_uuid_UNIQUE', st_workflow.c.wf_uuid, unique=True)
+Index('workflow_root_wf_id_COL', st_workflow.c.root_wf_id)
 
 orm.mapper(Workflow, st_workflow, properties = {
     'child_wf':relation(Workflow, cascade='all, delete-orphan', passive_deletes=True),
@@ -452,6 +457,7 @@ st_task = Table('task', metadata,
 Index('task_id_KEY', st_task.c.task_id, unique=True)
 Index('task_abs_task_id_COL', st_task.c.abs_task_id)
 Index('task_wf_id_COL', st_task.c.wf_id)
+Index('task_job_id_COL', st_task.c.job_id)
 Index('UNIQUE_TASK', st_task.c.wf_id, st_task.c.abs_task_id, unique=True)
 
 orm.mapper(Task, st_task, properties = {
@@ -505,10 +511,47 @@ st_invocation = Table('invocation', metadata,
 Index('invocation_id_KEY', st_invocation.c.invocation_id, unique=True)
 Index('invoc_abs_task_id_COL', st_invocation.c.abs_task_id)
 Index('invoc_wf_id_COL', st_invocation.c.wf_id)
+# transformation is a TEXT column, MySQL only indexes a prefix of it
+Index('invoc_wf_id_transformation_COL', st_invocation.c.wf_id, st_invocation.c.transformation, mysql_length=255)
 Index('UNIQUE_INVOCATION', st_invocation.c.job_instance_id, st_invocation.c.task_submit_seq, unique=True)
 
 orm.mapper(Invocation, st_invocation)
 
+# st_job_instance_summary definition
+# ==> One row per job instance, derived from its jobstate and invocation
+#       rows by the loader (see workflow_loader.update_job_instance_summary)
+#
+# state, state_timestamp, jobstate_submit_seq = latest jobstate
+# *_time = first (or for terminate_time and post_script_start_time, last)
+#       timestamp of the corresponding states
+# remote_duration, remote_duration_multi, remote_cpu_time = sums over the
+#       invocations of the tasks (task_submit_seq >= 0), the second one
+#       weighted by the multiplier_factor of the job instance, and stored
+#       as a double so that the product is not rounded
+# max_exitcode = over the tasks and the prescript (task_submit_seq >= -1)
+st_job_instance_summary = Table('job_instance_summary', metadata,
+    Column('job_instance_id', KeyInteger, ForeignKey('job_instance.job_instance_id', ondelete='CASCADE'), primary_key=True, nullable=False),
+    Column('wf_id', KeyInteger, ForeignKey('workflow.wf_id', ondelete='CASCADE'), nullable=False),
+    Column('state', VARCHAR(255), nullable=True),
+    Column('state_timestamp', NUMERIC(16,6), nullable=True),
+    Column('jobstate_submit_seq', INT, nullable=True),
+    Column('submit_time', NUMERIC(16,6), nullable=True),
+    Column('grid_submit_time', NUMERIC(16,6), nullable=True),
+    Column('execute_time', NUMERIC(16,6), nullable=True),
+    Column('terminate_time', NUMERIC(16,6), nullable=True),
+    Column('post_script_start_time', NUMERIC(16,6), nullable=True),
+    Column('post_script_terminate_time', NUMERIC(16,6), nullable=True),
+    Column('remote_duration', NUMERIC(16,3), nullable=True),
+    Column('remote_duration_multi', Float(53), nullable=True),
+    Column('remote_cpu_time', NUMERIC(16,3), nullable=True),
+    Column('max_exitcode', INT, nullable=True),
+    **table_keywords
+)
+
+Index('job_instance_summary_wf_id_COL', st_job_instance_summary.c.wf_id)
+
+orm.mapper(JobInstanceSummary, st_job_instance_summary)
+
 
 st_workflow_files = Table('workflow_files', metadata,
                           Column('lfn_id', KeyInteger, ForeignKey('rc_lfn.lfn_id', ondelete='CASCADE'), nullable=False, primary_key=True),
@@ -518,6 +561,8 @@ st_workflow_files = Table('workflow_files', metadata,
                           **table_keywords
                           )
 
+Index('workflow_files_wf_id_COL', st_workflow_files.c.wf_id)
+
 orm.mapper(WorkflowFiles, st_workflow_files)
 
 
@@ -0,0 +1,752 @@
+"""
+In-memory columnar backend for the statistics of a workflow.
+
+StampedeStatistics sends one query per statistic, and most of them join
+the same few tables. StampedeColumnarStatistics reads the job,
+job_instance, jobstate, invocation and host rows of the workflows once,
+into one NumPy array per column, and computes these statistics with
+vectorized group-bys instead:
+
+ get_job_statistics
+ get_job_states
+ get_transformation_statistics
+ get_workflow_cum_job_wall_time
+ get_invocation_by_time
+ get_jobs_run_by_time
+ get_invocation_by_time_per_host
+ get_jobs_run_by_time_per_host
+ get_time_series
+
+They return the same rows as the StampedeStatistics methods, and the
+job, time, host and transformation filters are applied the same way.
+The other methods are inherited, and still query the database.
+
+Usage::
+ stats = StampedeColumnarStatistics(connString='sqlite:///montage.db')
+ stats.initialize('unique_wf_uuid')
+ stats.set_time_filter('hour')
+ print stats.get_jobs_run_by_time()
+ print stats.get_invocation_by_time()
+ stats.close()
+
+NumPy is an optional dependency, the constructor raises ImportError
+when it is not installed. The rows are read by the first method that
+needs them, and are kept until close() is called, so the memory used
+grows with the number of jobs of the workflows.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import Float, type_coerce
+
+from Pegasus.db.schema import *
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics, JobStatisticsRow, TimeSeries
+from Pegasus.db.workflow.stampede_statistics import TIME_GRANULARITIES, BUCKET_SIZES, WEEK_ORIGIN, get_utc_offsets
+
+numpy = None
+try:
+    import numpy
+except ImportError:
+    pass
+
+# Max number of ids in one IN clause
+_CHUNK_SIZE = 500
+
+# Columns returned by get_transformation_statistics, in the order of the
+# StampedeStatistics query
+TransformationStatisticsRow = namedtuple('TransformationStatisticsRow', ['transformation', 'count', 'min',
+    'success', 'failure', 'max', 'avg', 'sum'])
+
+# Columns returned by get_job_states
+JobStatesRow = namedtuple('JobStatesRow', ['job_id', 'job_instance_id', 'job_submit_seq', 'job_name', 'site',
+    'host_name', 'jobS', 'jobDuration', 'pre_start', 'pre_duration', 'condor_start', 'condor_duration',
+    'grid_start', 'grid_duration', 'exec_start', 'exec_duration', 'kickstart_start', 'kickstart_duration',
+    'post_start', 'post_duration', 'transformation'])
+
+# Columns returned by get_invocation_by_time and get_jobs_run_by_time
+TimeStatisticsRow = namedtuple('TimeStatisticsRow', ['date_format', 'count', 'total_runtime'])
+
+# Columns returned by get_invocation_by_time_per_host and get_jobs_run_by_time_per_host
+HostTimeStatisticsRow = namedtuple('HostTimeStatisticsRow', ['date_format', 'host_name', 'count', 'total_runtime'])
+
+# Job types selected by each job filter, and whether they are excluded
+# instead (see StampedeStatistics._get_job_filter)
+_JOB_FILTERS = {
+    'nonsub': (['dax', 'dag'], True),
+    'subwf': (['dax', 'dag'], False),
+}
+
+
+def is_available():
+    """
+    Returns True if NumPy, which this backend needs, is installed.
+    """
+    return numpy is not None
+
+
+def _chunks(values):
+    for i in range(0, len(values), _CHUNK_SIZE):
+        yield values[i:i + _CHUNK_SIZE]
+
+
+def _factorize(values):
+    """
+    Returns the codes of a sequence of values, and the distinct values
+    in sorted order, so that sorting by code sorts by value.
+    """
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    uniques = sorted(index.keys())
+    rank = numpy.empty(len(uniques), dtype=numpy.int64)
+    for i, value in enumerate(uniques):
+        rank[index[value]] = i
+    return rank[numpy.array(codes, dtype=numpy.int64)], uniques
+
+
+def _lookup(keys, values):
+    """
+    Returns the position in the keys array of each of the values, or -1
+    for the values that are not keys.
+    """
+    result = numpy.empty(len(values), dtype=numpy.int64)
+    result.fill(-1)
+    if len(keys) == 0 or len(values) == 0:
+        return result
+    order = numpy.argsort(keys, kind='mergesort')
+    pos = numpy.minimum(numpy.searchsorted(keys, values, sorter=order), len(keys) - 1)
+    found = keys[order[pos]] == values
+    result[found] = order[pos[found]]
+    return result
+
+
+def _take(values, pos, missing=float('nan')):
+    """
+    Returns values[pos], with the missing value where pos is -1.
+    """
+    result = numpy.empty(len(pos), dtype=values.dtype)
+    result.fill(missing)
+    found = pos >= 0
+    result[found] = values[pos[found]]
+    return result
+
+
+def _float(column):
+    """
+    Reads a NUMERIC column as floats, rather than as Decimals
+    """
+    return type_coerce(column.__clause_element__(), Float)
+
+
+def _bucket(timestamps, divisor):
+    """
+    Same as CAST(timestamp / divisor AS INTEGER) in SQL
+    """
+    return numpy.trunc(timestamps / divisor).astype(numpy.int64)
+
+
+def _time_bucket(timestamps, granularity, utc_offset):
+    """
+    Same as the time_bucket SQL function of StampedeStatistics
+    """
+    offsets = get_utc_offsets(utc_offset)
+    offset = numpy.array([o for t, o in offsets], dtype=numpy.int64)
+    if len(offsets) > 1:
+        starts = numpy.array([t for t, o in offsets[1:]], dtype=numpy.float64)
+        offset = offset[numpy.searchsorted(starts, timestamps, side='right')]
+    local = numpy.floor(timestamps + offset).astype(numpy.int64)
+
+    if granularity == 'month':
+        months = local.astype('datetime64[s]').astype('datetime64[M]')
+        return months.astype('datetime64[s]').astype(numpy.int64)
+
+    size = BUCKET_SIZES[granularity]
+    origin = WEEK_ORIGIN if granularity == 'week' else 0
+    return (local - origin) // size * size + origin
+
+
+def _group_by(*keys):
+    """
+    Groups rows by one or more integer key arrays. Returns the group of
+    each row, and the key values of the groups, sorted by the keys.
+    """
+    size = len(keys[0])
+    if size == 0:
+        return numpy.zeros(0, dtype=numpy.int64), [key[:0] for key in keys]
+
+    combined = numpy.zeros(size, dtype=numpy.int64)
+    for key in keys:
+        uniques, codes = numpy.unique(key, return_inverse=True)
+        combined = combined * len(uniques) + codes
+    uniques, groups = numpy.unique(combined, return_inverse=True)
+
+    # Index of the first row of each group
+    first = numpy.empty(len(uniques), dtype=numpy.int64)
+    first[groups[::-1]] = numpy.arange(size - 1, -1, -1)
+    return groups, [key[first] for key in keys]
+
+
+def _group_count(groups, n):
+    return numpy.bincount(groups, minlength=n)
+
+
+def _group_sum(groups, n, values):
+    """
+    Sums the values of each group ignoring NaN, like SUM in SQL ignores
+    NULL. Groups without values get NaN.
+    """
+    valid = ~numpy.isnan(values)
+    sums = numpy.bincount(groups[valid], weights=values[valid], minlength=n).astype(float)
+    sums[numpy.bincount(groups[valid], minlength=n) == 0] = numpy.nan
+    return sums
+
+
+def _group_extreme(groups, n, values, last=False):
+    """
+    Returns the min (or with last, the max) of the values of each group
+    ignoring NaN, and NaN for the groups without values.
+    """
+    result = numpy.empty(n)
+    result.fill(numpy.nan)
+    valid = ~numpy.isnan(values)
+    groups = groups[valid]
+    values = values[valid]
+    if len(groups) == 0:
+        return result
+
+    order = numpy.lexsort((values, groups))
+    groups = groups[order]
+    values = values[order]
+    change = groups[1:] != groups[:-1]
+    if last:
+        boundary = numpy.append(change, True)
+    else:
+        boundary = numpy.insert(change, 0, True)
+    result[groups[boundary]] = values[boundary]
+    return result
+
+
+def _sum(values):
+    """
+    SUM in SQL: None if there are no values other than NULL (NaN)
+    """
+    values = values[~numpy.isnan(values)]
+    if len(values) == 0:
+        return None
+    return float(values.sum())
+
+
+def _list(values):
+    """
+    Converts an array to a list, with None for NaN.
+    """
+    if values.dtype.kind == 'f':
+        return [None if value != value else value for value in values.tolist()]
+    return values.tolist()
+
+
+def _int_list(values):
+    """
+    Converts a float array holding integers to a list of ints, with
+    None for NaN.
+    """
+    return [None if value != value else int(value) for value in values.tolist()]
+
+
+class _Table(object):
+    """
+    Column arrays of the rows of a table.
+    @param names   : names of the columns, which become attributes
+    @param dtypes  : NumPy type of each column, None for the columns that
+                     are factorized. For a factorized column x, x holds
+                     the codes and x_values the distinct values.
+    @param rows    : the rows
+    """
+    def __init__(self, names, dtypes, rows):
+        columns = zip(*rows) if rows else [()] * len(names)
+        for name, dtype, column in zip(names, dtypes, columns):
+            if dtype is None:
+                codes, uniques = _factorize(column)
+                setattr(self, name, codes)
+                setattr(self, name + "_values", uniques)
+            else:
+                setattr(self, name, numpy.array(column, dtype=dtype))
+        self.size = len(rows)
+
+    def mask(self, name, values, negate=False):
+        """
+        Returns the rows whose factorized column is one of the values.
+        """
+        selected = numpy.array([value in values for value in getattr(self, name + "_values")], dtype=bool)
+        if negate:
+            selected = ~selected
+        return selected[getattr(self, name)] if self.size else numpy.zeros(0, dtype=bool)
+
+
+class _WorkflowData(object):
+    """
+    The rows of a set of workflows, and the positions of the rows they
+    reference in the other tables.
+    """
+    def __init__(self, session, wf_ids):
+        wf_ids = list(wf_ids)
+        self.job = self._load(session, ['job_id', 'wf_id', 'type_desc', 'exec_job_id'],
+                              [numpy.int64, numpy.int64, None, object],
+                              [Job.job_id, Job.wf_id, Job.type_desc, Job.exec_job_id],
+                              Job.wf_id, wf_ids)
+
+        self.job_instance = self._load(session,
+            ['job_instance_id', 'job_id', 'job_submit_seq', 'host_id', 'site', 'local_duration', 'cluster_duration',
+             'multiplier_factor'],
+            [numpy.int64, numpy.int64, numpy.int64, numpy.int64, object, float, float, numpy.int64],
+            [JobInstance.job_instance_id, JobInstance.job_id, JobInstance.job_submit_seq,
+             func.coalesce(JobInstance.host_id, -1), JobInstance.site, _float(JobInstance.local_duration),
+             _float(JobInstance.cluster_duration), JobInstance.multiplier_factor],
+            Job.wf_id, wf_ids, [JobInstance.job_id == Job.job_id])
+
+        self.jobstate = self._load(session, ['job_instance_id', 'state', 'timestamp'], [numpy.int64, None, float],
+            [Jobstate.job_instance_id, Jobstate.state, _float(Jobstate.timestamp)],
+            Job.wf_id, wf_ids, [Jobstate.job_instance_id == JobInstance.job_instance_id,
+                                JobInstance.job_id == Job.job_id])
+
+        self.invocation = self._load(session,
+            ['wf_id', 'job_instance_id', 'task_submit_seq', 'transformation', 'exitcode', 'remote_duration',
+             'start_time'],
+            [numpy.int64, numpy.int64, numpy.int64, None, numpy.int64, float, float],
+            [Invocation.wf_id, Invocation.job_instance_id, Invocation.task_submit_seq, Invocation.transformation,
+             Invocation.exitcode, _float(Invocation.remote_duration),
+             _float(Invocation.start_time)],
+            Invocation.wf_id, wf_ids)
+
+        S = JobInstanceSummary
+        self.summary = self._load(session,
+            ['job_instance_id', 'submit_time', 'grid_submit_time', 'execute_time', 'terminate_time',
+             'post_script_start_time', 'post_script_terminate_time', 'remote_duration', 'remote_duration_multi',
+             'remote_cpu_time', 'max_exitcode'],
+            [numpy.int64] + [float] * 10,
+            [S.job_instance_id] + [_float(c) for c in (S.submit_time, S.grid_submit_time,
+             S.execute_time, S.terminate_time, S.post_script_start_time, S.post_script_terminate_time,
+             S.remote_duration, S.remote_duration_multi, S.remote_cpu_time)] + [S.max_exitcode],
+            S.wf_id, wf_ids)
+
+        host_ids = sorted(set(self.job_instance.host_id.tolist()) - set([-1]))
+        self.host = self._load(session, ['host_id', 'hostname'], [numpy.int64, None], [Host.host_id, Host.hostname],
+                               Host.host_id, host_ids)
+
+        # The job instances are read with their job, so they all have one
+        ji = self.job_instance
+        ji.job_pos = _lookup(self.job.job_id, ji.job_id)
+        ji.wf_id = self.job.wf_id[ji.job_pos]
+        ji.type_desc = self.job.type_desc[ji.job_pos]
+        ji.type_desc_values = self.job.type_desc_values
+        ji.hostname = _take(self.host.hostname, _lookup(self.host.host_id, ji.host_id), -1)
+        ji.summary_pos = _lookup(self.summary.job_instance_id, ji.job_instance_id)
+
+        self.jobstate.ji_pos = _lookup(ji.job_instance_id, self.jobstate.job_instance_id)
+        self.invocation.ji_pos = _lookup(ji.job_instance_id, self.invocation.job_instance_id)
+
+    def _load(self, session, names, dtypes, columns, wf_column, ids, joins=()):
+        rows = []
+        for chunk in _chunks(ids):
+            q = session.query(*columns)
+            for join in joins:
+                q = q.filter(join)
+            q = q.filter(wf_column.in_(chunk))
+            # Core rows are much cheaper to build than ORM ones
+            rows.extend(session.execute(q.statement).fetchall())
+        return _Table(names, dtypes, rows)
+
+
+class StampedeColumnarStatistics(StampedeStatistics):
+    def __init__(self, connString, expand_workflow=True):
+        if numpy is None:
+            raise ImportError("NumPy is required by the in-memory statistics backend")
+        StampedeStatistics.__init__(self, connString, expand_workflow)
+        self._data = {}
+        self._tree = None
+
+    def close(self):
+        self._data = {}
+        StampedeStatistics.close(self)
+
+    def _get_data(self, wf_ids):
+        """
+        Returns the rows of the given workflows, reading them the first
+        time they are needed.
+        """
+        key = tuple(sorted(wf_ids))
+        if key not in self._data:
+            self.log.debug('Loading the rows of %d workflows', len(key))
+            self._data[key] = _WorkflowData(self.session, key)
+        return self._data[key]
+
+    def _get_tree(self):
+        """
+        Returns the workflows whose root is the workflow, which the time
+        queries of StampedeStatistics filter on whether or not the
+        workflow is expanded.
+        """
+        if self._tree is None:
+            q = self.session.query(Workflow.wf_id).filter(Workflow.root_wf_id == self._root_wf_id)
+            self._tree = [row.wf_id for row in q.all()]
+        return self._tree
+
+    def _get_job_filter_mask(self, ji):
+        if self._job_filter_mode == 'all':
+            return None
+        types, negate = _JOB_FILTERS.get(self._job_filter_mode, ([self._job_filter_mode], False))
+        return ji.mask('type_desc', types, negate)
+
+    def _get_host_filter_mask(self, data, hostnames):
+        """
+        Returns which of the hostname codes match the host filter.
+        """
+        if self._host_filter is None:
+            return None
+        elif type(self._host_filter) == type('str'):
+            hosts = [self._host_filter]
+        elif type(self._host_filter) == type([]):
+            hosts = self._host_filter
+        else:
+            return None
+        selected = numpy.array([value in hosts for value in data.host.hostname_values], dtype=bool)
+        return selected[hostnames] if len(hostnames) else numpy.zeros(0, dtype=bool)
+
+    def _get_xform_filter_mask(self, invocation):
+        include = self._xform_filter['include']
+        exclude = self._xform_filter['exclude']
+        if include is not None and exclude is not None:
+            self.log.error('Can\'t set both transform include and exclude - reset s.set_transformation_filter()')
+            return None
+        elif include is not None:
+            values, negate = include, False
+        elif exclude is not None:
+            values, negate = exclude, True
+        else:
+            return None
+
+        if type(values) == type('str'):
+            values = [values]
+        elif type(values) != type([]):
+            return None
+        return invocation.mask('transformation', values, negate)
+
+    def _get_data_for(self, wf_ids):
+        data = self._get_data(wf_ids)
+        return data, data.invocation, data.job_instance
+
+    #
+    # Statistics of the workflows in self._wfs
+    #
+
+    def iter_job_statistics(self):
+        """
+        Same rows as StampedeStatistics.get_job_statistics, with floats
+        for the remote_cpu_time column. They are rounded to the scale of
+        the column, as the Decimals read from the database are.
+        """
+        if self._expand:
+            return
+
+        data, _, ji = self._get_data_for(self._wfs)
+        summary = data.summary
+        selected = numpy.flatnonzero(numpy.in1d(ji.wf_id, self._wfs))
+        selected = selected[numpy.lexsort((ji.job_instance_id[selected], ji.job_submit_seq[selected]))]
+
+        pos = ji.summary_pos[selected]
+
+        def s(name):
+            return _take(getattr(summary, name), pos)
+
+        submit_time = s('submit_time')
+        grid_submit_time = s('grid_submit_time')
+        execute_time = s('execute_time')
+        post_script_start_time = s('post_script_start_time')
+
+        hostnames = data.host.hostname_values
+        host_name = [hostnames[h] if h >= 0 else None for h in ji.hostname[selected].tolist()]
+
+        columns = [
+            _list(ji.job_id[selected]),
+            _list(ji.job_instance_id[selected]),
+            _list(ji.job_submit_seq[selected]),
+            data.job.exec_job_id[ji.job_pos[selected]].tolist(),
+            ji.site[selected].tolist(),
+            _list(numpy.fmin(grid_submit_time, execute_time) - submit_time),
+            _list(execute_time - grid_submit_time),
+            _list(ji.local_duration[selected]),
+            _list(s('remote_duration')),
+            _list(s('post_script_terminate_time') - numpy.fmax(post_script_start_time, s('terminate_time'))),
+            _list(ji.cluster_duration[selected]),
+            _int_list(s('max_exitcode')),
+            host_name,
+            _list(ji.multiplier_factor[selected]),
+            _list(s('remote_duration_multi')),
+            _list(numpy.round(s('remote_cpu_time'), 6)),
+        ]
+
+        for row in zip(*columns):
+            yield JobStatisticsRow(*row)
+
+    def get_job_states(self):
+        """
+        Same rows as StampedeStatistics.get_job_states. For the states
+        that are not aggregated there, the first timestamp is used.
+        """
+        if self._expand:
+            return []
+
+        data, invocation, ji = self._get_data_for(self._wfs)
+        jobstate = data.jobstate
+        n = ji.size
+
+        js_valid = jobstate.ji_pos >= 0
+
+        def state_time(states, last=False):
+            mask = js_valid & jobstate.mask('state', states)
+            return _group_extreme(jobstate.ji_pos[mask], n, jobstate.timestamp[mask], last)
+
+        job_start = _group_extreme(jobstate.ji_pos[js_valid], n, jobstate.timestamp[js_valid])
+        job_end = _group_extreme(jobstate.ji_pos[js_valid], n, jobstate.timestamp[js_valid], True)
+        pre_start = state_time(['PRE_SCRIPT_STARTED'])
+        submit = state_time(['SUBMIT'])
+        terminated = state_time(['JOB_TERMINATED'])
+        grid_start = state_time(['GRID_SUBMIT', 'GLOBUS_SUBMIT'], True)
+        exec_start = state_time(['EXECUTE', 'SUBMIT'], True)
+        post_start = state_time(['POST_SCRIPT_STARTED', 'JOB_TERMINATED'], True)
+
+        # Tasks of the job instances, in the workflow of their job
+        inv_valid = invocation.ji_pos >= 0
+        inv_valid[inv_valid] = invocation.wf_id[inv_valid] == ji.wf_id[invocation.ji_pos[inv_valid]]
+        tasks = inv_valid & (invocation.task_submit_seq >= 0)
+        kickstart_start = _group_extreme(invocation.ji_pos[tasks], n, invocation.start_time[tasks])
+        kickstart_duration = _group_sum(invocation.ji_pos[tasks], n, invocation.remote_duration[tasks])
+
+        # Distinct transformations of each job instance, in task order
+        mask = (invocation.ji_pos >= 0) & numpy.in1d(invocation.wf_id, self._wfs)
+        mask &= invocation.mask('transformation', ['dagman::post', 'dagman::pre'], True)
+        rows = numpy.flatnonzero(mask)
+        rows = rows[numpy.lexsort((invocation.task_submit_seq[rows], invocation.ji_pos[rows]))]
+        transformations = [None] * n
+        names = invocation.transformation_values
+        for pos, code in zip(invocation.ji_pos[rows].tolist(), invocation.transformation[rows].tolist()):
+            if transformations[pos] is None:
+                transformations[pos] = [names[code]]
+            elif names[code] not in transformations[pos]:
+                transformations[pos].append(names[code])
+
+        selected = numpy.flatnonzero(numpy.in1d(ji.wf_id, self._wfs))
+        selected = selected[numpy.lexsort((ji.job_instance_id[selected], ji.job_submit_seq[selected]))]
+
+        hostnames = data.host.hostname_values
+        columns = [
+            _list(ji.job_id[selected]),
+            _list(ji.job_instance_id[selected]),
+            _list(ji.job_submit_seq[selected]),
+            data.job.exec_job_id[ji.job_pos[selected]].tolist(),
+            ji.site[selected].tolist(),
+            [hostnames[h] if h >= 0 else None for h in ji.hostname[selected].tolist()],
+            _list(job_start[selected]),
+            _list(job_end[selected] - job_start[selected]),
+            _list(pre_start[selected]),
+            _list(state_time(['PRE_SCRIPT_TERMINATED'])[selected] - pre_start[selected]),
+            _list(submit[selected]),
+            _list(terminated[selected] - submit[selected]),
+            _list(grid_start[selected]),
+            _list(state_time(['EXECUTE'])[selected] - grid_start[selected]),
+            _list(exec_start[selected]),
+            _list(terminated[selected] - exec_start[selected]),
+            _list(kickstart_start[selected]),
+            _list(kickstart_duration[selected]),
+            _list(post_start[selected]),
+            _list(state_time(['POST_SCRIPT_TERMINATED'])[selected] - post_start[selected]),
+            [None if transformations[pos] is None else ",".join(transformations[pos]) for pos in selected.tolist()],
+        ]
+
+        return [JobStatesRow(*row) for row in zip(*columns)]
+
+    def get_transformation_statistics(self):
+        """
+        Same rows as StampedeStatistics.get_transformation_statistics,
+        sorted by transformation.
+        """
+        data, invocation, ji = self._get_data_for(self._wfs)
+        mask = (invocation.ji_pos >= 0) & numpy.in1d(invocation.wf_id, self._wfs)
+
+        duration = invocation.remote_duration[mask] * ji.multiplier_factor[invocation.ji_pos[mask]]
+        exitcode = invocation.exitcode[mask]
+        groups, (codes,) = _group_by(invocation.transformation[mask])
+        n = len(codes)
+
+        sums = _group_sum(groups, n, duration)
+        valid = numpy.bincount(groups[~numpy.isnan(duration)], minlength=n)
+        avgs = sums / numpy.maximum(valid, 1)
+
+        names = invocation.transformation_values
+        columns = [
+            [names[code] for code in codes.tolist()],
+            _list(_group_count(groups, n)),
+            _list(_group_extreme(groups, n, duration)),
+            _list(_group_count(groups[exitcode == 0], n)),
+            _list(_group_count(groups[exitcode != 0], n)),
+            _list(_group_extreme(groups, n, duration, True)),
+            _list(avgs),
+            _list(sums),
+        ]
+        return [TransformationStatisticsRow(*row) for row in zip(*columns)]
+
+    def get_workflow_cum_job_wall_time(self):
+        """
+        Same values as StampedeStatistics.get_workflow_cum_job_wall_time
+        """
+        wf_ids = self._get_tree() if self._expand else self._wfs
+        data, invocation, ji = self._get_data_for(wf_ids)
+
+        mask = (invocation.ji_pos >= 0) & numpy.in1d(invocation.wf_id, wf_ids)
+        mask &= invocation.task_submit_seq >= 0
+        mask &= invocation.mask('transformation', ['condor::dagman'], True)
+
+        duration = invocation.remote_duration[mask] * ji.multiplier_factor[invocation.ji_pos[mask]]
+        exitcode = invocation.exitcode[mask]
+        return (_sum(duration),
+                _sum(numpy.where(exitcode == 0, duration, 0.0)),
+                _sum(numpy.where(exitcode > 0, duration, 0.0)))
+
+    #
+    # Runtime statistics of the workflows whose root is the workflow
+    #
+
+    def _by_time(self, buckets, runtimes, hostnames=None, data=None):
+        """
+        Returns the buckets, host names (None if hostnames is None),
+        counts and total runtimes of the rows grouped by bucket and host.
+        """
+        if hostnames is None:
+            groups, (dates,) = _group_by(buckets)
+        else:
+            groups, (dates, hosts) = _group_by(buckets, hostnames)
+        n = len(dates)
+
+        names = None
+        if hostnames is not None:
+            names = [data.host.hostname_values[h] for h in hosts.tolist()]
+        return _list(dates), names, _list(_group_count(groups, n)), _list(_group_sum(groups, n, runtimes))
+
+    def _get_time_statistics(self, buckets, runtimes, hostnames=None, data=None):
+        dates, names, counts, runtimes = self._by_time(buckets, runtimes, hostnames, data)
+        if hostnames is None:
+            return [TimeStatisticsRow(*row) for row in zip(dates, counts, runtimes)]
+        return [HostTimeStatisticsRow(*row) for row in zip(dates, names, counts, runtimes)]
+
+    def _get_execute_jobstates(self, data, ji, wf_ids):
+        """
+        Returns the EXECUTE jobstate rows, and the job instances they
+        belong to, of the workflows that match the job filter.
+        """
+        jobstate = data.jobstate
+        mask = (jobstate.ji_pos >= 0) & jobstate.mask('state', ['EXECUTE'])
+        pos = jobstate.ji_pos[mask]
+        selected = numpy.in1d(ji.wf_id[pos], wf_ids)
+        job_filter = self._get_job_filter_mask(ji)
+        if job_filter is not None:
+            selected &= job_filter[pos]
+        return jobstate.timestamp[mask][selected], pos[selected]
+
+    def _get_invocation_times(self, per_host=False):
+        """
+        Returns the workflow data, and the start times, runtimes and
+        host names (None if not per_host) of the invocations counted by
+        get_invocation_by_time or get_invocation_by_time_per_host.
+        """
+        wf_ids = self._get_tree()
+        data, invocation, ji = self._get_data_for(wf_ids)
+
+        mask = numpy.in1d(invocation.wf_id, wf_ids)
+        xform_filter = self._get_xform_filter_mask(invocation)
+        if xform_filter is not None:
+            mask &= xform_filter
+        if not per_host:
+            return data, invocation.start_time[mask], invocation.remote_duration[mask], None
+
+        mask &= invocation.ji_pos >= 0
+        mask[mask] = ji.hostname[invocation.ji_pos[mask]] >= 0
+        hostnames = ji.hostname[invocation.ji_pos[mask]]
+
+        host_filter = self._get_host_filter_mask(data, hostnames)
+        if host_filter is not None:
+            mask[mask] = host_filter
+            hostnames = hostnames[host_filter]
+
+        return data, invocation.start_time[mask], invocation.remote_duration[mask], hostnames
+
+    def _get_job_times(self, per_host=False):
+        """
+        Returns the workflow data, and the EXECUTE timestamps, runtimes
+        and host names (None if not per_host) of the job instances
+        counted by get_jobs_run_by_time or get_jobs_run_by_time_per_host.
+        """
+        wf_ids = self._get_tree()
+        data, invocation, ji = self._get_data_for(wf_ids)
+
+        timestamps, pos = self._get_execute_jobstates(data, ji, wf_ids)
+        if not per_host:
+            has_runtime = ~numpy.isnan(ji.local_duration[pos])
+            return data, timestamps[has_runtime], ji.local_duration[pos][has_runtime], None
+
+        has_host = ji.hostname[pos] >= 0
+        timestamps, pos = timestamps[has_host], pos[has_host]
+
+        hostnames = ji.hostname[pos]
+        host_filter = self._get_host_filter_mask(data, hostnames)
+        if host_filter is not None:
+            timestamps, pos, hostnames = timestamps[host_filter], pos[host_filter], hostnames[host_filter]
+
+        return data, timestamps, ji.local_duration[pos], hostnames
+
+    def get_invocation_by_time(self):
+        """
+        Same rows as StampedeStatistics.get_invocation_by_time
+        """
+        data, timestamps, runtimes, hostnames = self._get_invocation_times()
+        return self._get_time_statistics(_bucket(timestamps, self._get_date_divisors()), runtimes)
+
+    def get_jobs_run_by_time(self):
+        """
+        Same rows as StampedeStatistics.get_jobs_run_by_time
+        """
+        data, timestamps, runtimes, hostnames = self._get_job_times()
+        return self._get_time_statistics(_bucket(timestamps, self._get_date_divisors()), runtimes)
+
+    def get_invocation_by_time_per_host(self, host=None):
+        """
+        Same rows as StampedeStatistics.get_invocation_by_time_per_host
+        """
+        data, timestamps, runtimes, hostnames = self._get_invocation_times(True)
+        return self._get_time_statistics(_bucket(timestamps, self._get_date_divisors()), runtimes, hostnames, data)
+
+    def get_jobs_run_by_time_per_host(self):
+        """
+        Same rows as StampedeStatistics.get_jobs_run_by_time_per_host
+        """
+        data, timestamps, runtimes, hostnames = self._get_job_times(True)
+        return self._get_time_statistics(_bucket(timestamps, self._get_date_divisors()), runtimes, hostnames, data)
+
+    def get_time_series(self, kind, granularity='hour', per_host=False, utc_offset=0):
+        """
+        Same series as StampedeStatistics.get_time_series
+        """
+        if granularity not in TIME_GRANULARITIES:
+            raise ValueError('Unknown time granularity %s' % granularity)
+        if kind == 'jobs':
+            data, timestamps, runtimes, hostnames = self._get_job_times(per_host)
+        elif kind == 'invocations':
+            data, timestamps, runtimes, hostnames = self._get_invocation_times(per_host)
+        else:
+            raise ValueError('Unknown time series %s' % kind)
+
+        buckets = _time_bucket(timestamps, granularity, utc_offset)
+        dates, names, counts, runtimes = self._by_time(buckets, runtimes, hostnames, data)
+
+        series = TimeSeries(granularity, utc_offset, per_host)
+        for i in xrange(len(dates)):
+            series.append(dates[i], counts[i], runtimes[i], names[i] if per_host else None)
+        return series
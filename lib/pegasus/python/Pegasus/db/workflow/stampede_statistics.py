@@ -48,10 +48,18 @@ will return different values after the filter is re/set.
 Time filtering:
 
 This behaves much like job filtering.  For the runtime queries,
-the time intervals 'month', 'week', 'day', and  'hour' can
+the time intervals 'month', 'week', 'day', 'hour' and 'minute' can
 be set using the set_time_filter() method.  If this method
 is not set, it will default to the 'month' interval for filtering.
 
+The get_time_series() method takes the interval as an argument
+instead.  It aligns the intervals to calendar days, weeks and months
+in a given time zone, and returns the rows in compact arrays::
+
+ series = s.get_time_series('invocations', 'day', per_host=True)
+ for row in series:
+     print row.bucket, row.host_name, row.count, row.total_runtime
+
 Hostname filtering:
 
 For the runtime queries the method set_host_filter() can be used to
@@ -148,6 +156,7 @@ Methods::
  get_jobs_run_by_time
  get_invocation_by_time_per_host
  get_jobs_run_by_time_per_host
+ get_time_series
 
 Methods listed in order of query list on wiki.
 
@@ -155,9 +164,143 @@ https://confluence.pegasus.isi.edu/display/pegasus/Pegasus+Statistics+Python+Ver
 """
 __author__ = "Monte Goode"
 
+from array import array
+from collections import namedtuple
+
 from Pegasus.db import connection
 from Pegasus.db.schema import *
 from Pegasus.db.errors import StampedeDBNotFoundError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+# Columns returned by get_job_statistics
+
+JobStatisticsRow = namedtuple('JobStatisticsRow', ['job_id', 'job_instance_id', 'job_submit_seq',
+    'job_name', 'site', 'condor_q_time', 'resource_delay', 'runtime', 'kickstart', 'post_time',
+    'seqexec', 'exit_code', 'host_name', 'multiplier_factor', 'kickstart_multi', 'remote_cpu_time'])
+
+# Number of rows fetched at a time by the streaming queries
+_YIELD_PER = 1000
+
+# Granularities of get_time_series, and the length in seconds of the
+# fixed length ones
+TIME_GRANULARITIES = ['minute', 'hour', 'day', 'week', 'month']
+BUCKET_SIZES = {
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+    'week': 604800
+}
+
+# Weeks start on Mondays, and 1969-12-29 was a Monday
+WEEK_ORIGIN = -3 * 86400
+
+TimeSeriesRow = namedtuple('TimeSeriesRow', ['bucket', 'host_name', 'count', 'total_runtime'])
+
+def get_utc_offsets(utc_offset):
+    """
+    Returns utc_offset as a list of (timestamp, offset) tuples. An
+    offset is in seconds east of UTC, and applies from its timestamp
+    until the next one. utc_offset is either a single offset, or such
+    a list, sorted by timestamp; the first offset also applies before
+    its timestamp.
+    """
+    if isinstance(utc_offset, (int, long, float)):
+        return [(None, int(utc_offset))]
+    return [(timestamp, int(offset)) for timestamp, offset in utc_offset]
+
+class TimeSeries(object):
+    """
+    Number of job instances or invocations, and their total runtime,
+    per time bucket (and host), as returned by get_time_series. The
+    columns are stored in arrays:
+
+    buckets:  start of each bucket in local time, that is in seconds
+              since 1970-01-01 00:00 in the time zone of the series
+    hosts:    host names, None if the series is not per host
+    counts:   number of job instances or invocations
+    runtimes: total runtime, NaN if no runtime was recorded
+
+    Iterating over the series yields TimeSeriesRow tuples, with a
+    total_runtime of None instead of NaN.
+    """
+    def __init__(self, granularity, utc_offset=0, per_host=False):
+        self.granularity = granularity
+        self.utc_offset = utc_offset
+        self.buckets = array('l')
+        self.hosts = [] if per_host else None
+        self.counts = array('l')
+        self.runtimes = array('d')
+
+    def append(self, bucket, count, total_runtime, host_name=None):
+        self.buckets.append(int(bucket))
+        if self.hosts is not None:
+            self.hosts.append(host_name)
+        self.counts.append(count)
+        self.runtimes.append(float('nan') if total_runtime is None else total_runtime)
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def __iter__(self):
+        hosts = self.hosts if self.hosts is not None else [None] * len(self)
+        for bucket, host_name, count, runtime in zip(self.buckets, hosts, self.counts, self.runtimes):
+            yield TimeSeriesRow(bucket, host_name, count, None if runtime != runtime else runtime)
+
+class time_bucket(FunctionElement):
+    """
+    Start of the time bucket of a timestamp column, in local time (see
+    TimeSeries). The local time is the timestamp plus the UTC offset
+    (see get_utc_offsets) in effect at the timestamp. Days start at
+    midnight, weeks on Mondays and months on the first day of the
+    month.
+    """
+    type = Integer()
+    name = 'time_bucket'
+
+    def __init__(self, column, granularity, utc_offset=0):
+        if granularity not in TIME_GRANULARITIES:
+            raise ValueError('Unknown time granularity %s' % granularity)
+        self.granularity = granularity
+        self.utc_offsets = get_utc_offsets(utc_offset)
+        FunctionElement.__init__(self, column)
+
+@compiles(time_bucket)
+def visit_time_bucket(element, compiler, **kw):
+    column = list(element.clauses)[0]
+    dialect = compiler.dialect.name
+
+    offsets = element.utc_offsets
+    offset = literal_column(str(offsets[-1][1]))
+    if len(offsets) > 1:
+        offset = case([(column < literal_column(repr(float(offsets[i + 1][0]))), literal_column(str(offsets[i][1])))
+                       for i in range(len(offsets) - 1)], else_=offset)
+    local = column + offset
+
+    if element.granularity == 'month':
+        if dialect == 'sqlite':
+            start = cast(func.strftime('%s', local, 'unixepoch', 'start of month'), Integer)
+        elif dialect == 'mysql':
+            epoch = literal('1970-01-01')
+            second = literal_column('SECOND')
+            local = func.timestampadd(second, func.floor(local), epoch)
+            start = func.timestampdiff(second, epoch, func.date_format(local, literal('%Y-%m-01')))
+        elif dialect == 'postgresql':
+            start = extract('epoch', func.date_trunc('month', func.timezone('UTC', func.to_timestamp(local))))
+        else:
+            raise CompileError('Monthly time buckets are not supported on %s' % dialect)
+        return compiler.process(start, **kw)
+
+    size = literal_column(str(BUCKET_SIZES[element.granularity]))
+    origin = literal_column(str(WEEK_ORIGIN if element.granularity == 'week' else 0))
+    local = (local - origin) / size
+    if dialect == 'sqlite':
+        # Timestamps are positive, so truncating is the same as flooring
+        local = cast(local, Integer)
+    else:
+        local = func.floor(local)
+    start = local * size + origin
+    return compiler.process(start, **kw)
 
 # Main stats class.
 
@@ -277,7 +420,7 @@ class StampedeStatistics(object):
 
 
     def set_time_filter(self, filter='month'):
-        modes = ['month', 'week', 'day', 'hour']
+        modes = ['month', 'week', 'day', 'hour', 'minute']
         try:
             modes.index(filter)
             self._time_filter_mode = filter
@@ -806,93 +949,155 @@ class StampedeStatistics(object):
     def get_job_statistics(self):
         """
         https://confluence.pegasus.isi.edu/display/pegasus/Job+Statistics+file#JobStatisticsfile-All
-        """
-        if self._expand:
-            return []
-        sq_1 = self.session.query(func.min(Jobstate.timestamp))
-        sq_1 = sq_1.filter(Jobstate.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_1 = sq_1.filter(or_(Jobstate.state == 'GRID_SUBMIT', Jobstate.state == 'GLOBUS_SUBMIT',
-                                Jobstate.state == 'EXECUTE'))
-        sq_1 = sq_1.subquery()
-
-        sq_2 = self.session.query(Jobstate.timestamp)
-        sq_2 = sq_2.filter(Jobstate.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_2 = sq_2.filter(Jobstate.state == 'SUBMIT')
-        sq_2 = sq_2.subquery()
-
-        sq_3 = self.session.query(func.min(Jobstate.timestamp))
-        sq_3 = sq_3.filter(Jobstate.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_3 = sq_3.filter(Jobstate.state == 'EXECUTE')
-        sq_3 = sq_3.subquery()
-
-        sq_4 = self.session.query(func.min(Jobstate.timestamp))
-        sq_4 = sq_4.filter(Jobstate.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_4 = sq_4.filter(or_(Jobstate.state == 'GRID_SUBMIT', Jobstate.state == 'GLOBUS_SUBMIT'))
-        sq_4 = sq_4.subquery()
 
-        sq_5 = self.session.query(func.sum(Invocation.remote_duration))
-        sq_5 = sq_5.filter(Invocation.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_5 = sq_5.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        sq_5 = sq_5.filter(Invocation.task_submit_seq >= 0)
-        sq_5 = sq_5.group_by().subquery()
-
-        sq_6 = self.session.query(Jobstate.timestamp)
-        sq_6 = sq_6.filter(Jobstate.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_6 = sq_6.filter(Jobstate.state == 'POST_SCRIPT_TERMINATED')
-        sq_6 = sq_6.subquery()
-
-        sq_7 = self.session.query(func.max(Jobstate.timestamp))
-        sq_7 = sq_7.filter(Jobstate.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_7 = sq_7.filter(or_(Jobstate.state == 'POST_SCRIPT_STARTED', Jobstate.state == 'JOB_TERMINATED'))
-        sq_7 = sq_7.subquery()
-
-        sq_8 = self.session.query(func.max(Invocation.exitcode))
-        sq_8 = sq_8.filter(Invocation.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_8 = sq_8.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        #PM-704 the task submit sequence needs to be >= -1 to include prescript status
-        sq_8 = sq_8.filter(Invocation.task_submit_seq >= -1)
-        sq_8 = sq_8.group_by().subquery()
+        The jobstate and invocation values are read from the
+        job_instance_summary table, which the loader keeps up to date,
+        so this is a single join instead of one set of correlated
+        subqueries per job instance. Databases without that table are
+        handled by _iter_job_statistics_merge.
+        """
+        return list(self.iter_job_statistics())
 
-        JobInstanceSub = orm.aliased(JobInstance)
+    def iter_job_statistics(self):
+        """
+        Same as get_job_statistics, but the rows are fetched from the
+        database as they are consumed, using a server side cursor where
+        the database supports it, so that workflows with millions of job
+        instances do not have to fit in memory.
+        """
+        if self._expand:
+            return
 
-        sq_9 = self.session.query(Host.hostname)
-        sq_9 = sq_9.filter(JobInstanceSub.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_9 = sq_9.filter(Host.host_id == JobInstanceSub.host_id)
-        sq_9 = sq_9.subquery()
+        if check_table_exists(self.session.get_bind(), st_job_instance_summary):
+            rows = self._iter_job_statistics_summary()
+        else:
+            rows = self._iter_job_statistics_merge()
 
-        JI = orm.aliased(JobInstance)
-        sq_10 = self.session.query(func.sum(Invocation.remote_duration * JI.multiplier_factor))
-        sq_10 = sq_10.filter(Invocation.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_10 = sq_10.filter(Invocation.job_instance_id == JI.job_instance_id)
-        sq_10 = sq_10.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        sq_10 = sq_10.filter(Invocation.task_submit_seq >= 0)
-        sq_10 = sq_10.group_by().subquery()
+        for row in rows:
+            yield row
 
-        sq_11 = self.session.query(func.sum(Invocation.remote_cpu_time))
-        sq_11 = sq_11.filter(Invocation.job_instance_id == JobInstance.job_instance_id).correlate(JobInstance)
-        sq_11 = sq_11.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        sq_11 = sq_11.filter(Invocation.task_submit_seq >= 0)
-        sq_11 = sq_11.group_by().subquery()
+    def _iter_job_statistics_summary(self):
+        """
+        Job statistics read from the job_instance_summary table.
+        """
+        def least(a, b):
+            return case([(a == None, b), (b == None, a), (a < b, a)], else_=b)
 
+        def greatest(a, b):
+            return case([(a == None, b), (b == None, a), (a > b, a)], else_=b)
 
+        S = JobInstanceSummary
         q = self.session.query(Job.job_id, JobInstance.job_instance_id, JobInstance.job_submit_seq,
             Job.exec_job_id.label('job_name'), JobInstance.site,
-            cast(sq_1.as_scalar() - sq_2.as_scalar(), Float).label('condor_q_time'),
-            cast(sq_3.as_scalar() - sq_4.as_scalar(), Float).label('resource_delay'),
+            cast(least(S.grid_submit_time, S.execute_time) - S.submit_time, Float).label('condor_q_time'),
+            cast(S.execute_time - S.grid_submit_time, Float).label('resource_delay'),
             cast(JobInstance.local_duration, Float).label('runtime'),
-            cast(sq_5.as_scalar(), Float).label('kickstart'),
-            cast(sq_6.as_scalar() - sq_7.as_scalar(), Float).label('post_time'),
+            cast(S.remote_duration, Float).label('kickstart'),
+            cast(S.post_script_terminate_time - greatest(S.post_script_start_time, S.terminate_time), Float).label('post_time'),
             cast(JobInstance.cluster_duration, Float).label('seqexec'),
-            sq_8.as_scalar().label('exit_code'),
-            sq_9.as_scalar().label('host_name'),
+            S.max_exitcode.label('exit_code'),
+            Host.hostname.label('host_name'),
             JobInstance.multiplier_factor,
-            cast(sq_10.as_scalar(), Float).label('kickstart_multi'),
-            sq_11.as_scalar().label('remote_cpu_time'))
-        q = q.filter(JobInstance.job_id == Job.job_id)
+            cast(S.remote_duration_multi, Float).label('kickstart_multi'),
+            S.remote_cpu_time)
+        q = q.select_from(JobInstance)
+        q = q.join(Job, JobInstance.job_id == Job.job_id)
+        q = q.outerjoin(Host, Host.host_id == JobInstance.host_id)
+        q = q.outerjoin(S, S.job_instance_id == JobInstance.job_instance_id)
         q = q.filter(Job.wf_id.in_(self._wfs))
-        q = q.order_by(JobInstance.job_submit_seq)
+        q = q.order_by(JobInstance.job_submit_seq, JobInstance.job_instance_id)
 
-        return q.all()
+        for row in q.yield_per(_YIELD_PER):
+            yield JobStatisticsRow(*row)
+
+    def _iter_job_statistics_merge(self):
+        """
+        Job statistics computed without the job_instance_summary table.
+
+        Instead of one query per job instance with correlated subqueries,
+        this scans the job_instance, jobstate and invocation tables once
+        each, and merges the three streams ordered by job_submit_seq and
+        job_instance_id. jobstate and invocation are aggregated by the
+        database, so that the values are computed the same way as from
+        the summary table.
+        """
+        q_ji = self.session.query(Job.job_id, JobInstance.job_instance_id, JobInstance.job_submit_seq,
+            Job.exec_job_id.label('job_name'), JobInstance.site,
+            cast(JobInstance.local_duration, Float).label('runtime'),
+            cast(JobInstance.cluster_duration, Float).label('seqexec'),
+            Host.hostname.label('host_name'),
+            JobInstance.multiplier_factor)
+        q_ji = q_ji.select_from(JobInstance)
+        q_ji = q_ji.join(Job, JobInstance.job_id == Job.job_id)
+        q_ji = q_ji.outerjoin(Host, Host.host_id == JobInstance.host_id)
+        q_ji = q_ji.filter(Job.wf_id.in_(self._wfs))
+        q_ji = q_ji.order_by(JobInstance.job_submit_seq, JobInstance.job_instance_id)
+
+        def state_time(function, *states):
+            return function(case([(Jobstate.state.in_(states), Jobstate.timestamp)]))
+
+        q_js = self.session.query(JobInstance.job_submit_seq, Jobstate.job_instance_id,
+            cast(state_time(func.min, 'GRID_SUBMIT', 'GLOBUS_SUBMIT', 'EXECUTE') -
+                 state_time(func.min, 'SUBMIT'), Float).label('condor_q_time'),
+            cast(state_time(func.min, 'EXECUTE') -
+                 state_time(func.min, 'GRID_SUBMIT', 'GLOBUS_SUBMIT'), Float).label('resource_delay'),
+            cast(state_time(func.min, 'POST_SCRIPT_TERMINATED') -
+                 state_time(func.max, 'POST_SCRIPT_STARTED', 'JOB_TERMINATED'), Float).label('post_time'))
+        q_js = q_js.select_from(Jobstate)
+        q_js = q_js.join(JobInstance, Jobstate.job_instance_id == JobInstance.job_instance_id)
+        q_js = q_js.join(Job, JobInstance.job_id == Job.job_id)
+        q_js = q_js.filter(Job.wf_id.in_(self._wfs))
+        q_js = q_js.group_by(JobInstance.job_submit_seq, Jobstate.job_instance_id)
+        q_js = q_js.order_by(JobInstance.job_submit_seq, Jobstate.job_instance_id)
+
+        def task_value(value):
+            return case([(Invocation.task_submit_seq >= 0, value)])
+
+        q_inv = self.session.query(JobInstance.job_submit_seq, Invocation.job_instance_id,
+            cast(func.sum(task_value(Invocation.remote_duration)), Float).label('kickstart'),
+            func.max(Invocation.exitcode).label('exit_code'),
+            cast(func.sum(task_value(Invocation.remote_duration * JobInstance.multiplier_factor)), Float).label('kickstart_multi'),
+            func.sum(task_value(Invocation.remote_cpu_time)).label('remote_cpu_time'))
+        q_inv = q_inv.select_from(Invocation)
+        q_inv = q_inv.join(JobInstance, Invocation.job_instance_id == JobInstance.job_instance_id)
+        q_inv = q_inv.join(Job, and_(JobInstance.job_id == Job.job_id, Invocation.wf_id == Job.wf_id))
+        q_inv = q_inv.filter(Job.wf_id.in_(self._wfs))
+        #PM-704 the task submit sequence needs to be >= -1 to include prescript status
+        q_inv = q_inv.filter(Invocation.task_submit_seq >= -1)
+        q_inv = q_inv.group_by(JobInstance.job_submit_seq, Invocation.job_instance_id)
+        q_inv = q_inv.order_by(JobInstance.job_submit_seq, Invocation.job_instance_id)
+
+        def merge(ji, rows, row):
+            # Advances rows up to the aggregate of job instance ji, returns
+            # it (or None), and the next row of the stream
+            key = (ji.job_submit_seq, ji.job_instance_id)
+            while row is not None and (row.job_submit_seq, row.job_instance_id) < key:
+                row = next(rows, None)
+            if row is not None and (row.job_submit_seq, row.job_instance_id) == key:
+                return row, row
+            return None, row
+
+        jobstates = iter(q_js.yield_per(_YIELD_PER))
+        invocations = iter(q_inv.yield_per(_YIELD_PER))
+        js = next(jobstates, None)
+        inv = next(invocations, None)
+
+        for ji in q_ji.yield_per(_YIELD_PER):
+            my_js, js = merge(ji, jobstates, js)
+            my_inv, inv = merge(ji, invocations, inv)
+
+            yield JobStatisticsRow(ji.job_id, ji.job_instance_id, ji.job_submit_seq, ji.job_name, ji.site,
+                my_js and my_js.condor_q_time,
+                my_js and my_js.resource_delay,
+                ji.runtime,
+                my_inv and my_inv.kickstart,
+                my_js and my_js.post_time,
+                ji.seqexec,
+                my_inv and my_inv.exit_code,
+                ji.host_name,
+                ji.multiplier_factor,
+                my_inv and my_inv.kickstart_multi,
+                my_inv and my_inv.remote_cpu_time)
 
     def _state_sub_q(self, states, function=None):
         sq = None
@@ -1313,7 +1518,8 @@ class StampedeStatistics(object):
         'month': 2629743,
         'week': 604800,
         'day': 86400,
-        'hour': 3600
+        'hour': 3600,
+        'minute': 60
         }
         return vals[self._time_filter_mode]
 
@@ -1352,41 +1558,66 @@ class StampedeStatistics(object):
         else:
             return None
 
-    def get_invocation_by_time(self):
-        """
-        https://confluence.pegasus.isi.edu/display/pegasus/Additional+queries
-        """
-        q = self.session.query(
-                (cast(Invocation.start_time / self._get_date_divisors(), Integer)).label('date_format'),
-                func.count(Invocation.invocation_id).label('count'),
-                cast(func.sum(Invocation.remote_duration), Float).label('total_runtime')
-        )
+    def _get_invocation_by_time_query(self, date_format, per_host=False):
+        columns = [date_format.label('date_format')]
+        if per_host:
+            columns.append(Host.hostname.label('host_name'))
+        columns += [
+            func.count(Invocation.invocation_id).label('count'),
+            cast(func.sum(Invocation.remote_duration), Float).label('total_runtime')
+        ]
+        q = self.session.query(*columns)
         q = q.filter(Workflow.root_wf_id == self._root_wf_id)
         q = q.filter(Invocation.wf_id == Workflow.wf_id)
+        if per_host:
+            q = q.filter(JobInstance.job_instance_id == Invocation.job_instance_id)
+            q = q.filter(JobInstance.host_id == Host.host_id)
+            if self._get_host_filter() is not None:
+                q = q.filter(self._get_host_filter())
         if self._get_xform_filter() is not None:
             q = q.filter(self._get_xform_filter())
-        q = q.group_by('date_format').order_by('date_format')
 
-        return q.all()
+        return q
 
-    def get_jobs_run_by_time(self):
-        """
-        https://confluence.pegasus.isi.edu/display/pegasus/Additional+queries
-        """
-        q = self.session.query(
-                (cast(Jobstate.timestamp / self._get_date_divisors(), Integer)).label('date_format'),
-                func.count(JobInstance.job_instance_id).label('count'),
-                cast(func.sum(JobInstance.local_duration), Float).label('total_runtime')
-        )
+    def _get_jobs_run_by_time_query(self, date_format, per_host=False):
+        columns = [date_format.label('date_format')]
+        if per_host:
+            columns.append(Host.hostname.label('host_name'))
+        columns += [
+            func.count(JobInstance.job_instance_id).label('count'),
+            cast(func.sum(JobInstance.local_duration), Float).label('total_runtime')
+        ]
+        q = self.session.query(*columns)
         q = q.filter(Workflow.root_wf_id == self._root_wf_id)
         q = q.filter(Workflow.wf_id == Job.wf_id)
         q = q.filter(Job.job_id == JobInstance.job_id)
         q = q.filter(Jobstate.job_instance_id == JobInstance.job_instance_id)
         q = q.filter(Jobstate.state == 'EXECUTE')
-        q = q.filter(JobInstance.local_duration != None)
-
+        if per_host:
+            q = q.filter(JobInstance.host_id == Host.host_id)
+            if self._get_host_filter() is not None:
+                q = q.filter(self._get_host_filter())
+        else:
+            q = q.filter(JobInstance.local_duration != None)
         if self._get_job_filter() is not None:
             q = q.filter(self._get_job_filter())
+
+        return q
+
+    def get_invocation_by_time(self):
+        """
+        https://confluence.pegasus.isi.edu/display/pegasus/Additional+queries
+        """
+        q = self._get_invocation_by_time_query(cast(Invocation.start_time / self._get_date_divisors(), Integer))
+        q = q.group_by('date_format').order_by('date_format')
+
+        return q.all()
+
+    def get_jobs_run_by_time(self):
+        """
+        https://confluence.pegasus.isi.edu/display/pegasus/Additional+queries
+        """
+        q = self._get_jobs_run_by_time_query(cast(Jobstate.timestamp / self._get_date_divisors(), Integer))
         q = q.group_by('date_format').order_by('date_format')
 
         return q.all()
@@ -1396,20 +1627,7 @@ class StampedeStatistics(object):
         """
         https://confluence.pegasus.isi.edu/display/pegasus/Additional+queries
         """
-        q = self.session.query(
-            (cast(Invocation.start_time / self._get_date_divisors(), Integer)).label('date_format'),
-            Host.hostname.label('host_name'),
-            func.count(Invocation.invocation_id).label('count'),
-            cast(func.sum(Invocation.remote_duration), Float).label('total_runtime')
-        )
-        q = q.filter(Workflow.root_wf_id == self._root_wf_id)
-        q = q.filter(Invocation.wf_id == Workflow.wf_id)
-        q = q.filter(JobInstance.job_instance_id == Invocation.job_instance_id)
-        q = q.filter(JobInstance.host_id == Host.host_id)
-        if self._get_host_filter() is not None:
-            q = q.filter(self._get_host_filter())
-        if self._get_xform_filter() is not None:
-            q = q.filter(self._get_xform_filter())
+        q = self._get_invocation_by_time_query(cast(Invocation.start_time / self._get_date_divisors(), Integer), True)
         q = q.group_by('date_format', 'host_name').order_by('date_format')
 
         return q.all()
@@ -1418,23 +1636,37 @@ class StampedeStatistics(object):
         """
         https://confluence.pegasus.isi.edu/display/pegasus/Additional+queries
         """
-        q = self.session.query(
-                (cast(Jobstate.timestamp / self._get_date_divisors(), Integer)).label('date_format'),
-                Host.hostname.label('host_name'),
-                func.count(JobInstance.job_instance_id).label('count'),
-                cast(func.sum(JobInstance.local_duration), Float).label('total_runtime')
-        )
-        q = q.filter(Workflow.root_wf_id == self._root_wf_id)
-        q = q.filter(Workflow.wf_id == Job.wf_id)
-        q = q.filter(Job.job_id == JobInstance.job_id)
-        q = q.filter(Jobstate.job_instance_id == JobInstance.job_instance_id)
-        q = q.filter(Jobstate.state == 'EXECUTE')
-        q = q.filter(JobInstance.host_id == Host.host_id)
-        if self._get_host_filter() is not None:
-            q = q.filter(self._get_host_filter())
-        if self._get_job_filter() is not None:
-            q = q.filter(self._get_job_filter())
+        q = self._get_jobs_run_by_time_query(cast(Jobstate.timestamp / self._get_date_divisors(), Integer), True)
         q = q.group_by('date_format', 'host_name').order_by('date_format')
 
         return q.all()
 
+    def get_time_series(self, kind, granularity='hour', per_host=False, utc_offset=0):
+        """
+        Returns a TimeSeries with the number of job instances run
+        (kind 'jobs') or invocations (kind 'invocations'), and their
+        total runtime, per time bucket, and per host if per_host is
+        True. The granularity is one of TIME_GRANULARITIES, and the
+        buckets are in the local time given by utc_offset, either an
+        offset in seconds east of UTC or a list of them (see
+        get_utc_offsets). The rows are the ones counted by
+        get_jobs_run_by_time, get_invocation_by_time and their per
+        host variants, but the database does the bucketing, and the
+        rows are ordered by bucket and host.
+        """
+        if kind == 'jobs':
+            q = self._get_jobs_run_by_time_query(time_bucket(Jobstate.timestamp, granularity, utc_offset), per_host)
+        elif kind == 'invocations':
+            q = self._get_invocation_by_time_query(time_bucket(Invocation.start_time, granularity, utc_offset), per_host)
+        else:
+            raise ValueError('Unknown time series %s' % kind)
+
+        group_by = ['date_format', 'host_name'] if per_host else ['date_format']
+        q = q.group_by(*group_by).order_by(*group_by)
+
+        series = TimeSeries(granularity, utc_offset, per_host)
+        for row in q.all():
+            series.append(row.date_format, row.count, row.total_runtime, row.host_name if per_host else None)
+
+        return series
+
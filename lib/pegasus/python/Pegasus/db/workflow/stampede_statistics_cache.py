@@ -0,0 +1,336 @@
+"""
+Persistent cache of per-workflow statistics.
+
+Tools like pegasus-statistics are often run periodically on workflows
+that are still running, and most of the sub-workflows of a large
+hierarchical workflow do not change between two runs. The cache keeps,
+for each workflow:
+
+ - the per-transformation invocation statistics and the cumulative job
+   wall time. These are partial aggregates, and new invocation rows are
+   folded into them using the highest invocation_id seen so far.
+
+ - a signature of the workflow state: the highest job_instance_id, and
+   the number of jobstate and workflowstate rows with their latest
+   timestamps. jobstate and workflowstate have no row id that can be
+   used as a high-water mark, so other statistics of the workflow can be
+   stored with set(), and are dropped as soon as the signature changes.
+
+Usage::
+ cache = StampedeStatisticsCache(default_filename(db_url))
+ cache.update(session, wf_uuids)
+ print cache.get_transformation_statistics(wf_uuids)
+ cache.save()
+
+The cache is stored as a JSON file. For SQLite databases, the default
+location is next to the database file.
+"""
+
+import os
+import json
+import logging
+import tempfile
+from collections import namedtuple
+
+from sqlalchemy.engine.url import make_url
+
+from Pegasus.db.schema import *
+
+# Version of the cache file format. Files with a different version are
+# ignored, and the cache is rebuilt
+CACHE_VERSION = 1
+
+# Suffix added to the SQLite database file name
+CACHE_FILE_SUFFIX = ".statistics-cache"
+
+# Max number of workflows in one IN clause
+_CHUNK_SIZE = 500
+
+# Columns returned by get_transformation_statistics, the same as the
+# ones of StampedeStatistics.get_transformation_statistics
+TransformationStatisticsRow = namedtuple('TransformationStatisticsRow', ['transformation', 'count', 'success',
+    'failure', 'min', 'max', 'avg', 'sum'])
+
+log = logging.getLogger(__name__)
+
+def default_filename(db_url):
+    """
+    Returns the default cache file for a database URL, which is next
+    to the database for SQLite, and None for other databases.
+    """
+    url = make_url(db_url)
+    if url.drivername.split('+')[0] != 'sqlite' or not url.database:
+        return None
+    return os.path.abspath(url.database) + CACHE_FILE_SUFFIX
+
+def _chunks(values):
+    for i in range(0, len(values), _CHUNK_SIZE):
+        yield values[i:i + _CHUNK_SIZE]
+
+def _float(value):
+    if value is None:
+        return None
+    return float(value)
+
+class StampedeStatisticsCache(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self._workflows = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+
+        try:
+            f = open(self.filename)
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError), e:
+            log.warning("Ignoring statistics cache %s: %s" % (self.filename, e))
+            return
+
+        if data.get("version") != CACHE_VERSION:
+            log.info("Ignoring statistics cache %s with version %s" % (self.filename, data.get("version")))
+            return
+
+        self._workflows = data["workflows"]
+
+    def save(self):
+        """
+        Writes the cache file. The file is replaced atomically, so that
+        concurrent readers never see a partial file.
+        """
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(self.filename) + ".", dir=dirname)
+        try:
+            # mkstemp creates the file readable by the owner only
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0666 & ~umask)
+
+            f = os.fdopen(fd, "w")
+            try:
+                json.dump({"version": CACHE_VERSION, "workflows": self._workflows}, f)
+            finally:
+                f.close()
+            os.rename(tmp, self.filename)
+        except:
+            os.unlink(tmp)
+            raise
+
+    def update(self, session, wf_uuids):
+        """
+        Brings the cache up to date for the given workflows. Invocations
+        inserted since the last update are folded into the partial
+        aggregates, and the values stored with set() are dropped for the
+        workflows whose state changed.
+        """
+        wf_uuids = list(wf_uuids)
+
+        workflows = {}
+        for chunk in _chunks(wf_uuids):
+            q = session.query(Workflow.wf_id, Workflow.wf_uuid, Workflow.dax_label)
+            q = q.filter(Workflow.wf_uuid.in_(chunk))
+            for row in q.all():
+                workflows[row.wf_id] = row
+
+        signatures = self._get_signatures(session, workflows.keys())
+
+        # Invocations inserted after this point are picked up by the
+        # next update
+        max_invocation_id = session.query(func.max(Invocation.invocation_id)).scalar() or 0
+
+        by_high_water_mark = {}
+        for wf_id, wf in workflows.items():
+            entry = self._workflows.get(wf.wf_uuid)
+            signature = signatures[wf_id]
+
+            if entry is not None and not self._is_valid(entry, wf_id, signature, max_invocation_id):
+                log.debug("Rebuilding statistics cache of workflow %s" % wf.wf_uuid)
+                entry = None
+
+            if entry is None:
+                entry = {
+                    "wf_id": wf_id,
+                    "max_invocation_id": 0,
+                    "transformations": {},
+                    "wall_time": [0, 0.0, 0.0, 0.0],
+                    "signature": None,
+                    "values": {},
+                }
+                self._workflows[wf.wf_uuid] = entry
+
+            entry["dax_label"] = wf.dax_label
+            if entry["signature"] != signature:
+                entry["signature"] = signature
+                entry["values"] = {}
+
+            by_high_water_mark.setdefault(entry["max_invocation_id"], []).append(wf_id)
+
+        for high_water_mark, wf_ids in by_high_water_mark.items():
+            for chunk in _chunks(wf_ids):
+                self._fold_invocations(session, workflows, chunk, high_water_mark, max_invocation_id)
+
+        for wf in workflows.values():
+            self._workflows[wf.wf_uuid]["max_invocation_id"] = max_invocation_id
+
+    def _get_signatures(self, session, wf_ids):
+        signatures = dict((wf_id, [0, 0, None, 0, None]) for wf_id in wf_ids)
+
+        for chunk in _chunks(wf_ids):
+            q = session.query(Job.wf_id, func.max(JobInstance.job_instance_id))
+            q = q.filter(Job.job_id == JobInstance.job_id)
+            q = q.filter(Job.wf_id.in_(chunk))
+            q = q.group_by(Job.wf_id)
+            for wf_id, max_job_instance_id in q.all():
+                signatures[wf_id][0] = max_job_instance_id
+
+            q = session.query(Job.wf_id, func.count(Jobstate.job_instance_id), func.max(Jobstate.timestamp))
+            q = q.filter(Job.job_id == JobInstance.job_id)
+            q = q.filter(JobInstance.job_instance_id == Jobstate.job_instance_id)
+            q = q.filter(Job.wf_id.in_(chunk))
+            q = q.group_by(Job.wf_id)
+            for wf_id, count, timestamp in q.all():
+                signatures[wf_id][1:3] = [count, _float(timestamp)]
+
+            q = session.query(Workflowstate.wf_id, func.count(Workflowstate.wf_id), func.max(Workflowstate.timestamp))
+            q = q.filter(Workflowstate.wf_id.in_(chunk))
+            q = q.group_by(Workflowstate.wf_id)
+            for wf_id, count, timestamp in q.all():
+                signatures[wf_id][3:5] = [count, _float(timestamp)]
+
+        return signatures
+
+    def _is_valid(self, entry, wf_id, signature, max_invocation_id):
+        """
+        Checks that a cache entry still describes the workflow in the
+        database. It does not if the workflow was loaded again, for
+        instance with pegasus-monitord in replay mode, or if the
+        database was recreated.
+        """
+        if entry["wf_id"] != wf_id or entry["max_invocation_id"] > max_invocation_id:
+            return False
+
+        old = entry["signature"]
+        if old is None:
+            return True
+
+        # Row counts and ids only grow while a workflow runs
+        return (signature[0] or 0) >= (old[0] or 0) and signature[1] >= old[1] and signature[3] >= old[3]
+
+    def _fold_invocations(self, session, workflows, wf_ids, high_water_mark, max_invocation_id):
+        duration = Invocation.remote_duration * JobInstance.multiplier_factor
+        is_task = Invocation.task_submit_seq >= 0
+
+        q = session.query(Invocation.wf_id, Invocation.transformation,
+                func.count(Invocation.invocation_id),
+                func.count(case([(Invocation.exitcode == 0, Invocation.exitcode)])),
+                func.count(case([(Invocation.exitcode != 0, Invocation.exitcode)])),
+                func.min(duration),
+                func.max(duration),
+                func.sum(duration),
+                func.count(case([(is_task, 1)])),
+                func.sum(case([(is_task, duration)], else_=0)),
+                func.sum(case([(and_(is_task, Invocation.exitcode == 0), duration)], else_=0)),
+                func.sum(case([(and_(is_task, Invocation.exitcode > 0), duration)], else_=0)))
+        q = q.filter(Invocation.job_instance_id == JobInstance.job_instance_id)
+        q = q.filter(Invocation.wf_id.in_(wf_ids))
+        q = q.filter(Invocation.invocation_id > high_water_mark)
+        q = q.filter(Invocation.invocation_id <= max_invocation_id)
+        q = q.group_by(Invocation.wf_id, Invocation.transformation)
+
+        for row in q.all():
+            (wf_id, transformation, count, success, failure, min_duration, max_duration, sum_duration,
+             tasks, wall_time, goodput, badput) = row
+            entry = self._workflows[workflows[wf_id].wf_uuid]
+
+            # The workflow changed, so the values computed from it are stale
+            entry["values"] = {}
+
+            stats = entry["transformations"].get(transformation)
+            if stats is None:
+                entry["transformations"][transformation] = [count, success, failure, _float(min_duration),
+                                                            _float(max_duration), _float(sum_duration)]
+            else:
+                stats[0] += count
+                stats[1] += success
+                stats[2] += failure
+                stats[3] = min(stats[3], _float(min_duration))
+                stats[4] = max(stats[4], _float(max_duration))
+                stats[5] += _float(sum_duration)
+
+            # Same filters as StampedeStatistics.get_workflow_cum_job_wall_time
+            if transformation != 'condor::dagman' and tasks:
+                wall = entry["wall_time"]
+                wall[0] += tasks
+                wall[1] += _float(wall_time)
+                wall[2] += _float(goodput)
+                wall[3] += _float(badput)
+
+    def _entries(self, wf_uuids):
+        for wf_uuid in wf_uuids:
+            if wf_uuid not in self._workflows:
+                raise KeyError("Workflow %s is not in the statistics cache, update() it first" % wf_uuid)
+            yield self._workflows[wf_uuid]
+
+    def get_dax_label(self, wf_uuid):
+        return self._workflows[wf_uuid]["dax_label"]
+
+    def get_transformation_statistics(self, wf_uuids):
+        """
+        Returns the transformation statistics of the given workflows
+        combined, like StampedeStatistics.get_transformation_statistics
+        """
+        combined = {}
+        for entry in self._entries(wf_uuids):
+            for transformation, stats in entry["transformations"].items():
+                total = combined.get(transformation)
+                if total is None:
+                    combined[transformation] = list(stats)
+                else:
+                    total[0] += stats[0]
+                    total[1] += stats[1]
+                    total[2] += stats[2]
+                    total[3] = min(total[3], stats[3])
+                    total[4] = max(total[4], stats[4])
+                    total[5] += stats[5]
+
+        rows = []
+        for transformation in sorted(combined.keys()):
+            count, success, failure, min_duration, max_duration, sum_duration = combined[transformation]
+            rows.append(TransformationStatisticsRow(transformation, count, success, failure, min_duration,
+                                                    max_duration, sum_duration / count, sum_duration))
+        return rows
+
+    def get_workflow_cum_job_wall_time(self, wf_uuids):
+        """
+        Returns the cumulative job wall time, goodput and badput of the
+        given workflows, like StampedeStatistics.get_workflow_cum_job_wall_time
+        """
+        tasks = 0
+        wall_time = [0.0, 0.0, 0.0]
+        for entry in self._entries(wf_uuids):
+            tasks += entry["wall_time"][0]
+            for i in range(3):
+                wall_time[i] += entry["wall_time"][i + 1]
+
+        if tasks == 0:
+            return None, None, None
+        return tuple(wall_time)
+
+    def get(self, wf_uuid, key):
+        """
+        Returns a value stored with set(), or None if the workflow
+        changed since then.
+        """
+        return self._workflows[wf_uuid]["values"].get(key)
+
+    def set(self, wf_uuid, key, value):
+        """
+        Stores a value computed from the workflow. The value has to be
+        JSON serializable.
+        """
+        self._workflows[wf_uuid]["values"][key] = value
@@ -4,9 +4,215 @@ __author__ = "Karan Vahi"
 from Pegasus.db.schema import *
 from Pegasus.db.base_loader import BaseLoader
 from Pegasus.netlogger import util
-from sqlalchemy import exc
+from sqlalchemy import exc, bindparam
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import Insert, Executable, ClauseElement
 import time
 
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+@compiles(Insert, 'mysql')
+def mysql_insert_on_duplicate_key(insert, compiler, **kw):
+    """
+    Renders inserts created with the mysql_on_duplicate_key argument
+    (a list of column names) as INSERT ... ON DUPLICATE KEY UPDATE, so
+    that rows which already exist are updated in place.
+    """
+    statement = compiler.visit_insert(insert, **kw)
+    columns = insert.kwargs.get('mysql_on_duplicate_key')
+    if columns:
+        quote = compiler.preparer.quote_identifier
+        statement += ' ON DUPLICATE KEY UPDATE ' + \
+            ', '.join(['%s=VALUES(%s)' % (quote(c), quote(c)) for c in columns])
+    return statement
+
+class InsertFromSelect(Executable, ClauseElement):
+    """
+    INSERT INTO table (columns) SELECT ..., where the columns are the
+    names of the columns of the select.
+    """
+    def __init__(self, table, select):
+        self.table = table
+        self.select = select
+
+@compiles(InsertFromSelect)
+def visit_insert_from_select(element, compiler, **kw):
+    quote = compiler.preparer.quote_identifier
+    return 'INSERT INTO %s (%s) %s' % (compiler.process(element.table, asfrom=True),
+                                       ', '.join([quote(c.name) for c in element.select.columns]),
+                                       compiler.process(element.select))
+
+# Maximum number of job instances refreshed by each statement of
+# update_job_instance_summary. Their ids are bound three times, and
+# SQLite allows at most 999 bind parameters per statement.
+SUMMARY_CHUNK_SIZE = 300
+
+# Number of job_ids per query when reading back the job_instance_ids of
+# the job instances inserted by a batch
+JOB_ID_CHUNK_SIZE = 500
+
+def _job_instance_summary_select(job_instance_ids=None):
+    """
+    @type   job_instance_ids: list
+    @param  job_instance_ids: Job instances to summarize, or None
+        for all of them.
+
+    Returns the select computing the job_instance_summary rows from
+    the jobstate and invocation tables, with one aggregate scan of each.
+    """
+    ji = st_job_instance
+    job = st_job
+    js = st_jobstate
+    inv = st_invocation
+
+    def state_time(function, *states):
+        return function(case([(js.c.state.in_(states), js.c.timestamp)]))
+
+    js_q = select([js.c.job_instance_id,
+                   func.max(js.c.jobstate_submit_seq).label('jobstate_submit_seq'),
+                   state_time(func.min, 'SUBMIT').label('submit_time'),
+                   state_time(func.min, 'GRID_SUBMIT', 'GLOBUS_SUBMIT').label('grid_submit_time'),
+                   state_time(func.min, 'EXECUTE').label('execute_time'),
+                   state_time(func.max, 'JOB_TERMINATED').label('terminate_time'),
+                   state_time(func.max, 'POST_SCRIPT_STARTED').label('post_script_start_time'),
+                   state_time(func.min, 'POST_SCRIPT_TERMINATED').label('post_script_terminate_time')])
+    if job_instance_ids is not None:
+        js_q = js_q.where(js.c.job_instance_id.in_(job_instance_ids))
+    js_q = js_q.group_by(js.c.job_instance_id).alias('js_summary')
+
+    def task_value(value):
+        return case([(inv.c.task_submit_seq >= 0, value)])
+
+    inv_q = select([inv.c.job_instance_id,
+                    func.sum(task_value(inv.c.remote_duration)).label('remote_duration'),
+                    func.sum(task_value(inv.c.remote_duration * ji.c.multiplier_factor)).label('remote_duration_multi'),
+                    func.sum(task_value(inv.c.remote_cpu_time)).label('remote_cpu_time'),
+                    func.max(inv.c.exitcode).label('max_exitcode')],
+                   from_obj=inv.join(ji, inv.c.job_instance_id == ji.c.job_instance_id)
+                               .join(job, and_(ji.c.job_id == job.c.job_id, inv.c.wf_id == job.c.wf_id)))
+    #PM-704 the task submit sequence needs to be >= -1 to include prescript status
+    inv_q = inv_q.where(inv.c.task_submit_seq >= -1)
+    if job_instance_ids is not None:
+        inv_q = inv_q.where(inv.c.job_instance_id.in_(job_instance_ids))
+    inv_q = inv_q.group_by(inv.c.job_instance_id).alias('inv_summary')
+
+    # The latest state, max() in case two rows have the same jobstate_submit_seq
+    last_js = js.alias('last_js')
+    def last_state(column):
+        q = select([func.max(column)])
+        q = q.where(last_js.c.job_instance_id == ji.c.job_instance_id)
+        q = q.where(last_js.c.jobstate_submit_seq == js_q.c.jobstate_submit_seq)
+        return q.as_scalar()
+
+    q = select([ji.c.job_instance_id,
+                job.c.wf_id,
+                last_state(last_js.c.state).label('state'),
+                last_state(last_js.c.timestamp).label('state_timestamp'),
+                js_q.c.jobstate_submit_seq,
+                js_q.c.submit_time,
+                js_q.c.grid_submit_time,
+                js_q.c.execute_time,
+                js_q.c.terminate_time,
+                js_q.c.post_script_start_time,
+                js_q.c.post_script_terminate_time,
+                inv_q.c.remote_duration,
+                inv_q.c.remote_duration_multi,
+                inv_q.c.remote_cpu_time,
+                inv_q.c.max_exitcode],
+               from_obj=ji.join(job, ji.c.job_id == job.c.job_id)
+                          .outerjoin(js_q, js_q.c.job_instance_id == ji.c.job_instance_id)
+                          .outerjoin(inv_q, inv_q.c.job_instance_id == ji.c.job_instance_id))
+    if job_instance_ids is not None:
+        q = q.where(ji.c.job_instance_id.in_(job_instance_ids))
+    return q
+
+def update_job_instance_summary(session, job_instance_ids=None):
+    """
+    @type   session: SQLAlchemy session
+    @param  session: Session to run the statements in.
+    @type   job_instance_ids: iterable
+    @param  job_instance_ids: Job instances to refresh, or None
+        to rebuild the summary of every job instance.
+
+    Recomputes the job_instance_summary rows of the job instances from
+    their jobstate and invocation rows, with INSERT ... SELECT statements
+    so that the values never leave the database. The caller commits.
+    """
+    summary = st_job_instance_summary
+    if job_instance_ids is None:
+        session.execute(summary.delete())
+        session.execute(InsertFromSelect(summary, _job_instance_summary_select()))
+        return
+
+    job_instance_ids = sorted(job_instance_ids)
+    for i in range(0, len(job_instance_ids), SUMMARY_CHUNK_SIZE):
+        chunk = job_instance_ids[i:i + SUMMARY_CHUNK_SIZE]
+        session.execute(summary.delete().where(summary.c.job_instance_id.in_(chunk)))
+        session.execute(InsertFromSelect(summary, _job_instance_summary_select(chunk)))
+
+class WorkflowCache(object):
+    """
+    FK lookup cache split into one dict per workflow. The dict of a
+    workflow is dropped in O(1) when the workflow ends, and the least
+    recently used ones are dropped once more than max_workflows
+    workflows are cached. A workflow can be flagged as complete when
+    all of its rows are in its dict, so a miss does not need to query
+    the database; dropping the dict drops the flag too.
+    """
+
+    def __init__(self, max_workflows):
+        self._partitions = OrderedDict()
+        self._complete = set()
+        self._max_workflows = max_workflows
+
+    def get(self, wf_id):
+        """
+        @type   wf_id: int
+        @param  wf_id: A workflow id from the workflow table.
+
+        Returns the dict for the workflow, creating it if needed,
+        and marks it as the most recently used one.
+        """
+        partition = self._partitions.pop(wf_id, None)
+        if partition is None:
+            partition = {}
+            if len(self._partitions) >= self._max_workflows:
+                self.purge(self._partitions.iterkeys().next())
+        self._partitions[wf_id] = partition
+        return partition
+
+    def is_complete(self, wf_id):
+        return wf_id in self._complete
+
+    def set_complete(self, wf_id, complete=True):
+        if complete:
+            self._complete.add(wf_id)
+        else:
+            self._complete.discard(wf_id)
+
+    def purge(self, wf_id):
+        """
+        @type   wf_id: int
+        @param  wf_id: A workflow id from the workflow table.
+
+        Drops everything cached for the workflow.
+        """
+        self._partitions.pop(wf_id, None)
+        self._complete.discard(wf_id)
+
+class _PendingJobInstance(object):
+    """
+    Job instance queued for insert in batch mode. It stands in for the
+    job_instance_id of the queued events that refer to the job instance
+    until the batch is written, see WorkflowLoader.insert_job_instances.
+    """
+    def __init__(self, job_instance):
+        self.job_instance = job_instance
+        self.job_instance_id = None
+
 class WorkflowLoader(BaseLoader):
     """Load into the Stampede SQL schema through SQLAlchemy.
 
@@ -23,6 +229,7 @@ class WorkflowLoader(BaseLoader):
     """
 
     MAX_RETRIES = 10 # maximum number of retries in case of operational errors that arise because of database locked/connection dropped
+    MAX_CACHED_WORKFLOWS = 1000 # maximum number of workflows kept in each of the per-workflow FK caches
 
     def __init__(self, connString, perf=False, batch=False, props=None, db_type=None):
         """Init object
@@ -79,12 +286,13 @@ class WorkflowLoader(BaseLoader):
         # Dicts for caching FK lookups
         self.wf_id_cache = {}
         self.root_wf_id_cache = {}
-        self.task_id_cache = {} #for task metadata population
-        self.lfn_id_cache  = {} #for file metadata population
-        self.job_id_cache = {}
-        self.job_instance_id_cache = {}
-        self.host_cache = {}
-        self.hosts_written_cache = None
+        # Per-workflow caches, keyed by wf_id
+        self.task_id_cache = WorkflowCache(self.MAX_CACHED_WORKFLOWS) #for task metadata population
+        self.lfn_id_cache  = WorkflowCache(self.MAX_CACHED_WORKFLOWS) #for file metadata population
+        self.job_id_cache = WorkflowCache(self.MAX_CACHED_WORKFLOWS)
+        self.job_instance_id_cache = WorkflowCache(self.MAX_CACHED_WORKFLOWS)
+        self.host_cache = WorkflowCache(self.MAX_CACHED_WORKFLOWS) # job instances already mapped to a host
+        self.hosts_written_cache = WorkflowCache(self.MAX_CACHED_WORKFLOWS) # host_id of the hosts in the DB, keyed by root wf_id
 
         # undocumented performance option
         self._perf = perf
@@ -96,10 +304,18 @@ class WorkflowLoader(BaseLoader):
         self._batch_cache = {
             'batch_events' : [],
             'update_events' : [],
-            'host_map_events' : []
+            'host_map_events' : [],
+            'job_instance_events' : []
         }
+        # _PendingJobInstance of the queued job instances, keyed by
+        # (wf_id, job_id, job_submit_seq)
+        self._pending_job_instances = {}
         self._task_map_flush = {}
         self._task_edge_flush = {}
+        # job instances with new jobstate or invocation rows
+        self._summary_updates = set()
+        # tables in dependency order, for _group_events
+        self._table_order = dict([(t, i) for i, t in enumerate(metadata.sorted_tables)])
 
     def process(self, linedata):
         """
@@ -234,7 +450,9 @@ class WorkflowLoader(BaseLoader):
             when the batch commit hits and integrity error.
 
         Process queued inserts and flush/commit to the database.
-        If the commit fails due to an integrity error, then method
+        Queued events are written with bulk statements, see
+        bulk_insert and bulk_update. If committing the pending
+        session changes fails due to an integrity error, then method
         re-calls itself with setting batch_flush to False which
         causes each insert/object to be committed individually
         so all the "good" inserts can succeed.  This will increase
@@ -257,6 +475,7 @@ class WorkflowLoader(BaseLoader):
             s = time.time()
 
         end_event = []
+        job_wf_ids = set()
 
         self.log.debug('Batch event sizes: batch_event_size=%s update_event_size=%s',
                 len(self._batch_cache['batch_events']),
@@ -265,19 +484,28 @@ class WorkflowLoader(BaseLoader):
         for event in self._batch_cache['batch_events']:
             if event.event == 'stampede.xwf.end':
                 end_event.append(event)
-            if batch_flush:
-                self.session.add(event)
-            else:
-                self.individual_commit(event)
+            elif isinstance(event, Job):
+                job_wf_ids.add(event.wf_id)
 
-        for event in self._batch_cache['update_events']:
+        try:
             if batch_flush:
-                self.session.merge(event)
+                # Commit the changes made through the session (task and
+                # sub-workflow mappings) first, so that rolling back a
+                # failed bulk statement does not discard them
+                self.session.commit()
+                self.insert_job_instances()
+                if self._commit_batch:
+                    self.commit_batch()
+                else:
+                    self.bulk_insert(self._batch_cache['batch_events'])
+                    self.bulk_update(self._batch_cache['update_events'])
             else:
-                self.individual_commit(event, merge=True)
-
-        try:
-            self.session.commit()
+                self.insert_job_instances()
+                for event in self._batch_cache['batch_events']:
+                    self.individual_commit(event)
+                for event in self._batch_cache['update_events']:
+                    self.individual_commit(event, merge=True)
+                self.session.commit()
         except exc.IntegrityError, e:
             self.log.exception(e)
             self.log.error('Integrity error on batch flush: batch will need to be committed per-event which will take longer')
@@ -289,8 +517,13 @@ class WorkflowLoader(BaseLoader):
             self.session.rollback()
             self.hard_flush(retry=retry)
 
-        for host in self._batch_cache['host_map_events']:
-            self.map_host_to_job_instance(host)
+        host_map_events = self._batch_cache['host_map_events']
+
+        # The new job_ids are picked up by the next cache miss. This
+        # is only done now, as the cache could be loaded before the
+        # jobs were written and flagged complete again without them
+        for wf_id in job_wf_ids:
+            self.job_id_cache.set_complete(wf_id, False)
 
         for ee in end_event:
             self.purgeCaches(ee)
@@ -302,7 +535,7 @@ class WorkflowLoader(BaseLoader):
 
         try:
             # commit the map host to job events . no retries for this.
-            self.session.commit()
+            self.update_job_instance_hosts(host_map_events)
         except exc.IntegrityError, e:
             self.log.exception(e)
             self.log.error('Integrity error on host_map_events in hard_flush()')
@@ -312,12 +545,269 @@ class WorkflowLoader(BaseLoader):
             self.log.error('Connection problem on host_map_events during commit in hard_flush()')
             self.session.rollback()
 
+        try:
+            self.update_job_instance_summaries()
+        except exc.IntegrityError, e:
+            self.log.exception(e)
+            self.log.error('Integrity error on job instance summaries in hard_flush()')
+            self.session.rollback()
+        except exc.OperationalError, e:
+            # the job instances stay queued for the next flush
+            self.log.exception(e)
+            self.log.error('Connection problem on job instance summaries during commit in hard_flush()')
+            self.session.rollback()
+
         self.reset_flush_state()
         self.log.debug('Hard flush end')
 
         if self._perf:
             self.log.debug('Hard flush duration: %s', (time.time() - s))
 
+    def commit_batch(self):
+        """
+        Writes the queued inserts and merges with the same statements
+        as bulk_insert and bulk_update, but commits them once, which
+        saves a sync to disk per statement. If a row violates the
+        schema, the transaction is rolled back and the batch is written
+        again with a commit per statement, so only the offending rows
+        get dropped.
+        """
+        try:
+            self.bulk_insert(self._batch_cache['batch_events'], commit=False)
+            self.bulk_update(self._batch_cache['update_events'], commit=False)
+            self.session.commit()
+        except exc.IntegrityError, e:
+            self.log.debug('Integrity error on batch commit: committing each statement on its own: %s', e)
+            self.session.rollback()
+            self.bulk_insert(self._batch_cache['batch_events'])
+            self.bulk_update(self._batch_cache['update_events'])
+
+    def bulk_insert(self, events, commit=True):
+        """
+        @type   events: list
+        @param  events: Mapper objects queued for insert.
+        @type   commit: boolean
+        @param  commit: Set to false to leave the statements to the
+            caller to commit.
+
+        Inserts the queued objects with one executemany INSERT per
+        table (and set of columns), in table dependency order. Each
+        statement is committed on its own; objects are removed from
+        the list as they are written, so that a retry after an
+        operational error does not insert them twice. If commit is
+        false, the list is left untouched.
+        """
+        written = set()
+        try:
+            for table, columns, objects, rows in self._group_events(events):
+                self._bulk_execute(table.insert(), rows, objects, commit)
+                written.update([id(o) for o in objects])
+        finally:
+            if commit:
+                events[:] = [o for o in events if id(o) not in written]
+
+    def bulk_update(self, events, commit=True):
+        """
+        @type   events: list
+        @param  events: Mapper objects queued for merge, with their
+            primary keys already assigned.
+        @type   commit: boolean
+        @param  commit: Set to false to leave the statements to the
+            caller to commit.
+
+        Updates the rows for the queued objects with one statement per
+        table (and set of columns). MySQL uses a multi-row INSERT ...
+        ON DUPLICATE KEY UPDATE, other databases an executemany UPDATE
+        keyed on the primary key.
+        """
+        dialect = self.session.get_bind().dialect.name
+        written = set()
+        try:
+            for table, columns, objects, rows in self._group_events(events):
+                pk = [c.key for c in table.primary_key]
+                values = [c for c in columns if c not in pk]
+                if not values:
+                    written.update([id(o) for o in objects])
+                    continue
+
+                if dialect == 'mysql':
+                    statement = table.insert(mysql_on_duplicate_key=values)
+                else:
+                    statement = table.update()
+                    for c in pk:
+                        statement = statement.where(table.c[c] == bindparam('pk_%s' % c))
+                    # Primary key values go to the WHERE clause only
+                    for row in rows:
+                        for c in pk:
+                            row['pk_%s' % c] = row.pop(c)
+
+                self._bulk_execute(statement, rows, objects, commit)
+                written.update([id(o) for o in objects])
+        finally:
+            if commit:
+                events[:] = [o for o in events if id(o) not in written]
+
+    def _group_events(self, events):
+        """
+        @type   events: list
+        @param  events: Mapper objects.
+
+        Groups the mapper objects by table and by the set of columns
+        that were assigned on them, so that each group can be written
+        with a single executemany statement, and columns that were not
+        assigned keep their defaults. Returns a list of (table, columns,
+        objects, rows) tuples, sorted in table dependency order.
+        """
+        groups = {}
+        keys = []
+        for o in events:
+            mapper = orm.object_mapper(o)
+            row = {}
+            for prop in mapper.column_attrs:
+                if prop.key in o.__dict__:
+                    row[prop.columns[0].key] = o.__dict__[prop.key]
+            key = (mapper.local_table, tuple(sorted(row.keys())))
+            if not groups.has_key(key):
+                groups[key] = ([], [])
+                keys.append(key)
+            groups[key][0].append(o)
+            groups[key][1].append(row)
+
+        keys.sort(key=lambda k: self._table_order[k[0]])
+
+        return [(k[0], k[1], groups[k][0], groups[k][1]) for k in keys]
+
+    def insert_job_instances(self):
+        """
+        Inserts the job instances queued in batch mode with executemany
+        INSERTs, reads back the job_instance_ids the database assigned
+        to them, and replaces their _PendingJobInstance in the queued
+        events. Events of job instances that could not be inserted are
+        dropped.
+        """
+        if not self._pending_job_instances:
+            return
+
+        self.bulk_insert(self._batch_cache['job_instance_events'])
+
+        job_ids = {}
+        for wf_id, job_id, job_submit_seq in self._pending_job_instances.keys():
+            job_ids.setdefault(wf_id, set()).add(job_id)
+        for wf_id in job_ids:
+            job_instances = self.job_instance_id_cache.get(wf_id)
+            wf_job_ids = sorted(job_ids[wf_id])
+            for i in range(0, len(wf_job_ids), JOB_ID_CHUNK_SIZE):
+                chunk = wf_job_ids[i:i + JOB_ID_CHUNK_SIZE]
+                query = self.session.query(JobInstance.job_id, JobInstance.job_submit_seq, JobInstance.job_instance_id)
+                for row in query.filter(JobInstance.job_id.in_(chunk)):
+                    job_instances[(row.job_id, row.job_submit_seq)] = row.job_instance_id
+        self.session.commit()
+
+        for (wf_id, job_id, job_submit_seq), pending in self._pending_job_instances.items():
+            pending.job_instance_id = self.job_instance_id_cache.get(wf_id).get((job_id, job_submit_seq))
+            if pending.job_instance_id is None:
+                self.log.error('Could not insert job_instance: %s', pending.job_instance)
+        self._pending_job_instances = {}
+
+        def resolve(job_instance_id):
+            if isinstance(job_instance_id, _PendingJobInstance):
+                return job_instance_id.job_instance_id
+            return job_instance_id
+
+        for k in ['batch_events', 'update_events']:
+            events = []
+            for event in self._batch_cache[k]:
+                pending = event.__dict__.get('job_instance_id')
+                if isinstance(pending, _PendingJobInstance):
+                    if pending.job_instance_id is None:
+                        self.log.error('No job_instance_id for event: %s', event)
+                        continue
+                    event.job_instance_id = pending.job_instance_id
+                events.append(event)
+            self._batch_cache[k] = events
+
+        host_map_events = []
+        for update in self._batch_cache['host_map_events']:
+            update['pk_job_instance_id'] = resolve(update['pk_job_instance_id'])
+            if update['pk_job_instance_id'] is not None:
+                host_map_events.append(update)
+        self._batch_cache['host_map_events'] = host_map_events
+
+        self._summary_updates = set(resolve(i) for i in self._summary_updates)
+        self._summary_updates.discard(None)
+
+    def insert_returning_id(self, o):
+        """
+        @type   o: class instance
+        @param  o: Mapper object to insert.
+
+        Inserts a single row and commits. Returns the primary key
+        the database assigned to the new row, so that it can be
+        cached without reading the row back.
+        """
+        table, columns, objects, rows = self._group_events([o])[0]
+        result = self.session.execute(table.insert(), rows[0])
+        self.session.commit()
+        return result.inserted_primary_key[0]
+
+    def update_job_instance_hosts(self, rows):
+        """
+        @type   rows: list
+        @param  rows: One dict per job instance, with the
+            pk_job_instance_id and the host_id to set.
+
+        Sets the host_id of the job instances with a single
+        executemany UPDATE and commits.
+        """
+        if rows:
+            statement = st_job_instance.update().where(st_job_instance.c.job_instance_id == bindparam('pk_job_instance_id'))
+            self.session.execute(statement, rows)
+        self.session.commit()
+
+    def update_job_instance_summaries(self):
+        """
+        Refreshes the job_instance_summary rows of the job instances
+        that got jobstate or invocation rows since the last call, and
+        commits.
+        """
+        if not self._summary_updates:
+            return
+        update_job_instance_summary(self.session, self._summary_updates)
+        self.session.commit()
+        self._summary_updates = set()
+
+    def _bulk_execute(self, statement, rows, objects, commit=True):
+        """
+        @type   statement: SQLAlchemy insert or update statement
+        @param  statement: Statement to execute for every row.
+        @type   rows: list
+        @param  rows: Bind parameters, one dict per row.
+        @type   objects: list
+        @param  objects: Mapper objects the rows were created from.
+        @type   commit: boolean
+        @param  commit: Set to false to leave the statement to the
+            caller to commit, and integrity errors to the caller.
+
+        Executes the statement for all the rows at once and commits.
+        If this hits an integrity error, the batch is split in half and
+        each half is retried, so only the offending rows get dropped
+        after O(log n) extra statements each.
+        """
+        try:
+            self.session.execute(statement, rows)
+            if commit:
+                self.session.commit()
+        except exc.IntegrityError, e:
+            if not commit:
+                raise
+            self.session.rollback()
+            if len(rows) == 1:
+                self.log.error('Insert failed for event %s : %s', objects[0], e)
+                return
+            half = len(rows) / 2
+            self._bulk_execute(statement, rows[:half], objects[:half])
+            self._bulk_execute(statement, rows[half:], objects[half:])
+
     #############################################
     # Methods to handle the various insert events
     #############################################
@@ -408,9 +898,13 @@ class WorkflowLoader(BaseLoader):
         self.log.trace('job: %s', job)
 
         if self._batch:
+            # The job_id cache is marked incomplete once the job is
+            # written, see hard_flush
             self._batch_cache['batch_events'].append(job)
         else:
             job.commit_to_db(self.session)
+            # The new job_id is picked up by the next cache miss
+            self.job_id_cache.set_complete(job.wf_id, False)
 
     def job_edge(self, linedata):
         """
@@ -454,10 +948,16 @@ class WorkflowLoader(BaseLoader):
             iid = self.get_job_instance_id(job_instance, quiet=True)
 
             if not iid:
-                # explicit insert
-                job_instance.commit_to_db(self.session)
-                # seed the cache
-                noop = self.get_job_instance_id(job_instance)
+                key = (job_instance.job_id, int(job_instance.job_submit_seq))
+                if self._batch:
+                    # inserted with the batch, the events of the job
+                    # instance refer to it until then
+                    self._batch_cache['job_instance_events'].append(job_instance)
+                    self._pending_job_instances[(job_instance.wf_id,) + key] = _PendingJobInstance(job_instance)
+                else:
+                    # explicit insert, the primary key assigned by the
+                    # database seeds the cache
+                    self.job_instance_id_cache.get(job_instance.wf_id)[key] = self.insert_returning_id(job_instance)
 
             if job_instance.event == 'stampede.job_inst.pre.start':
                 self.jobstate(linedata)
@@ -520,11 +1020,13 @@ class WorkflowLoader(BaseLoader):
             return
 
         js.timestamp = js.ts
+        self._summary_updates.add(js.job_instance_id)
 
         if self._batch:
             self._batch_cache['batch_events'].append(js)
         else:
             js.commit_to_db(self.session)
+            self.update_job_instance_summaries()
 
     def invocation(self, linedata):
         """
@@ -543,10 +1045,13 @@ class WorkflowLoader(BaseLoader):
             self.log.error('Could not determine job_instance_id for invocation: %s', invocation)
             return
 
+        self._summary_updates.add(invocation.job_instance_id)
+
         if self._batch:
             self._batch_cache['batch_events'].append(invocation)
         else:
             invocation.commit_to_db(self.session)
+            self.update_job_instance_summaries()
 
     def task(self, linedata):
         """
@@ -747,27 +1252,24 @@ class WorkflowLoader(BaseLoader):
 
         self.log.trace('host: %s', host)
 
-        if self.hosts_written_cache == None:
-            self.hosts_written_cache = {}
-            query = self.session.query(Host)
-            for row in query.all():
-                self.hosts_written_cache[(row.wf_id,row.site,row.hostname,row.ip)] = True
-
         host.wf_id = self.wf_uuid_to_root_id(host.wf_uuid)
 
-        # handle inserts into the host table
-        if not self.hosts_written_cache.has_key((host.wf_id,host.site,host.hostname,host.ip)):
-            if self._batch:
-                self._batch_cache['batch_events'].append(host)
-            else:
-                host.commit_to_db(self.session)
-            self.hosts_written_cache[(host.wf_id,host.site,host.hostname,host.ip)] = True
+        hosts = self.hosts_written_cache.get(host.wf_id)
+        if not self.hosts_written_cache.is_complete(host.wf_id):
+            query = self.session.query(Host.site, Host.hostname, Host.ip, Host.host_id).filter(Host.wf_id == host.wf_id)
+            for row in query.all():
+                hosts[(row.site,row.hostname,row.ip)] = row.host_id
+            self.hosts_written_cache.set_complete(host.wf_id)
+
+        # handle inserts into the host table. There are few hosts per
+        # workflow, so they are inserted right away to get the host_id
+        # needed by the mappings
+        if not hosts.has_key((host.site,host.hostname,host.ip)):
+            hosts[(host.site,host.hostname,host.ip)] = self.insert_returning_id(host)
+        host.host_id = hosts[(host.site,host.hostname,host.ip)]
 
         # handle mappings
-        if self._batch:
-            self._batch_cache['host_map_events'].append(host)
-        else:
-            self.map_host_to_job_instance(host)
+        self.map_host_to_job_instance(host)
 
     def static_end(self, linedata):
         """
@@ -860,10 +1362,11 @@ class WorkflowLoader(BaseLoader):
 
         Gets and caches task_id for task_meta inserts
         """
-        if not self.task_id_cache.has_key((wf_id, task_dax_id)):
+        tasks = self.task_id_cache.get(wf_id)
+        if not tasks.has_key(task_dax_id):
             query = self.session.query(Task.task_id).filter(Task.wf_id == wf_id).filter(Task.abs_task_id == task_dax_id)
             try:
-                self.task_id_cache[((wf_id, task_dax_id))] = query.one().task_id
+                tasks[task_dax_id] = query.one().task_id
             except orm.exc.MultipleResultsFound, e:
                 self.log.error('Multiple results found for wf_uuid/task_dax_id: %s/%s', wf_id, task_dax_id)
                 return None
@@ -871,7 +1374,7 @@ class WorkflowLoader(BaseLoader):
                 self.log.error('No results found for wf_uuid/task_dax_id: %s/%s', wf_id, task_dax_id)
                 return None
 
-        return self.task_id_cache[(wf_id, task_dax_id)]
+        return tasks[task_dax_id]
 
     def get_lfn_id(self, wf_id, lfn):
         """
@@ -882,7 +1385,8 @@ class WorkflowLoader(BaseLoader):
 
         Gets and caches lfn_id for rc_meta, rc_lfn, rc_pfn and wf_files inserts
         """
-        if not self.lfn_id_cache.has_key((wf_id, lfn)):
+        lfns = self.lfn_id_cache.get(wf_id)
+        if not lfns.has_key(lfn):
             id =  self.__get_lfn_id_from_database__(wf_id, lfn )
 
             if id is None:
@@ -899,9 +1403,9 @@ class WorkflowLoader(BaseLoader):
                     self.log.error('No results found for wf_uuid/lfn: %s/%s', wf_id, lfn)
                     return None
 
-            self.lfn_id_cache[(wf_id, lfn)] = id
+            lfns[lfn] = id
 
-        return self.lfn_id_cache[(wf_id, lfn)]
+        return lfns[lfn]
 
     def __get_lfn_id_from_database__(self, wf_id, lfn):
         """
@@ -934,47 +1438,75 @@ class WorkflowLoader(BaseLoader):
         @param  exec_id: The exec_job_id for a given job.
 
         Gets and caches job_id for job_instance inserts and static
-        table updating.
-        """
-        if not self.job_id_cache.has_key((wf_id, exec_id)):
-            query = self.session.query(Job.job_id).filter(Job.wf_id == wf_id).filter(Job.exec_job_id == exec_id)
-            try:
-                self.job_id_cache[((wf_id, exec_id))] = query.one().job_id
-            except orm.exc.MultipleResultsFound, e:
-                self.log.error('Multiple results found for wf_uuid/exec_job_id: %s/%s', wf_id, exec_id)
-                return None
-            except orm.exc.NoResultFound, e:
+        table updating. On a cache miss all the job_ids of the
+        workflow are loaded at once, see load_job_ids.
+        """
+        jobs = self.job_id_cache.get(wf_id)
+        if not jobs.has_key(exec_id):
+            if not self.job_id_cache.is_complete(wf_id):
+                self.load_job_ids(wf_id)
+            if not jobs.has_key(exec_id):
                 self.log.error('No results found for wf_uuid/exec_job_id: %s/%s', wf_id, exec_id)
                 return None
 
-        return self.job_id_cache[((wf_id, exec_id))]
+        return jobs[exec_id]
 
+    def load_job_ids(self, wf_id):
+        """
+        @type   wf_id: int
+        @param  wf_id: A workflow id from the workflow table.
+
+        Caches the job_id of every job of the workflow with a single
+        query. Until new jobs are inserted for the workflow, the cache
+        is then complete and misses do not go to the database.
+        """
+        jobs = self.job_id_cache.get(wf_id)
+        for row in self.session.query(Job.exec_job_id, Job.job_id).filter(Job.wf_id == wf_id):
+            jobs[row.exec_job_id] = row.job_id
+        self.job_id_cache.set_complete(wf_id)
 
     def get_job_instance_id(self, o, quiet=False):
         """
         @type   o: class instance
         @param  o: Mapper object containing wf_uuid and exec_job_id.
 
-        Attempts to retrieve a job job_instance_id PK/FK from cache.  If not in
-        cache, retrieve from st_job table.
+        Attempts to retrieve a job job_instance_id PK/FK from cache.
+        Job instances inserted by the loader are cached as they are
+        inserted. Those that were already in the database are loaded
+        once per workflow, see load_job_instance_ids. For a job
+        instance queued for insert in batch mode, this returns its
+        _PendingJobInstance.
         """
         wf_id = self.wf_uuid_to_id(o.wf_uuid)
         cached_job_id = self.get_job_id(wf_id, o.exec_job_id)
-        uniqueIdIdx = (cached_job_id, o.job_submit_seq)
-        if not self.job_instance_id_cache.has_key(uniqueIdIdx):
-            query = self.session.query(JobInstance).filter(JobInstance.job_id == cached_job_id).filter(JobInstance.job_submit_seq == o.job_submit_seq)
-            try:
-                self.job_instance_id_cache[uniqueIdIdx] = query.one().job_instance_id
-            except orm.exc.MultipleResultsFound, e:
-                if not quiet:
-                    self.log.error('Multple job_instance_id results for tuple %s : %s', uniqueIdIdx, e)
-                return None
-            except orm.exc.NoResultFound, e:
+        uniqueIdIdx = (cached_job_id, int(o.job_submit_seq))
+        pending = self._pending_job_instances.get((wf_id,) + uniqueIdIdx)
+        if pending is not None:
+            return pending
+        job_instances = self.job_instance_id_cache.get(wf_id)
+        if not job_instances.has_key(uniqueIdIdx):
+            if not self.job_instance_id_cache.is_complete(wf_id):
+                self.load_job_instance_ids(wf_id)
+            if not job_instances.has_key(uniqueIdIdx):
                 if not quiet:
-                    self.log.error('No job_instance_id results for tuple %s : %s', uniqueIdIdx, e)
+                    self.log.error('No job_instance_id results for tuple %s', uniqueIdIdx)
                 return None
 
-        return self.job_instance_id_cache[uniqueIdIdx]
+        return job_instances[uniqueIdIdx]
+
+    def load_job_instance_ids(self, wf_id):
+        """
+        @type   wf_id: int
+        @param  wf_id: A workflow id from the workflow table.
+
+        Caches the job_instance_id of every job instance of the
+        workflow with a single query.
+        """
+        job_instances = self.job_instance_id_cache.get(wf_id)
+        query = self.session.query(JobInstance.job_id, JobInstance.job_submit_seq, JobInstance.job_instance_id)
+        for row in query.filter(JobInstance.job_id == Job.job_id).filter(Job.wf_id == wf_id):
+            job_instances[(row.job_id, row.job_submit_seq)] = row.job_instance_id
+        self.job_instance_id_cache.set_complete(wf_id)
 
     def map_host_to_job_instance(self, host):
         """
@@ -983,23 +1515,25 @@ class WorkflowLoader(BaseLoader):
 
         A single job may have multiple (redundant) host events.  This
         checks the cache to see if a job had already had its host_id,
-        and if not, do the proper update and note it in the cache.
+        and if not, queues the update and notes it in the cache. The
+        queued updates are written by update_job_instance_hosts.
         """
         self.log.trace('map_host_to_job_instance: %s', host)
 
         wf_id = self.wf_uuid_to_id(host.wf_uuid)
-        cached_job_id = self.get_job_id(wf_id, host.exec_job_id)
-
-        if not self.host_cache.has_key((cached_job_id, host.job_submit_seq)):
-            if not host.host_id:
-                try:
-                    host.host_id = self.session.query(Host.host_id).filter(Host.wf_id == host.wf_id).filter(Host.site == host.site).filter(Host.hostname == host.hostname).filter(Host.ip == host.ip).one().host_id
-                except orm.exc.MultipleResultsFound, e:
-                    self.log.error('Multiple host_id results for host: %s', host)
-            job_instance = self.session.query(JobInstance).filter(JobInstance.job_id == cached_job_id).filter(JobInstance.job_submit_seq == host.job_submit_seq).one()
-            job_instance.host_id = host.host_id
-            job_instance.merge_to_db(self.session, batch=self._batch)
-            self.host_cache[(cached_job_id, host.job_submit_seq)] = True
+        job_instance_id = self.get_job_instance_id(host)
+        if job_instance_id is None:
+            self.log.error('Could not determine job_instance_id for host: %s', host)
+            return
+
+        mapped = self.host_cache.get(wf_id)
+        if not mapped.has_key(job_instance_id):
+            update = {'pk_job_instance_id': job_instance_id, 'host_id': host.host_id}
+            if self._batch:
+                self._batch_cache['host_map_events'].append(update)
+            else:
+                self.update_job_instance_hosts([update])
+            mapped[job_instance_id] = True
 
     def purgeCaches(self, wfs):
         """
@@ -1011,33 +1545,12 @@ class WorkflowLoader(BaseLoader):
         """
         self.log.debug('Purging caches for: %s', wfs.wf_uuid)
 
-        for k,v in self.wf_id_cache.items():
-            if k == wfs.wf_uuid:
-                del self.wf_id_cache[k]
-
-        for k,v in self.root_wf_id_cache.items():
-            if k == wfs.wf_uuid:
-                del self.root_wf_id_cache[k]
-
-        for k,v in self.job_instance_id_cache.items():
-            if k[0] == wfs.wf_id:
-                del self.job_instance_id_cache[k]
-
-        for k,v in self.host_cache.items():
-            if k[0] == wfs.wf_uuid:
-                del self.host_cache[k]
-
-        for k,v in self.task_id_cache.items():
-            if k[0] == wfs.wf_id:
-                del self.task_id_cache[k]
-
-        for k,v in self.lfn_id_cache.items():
-            if k[0] == wfs.wf_id:
-                del self.lfn_id_cache[k]
+        self.wf_id_cache.pop(wfs.wf_uuid, None)
+        self.root_wf_id_cache.pop(wfs.wf_uuid, None)
 
-        for k,v in self.job_id_cache.items():
-            if k[0] == wfs.wf_id:
-                del self.job_id_cache[k]
+        for cache in [self.task_id_cache, self.lfn_id_cache, self.job_id_cache,
+                      self.job_instance_id_cache, self.host_cache, self.hosts_written_cache]:
+            cache.purge(wfs.wf_id)
 
         if self._task_map_flush.has_key(wfs.wf_uuid):
             del self._task_map_flush[wfs.wf_uuid]
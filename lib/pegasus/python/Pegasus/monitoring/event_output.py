@@ -20,9 +20,12 @@ Functions for output pegasus-monitord events to various destinations.
 
 import os
 import sys
+import time
+import Queue
 import socket
 import logging
 import urlparse
+import threading
 
 from Pegasus.tools import utils
 from Pegasus.netlogger import nlapi
@@ -49,6 +52,9 @@ except:
 STAMPEDE_NS = "stampede."
 DASHBOARD_NS = "dashboard."
 
+# Number of events a threaded DBEventSink queues before send() blocks
+DB_QUEUE_SIZE = 10000
+
 
 def purge_wf_uuid_from_database(rundir, output_db):
     """
@@ -139,15 +145,33 @@ class EventSink(object):
         """
         pass
 
-    def flush(self):
-        "Clients call this to flush events to the sink"
+    def flush(self, force=False):
+        "Clients call this to flush events to the sink, force makes sure they are all stored"
         pass
 
+class _FlushRequest(object):
+    """
+    Forced flush request for the DBEventSink writer thread, which sets
+    done once everything queued before it is loaded.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+
 class DBEventSink(EventSink):
     """
     Write wflow event logs to database via loader
+
+    If threaded is set, events are put on a bounded queue and loaded by
+    a writer thread, so that parsing and loading overlap. send() blocks
+    while the queue is full. The loader, and its database session, are
+    then only used from the writer thread. Its errors are raised by the
+    next forced flush() or by close(), rather than by send() for an
+    event that may have nothing to do with them.
     """
-    def __init__(self, dest, db_stats=False, namespace=STAMPEDE_NS, props=None, db_type=None, **kw):
+    POLL_TIMEOUT = 1 # seconds the writer thread waits for events before checking if the batch is due
+
+    def __init__(self, dest, db_stats=False, namespace=STAMPEDE_NS, props=None, db_type=None,
+                 threaded=False, queue_size=DB_QUEUE_SIZE, **kw):
         self._namespace=namespace
         #pick the right database loader based on prefix
         if namespace == STAMPEDE_NS:
@@ -159,21 +183,135 @@ class DBEventSink(EventSink):
 
         super(DBEventSink, self).__init__()
 
+        self._db_stats = db_stats
+        self._thread = None
+        if threaded:
+            self._queue = Queue.Queue(queue_size)
+            self._error = None
+            # Metrics
+            self._n_events = 0
+            self._max_depth = 0
+            self._total_latency = 0.0
+            self._max_latency = 0.0
+            self._thread = threading.Thread(target=self._writer, name="%swriter" % (namespace))
+            self._thread.daemon = True
+            self._thread.start()
+
     def send(self, event, kw):
         self._log.trace("send.start event=%s", event)
         d = {'event' : self._namespace + event}
         for k, v in kw.iteritems():
             d[k.replace('__','.')] = v
-        self._db.process(d)
+        if self._thread is None:
+            self._db.process(d)
+        else:
+            self._queue.put((time.time(), d))
+            self._max_depth = max(self._max_depth, self._queue.qsize())
         self._log.trace("send.end event=%s", event)
 
     def close(self):
         self._log.trace("close.start")
-        self._db.finish()
+        if self._thread is None:
+            self._db.finish()
+        elif self._thread.is_alive():
+            # The writer thread loads everything queued before
+            # None, then calls finish() on the loader
+            self._queue.put(None)
+            while self._thread.is_alive():
+                # Join with a timeout, so signals are still handled
+                self._thread.join(self.POLL_TIMEOUT)
+            self.log_stats()
+            self._raise_error()
         self._log.trace("close.end")
 
-    def flush(self):
-        self._db.flush()
+    def flush(self, force=False):
+        if self._thread is None:
+            self._db.flush(force=force)
+        elif force:
+            if self._thread.is_alive():
+                # Wait for the writer thread to load everything queued so far
+                request = _FlushRequest()
+                self._queue.put(request)
+                while not request.done.is_set():
+                    request.done.wait(self.POLL_TIMEOUT)
+            # The caller relies on everything being written
+            self._raise_error()
+        # Otherwise batches are flushed by the writer thread
+
+    def _raise_error(self):
+        """
+        Reports a writer thread failure to the caller, as the loader
+        would have done if called directly.
+        """
+        if self._error is not None:
+            e, self._error = self._error, None
+            raise e
+
+    def stats(self):
+        """
+        Returns the writer thread metrics: number of events loaded,
+        current and maximum queue depth, and mean and maximum latency
+        in seconds between send() and the event being loaded.
+        """
+        if self._thread is None:
+            return None
+        return {
+            "events" : self._n_events,
+            "queue_depth" : self._queue.qsize(),
+            "max_queue_depth" : self._max_depth,
+            "mean_latency" : self._n_events and self._total_latency / self._n_events,
+            "max_latency" : self._max_latency
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        if stats is None:
+            return
+        if self._db_stats:
+            log_fn = self._log.info
+        else:
+            log_fn = self._log.debug
+        log_fn("Writer thread performance: events=%(events)d, max_queue_depth=%(max_queue_depth)d, "
+               "mean_latency=%(mean_latency).6f, max_latency=%(max_latency).6f" % stats)
+
+    def _writer(self):
+        """
+        Writer thread: loads the queued events, until it gets None from
+        close(). A _FlushRequest on the queue is a forced flush
+        request, and is marked done once the flush is done.
+        """
+        while True:
+            try:
+                item = self._queue.get(timeout=self.POLL_TIMEOUT)
+            except Queue.Empty:
+                # Nothing to load, write the batch if it is due
+                self._call(self._db.flush)
+                continue
+
+            if item is None:
+                self._call(self._db.finish)
+                return
+            elif isinstance(item, _FlushRequest):
+                self._call(self._db.flush, force=True)
+                item.done.set()
+            else:
+                self._call(self._db.process, item[1])
+                latency = time.time() - item[0]
+                self._n_events += 1
+                self._total_latency += latency
+                self._max_latency = max(self._max_latency, latency)
+
+    def _call(self, fn, *args, **kw):
+        """
+        Calls a loader method from the writer thread. Errors are logged
+        and kept for the next forced flush() or close(), so the thread
+        keeps running.
+        """
+        try:
+            fn(*args, **kw)
+        except Exception, e:
+            self._log.exception(e)
+            self._error = e
 
 class FileEventSink(EventSink):
     """
@@ -258,10 +396,12 @@ def bson_encode(event, **kw):
     kw['event'] = STAMPEDE_NS + event
     return bson.dumps(kw)
 
-def create_wf_event_sink(dest, enc=None, prefix=STAMPEDE_NS, props=None, **kw):
+def create_wf_event_sink(dest, enc=None, prefix=STAMPEDE_NS, props=None, threaded=False,
+                         queue_size=DB_QUEUE_SIZE, **kw):
     """
     Create & return subclass of EventSink, chosen by value of 'dest'
-    and parameterized by values (if any) in 'kw'.
+    and parameterized by values (if any) in 'kw'. The threaded and
+    queue_size arguments only apply to database destinations.
     """
 
     if dest is None:
@@ -309,7 +449,8 @@ def create_wf_event_sink(dest, enc=None, prefix=STAMPEDE_NS, props=None, **kw):
         _type, _name="AMQP", "%s:%s/%s" % (url.host, url.port, url.path)
     else:
         # load the appropriate DBEvent on basis of prefix passed
-        sink = DBEventSink(dest, namespace=prefix, props=props, **kw)
+        sink = DBEventSink(dest, namespace=prefix, props=props, threaded=threaded,
+                           queue_size=queue_size, **kw)
         _type, _name = "DB", dest
 
     log.info("output type=%s namespace=%s name=%s" % (_type, prefix, _name))
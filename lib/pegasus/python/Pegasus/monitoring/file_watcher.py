@@ -0,0 +1,214 @@
+"""
+Ways for pegasus-monitord to wait for the dagman.out files it follows
+to change.
+"""
+
+##
+#  Copyright 2007-2016 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Optional imports, only generate 'warnings' if they fail
+libc = None
+try:
+    if sys.platform.startswith("linux"):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            libc = None
+except:
+    libc = None
+
+# Constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 02000000
+
+# Events on a watched directory we wake up for
+IN_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event, without the name that follows it
+EVENT_HEADER = "iIII"
+EVENT_HEADER_SIZE = struct.calcsize(EVENT_HEADER)
+
+class PollingWatcher(object):
+    """
+    This class waits by sleeping. It is used where inotify is not
+    available, and gives the same behavior monitord always had.
+    """
+    def watch(self, filename):
+        pass
+
+    def unwatch(self, filename):
+        pass
+
+    def wait(self, timeout):
+        """
+        This function sleeps for timeout seconds, and returns False
+        to tell that no change was seen.
+        """
+        if timeout > 0:
+            time.sleep(timeout)
+        return False
+
+    def close(self):
+        pass
+
+class InotifyWatcher(object):
+    """
+    This class uses Linux's inotify to wait until one of the watched
+    files changes, or the timeout expires. It watches the directories
+    containing the files, so that files that do not exist yet (e.g.
+    the dagman.out file of a sub-workflow that has just been
+    submitted) are noticed when they are created. Changes to other
+    files in these directories, such as the jobstate.log file written
+    by monitord itself, do not wake it up.
+    """
+    def __init__(self):
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            my_errno = ctypes.get_errno()
+            raise OSError(my_errno, os.strerror(my_errno))
+        # Directory -> watch descriptor, and watch descriptor -> set of file names
+        self._wds = {}
+        self._names = {}
+
+    def watch(self, filename):
+        """
+        This function starts watching filename. Directories that do
+        not exist yet are skipped, the caller is expected to try again
+        on the next loop.
+        """
+        my_dir, my_name = os.path.split(os.path.abspath(filename))
+        if my_dir in self._wds:
+            self._names[self._wds[my_dir]].add(my_name)
+            return
+
+        my_wd = libc.inotify_add_watch(self._fd, my_dir, IN_WATCH_MASK)
+        if my_wd < 0:
+            my_errno = ctypes.get_errno()
+            if my_errno != errno.ENOENT:
+                logger.warning("cannot watch directory %s: %s" % (my_dir, os.strerror(my_errno)))
+            return
+
+        self._wds[my_dir] = my_wd
+        self._names.setdefault(my_wd, set()).add(my_name)
+
+    def unwatch(self, filename):
+        """
+        This function stops watching filename, and its directory once
+        no other file in it is watched.
+        """
+        my_dir, my_name = os.path.split(os.path.abspath(filename))
+        if not my_dir in self._wds:
+            return
+
+        my_wd = self._wds[my_dir]
+        self._names[my_wd].discard(my_name)
+        if len(self._names[my_wd]) == 0:
+            libc.inotify_rm_watch(self._fd, my_wd)
+            del self._wds[my_dir]
+            del self._names[my_wd]
+
+    def _read_events(self):
+        """
+        This function reads all pending events, and returns True if
+        any of them is about a watched file.
+        """
+        my_changed = False
+        while True:
+            try:
+                my_buffer = os.read(self._fd, 65536)
+            except OSError, e:
+                if e.errno == errno.EAGAIN:
+                    break
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            my_offset = 0
+            while my_offset + EVENT_HEADER_SIZE <= len(my_buffer):
+                my_wd, my_mask, my_cookie, my_len = struct.unpack_from(EVENT_HEADER, my_buffer, my_offset)
+                my_offset = my_offset + EVENT_HEADER_SIZE
+                my_name = my_buffer[my_offset:my_offset + my_len].rstrip("\0")
+                my_offset = my_offset + my_len
+
+                if my_mask & IN_Q_OVERFLOW:
+                    # Events were lost, assume everything changed
+                    my_changed = True
+                elif my_mask & IN_IGNORED:
+                    # Directory was removed, watch it again if it comes back
+                    for my_dir in [d for d in self._wds if self._wds[d] == my_wd]:
+                        del self._wds[my_dir]
+                    self._names.pop(my_wd, None)
+                elif my_name in self._names.get(my_wd, ()):
+                    my_changed = True
+
+        return my_changed
+
+    def wait(self, timeout):
+        """
+        This function waits until one of the watched files changes, or
+        for at most timeout seconds. It returns True if a change was seen.
+        """
+        my_deadline = time.time() + max(timeout, 0)
+        while True:
+            my_timeout = max(my_deadline - time.time(), 0)
+            try:
+                my_ready = select.select([self._fd], [], [], my_timeout)[0]
+            except select.error, e:
+                if e[0] == errno.EINTR:
+                    continue
+                raise
+
+            if not my_ready:
+                return False
+
+            if self._read_events():
+                return True
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def create_file_watcher(use_inotify=True):
+    """
+    This function returns an InotifyWatcher if inotify is available
+    and use_inotify is True, and a PollingWatcher otherwise.
+    """
+    if use_inotify and libc is not None:
+        try:
+            return InotifyWatcher()
+        except OSError, e:
+            logger.warning("cannot initialize inotify, falling back to polling: %s" % (e))
+
+    return PollingWatcher()
@@ -111,6 +111,27 @@ class Job:
                                                   #was rotated or not, as is the default case.
         self._deferred_job_end_kwargs = None
 
+    def get_checkpoint(self):
+        """
+        This function returns the state of this job for the monitord
+        checkpoint file, as a plain dict with the submit directory and
+        the attributes that no longer have their initial value.
+        """
+        my_initial = Job(self._wf_uuid, self._exec_job_id, self._job_submit_dir, self._job_submit_seq).__dict__
+        my_state = {"_job_submit_dir": self._job_submit_dir}
+        for my_attr, my_value in self.__dict__.iteritems():
+            if my_attr not in my_initial or my_initial[my_attr] != my_value:
+                my_state[my_attr] = my_value
+
+        return my_state
+
+    def restore_checkpoint(self, state):
+        """
+        This function restores the state returned by get_checkpoint.
+        """
+        for my_attr, my_value in state.iteritems():
+            setattr(self, my_attr, my_value)
+
     def set_job_state(self, job_state, sched_id, timestamp, status):
         """
         This function sets the job state for this job. It also updates
@@ -0,0 +1,132 @@
+"""
+Pool of worker processes parsing kickstart output files ahead of the
+pegasus-monitord main loop.
+"""
+
+##
+#  Copyright 2007-2016 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import os
+import signal
+import logging
+import multiprocessing
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+from Pegasus.tools import kickstart_parser
+
+logger = logging.getLogger(__name__)
+
+# Files submitted to the pool, per worker, before prefetching stops
+PREFETCH_FACTOR = 4
+
+def _init_worker():
+    """
+    This function runs in each worker process. Ctrl+C is delivered to
+    the whole process group, but only monitord should act on it.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+class KickstartParserPool(object):
+    """
+    This class parses kickstart output files in a pool of worker
+    processes. Monitord calls prefetch() for the jobs that will finish
+    in the lines it has read but not processed yet, and parse() when it
+    processes them. Since parse() is only called from the main loop,
+    the records, and the events generated from them, come out in
+    dagman.out order no matter in which order the workers finish.
+    """
+    def __init__(self, workers):
+        self._workers = workers
+        self._max_pending = workers * PREFETCH_FACTOR
+        self._pool = multiprocessing.Pool(workers, _init_worker)
+        # Filename -> (file signature, async result), in prefetch order
+        self._pending = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, filename):
+        """
+        This function returns the size and modification time of a
+        file, or None if it does not exist.
+        """
+        try:
+            my_stat = os.stat(filename)
+        except OSError:
+            return None
+
+        return (my_stat.st_size, my_stat.st_mtime)
+
+    def full(self):
+        """
+        This function returns True when no more files can be prefetched.
+        """
+        return len(self._pending) >= self._max_pending
+
+    def prefetch(self, filename):
+        """
+        This function submits a kickstart output file to the pool.
+        Files that do not exist yet are left for parse() to handle.
+        """
+        if filename in self._pending or self.full():
+            return
+
+        my_signature = self._signature(filename)
+        if my_signature is None:
+            return
+
+        self._pending[filename] = (my_signature,
+                                   self._pool.apply_async(kickstart_parser.parse_stampede_file, (filename,)))
+
+    def parse(self, filename):
+        """
+        This function returns the same tuple as parse_stampede_file,
+        using the prefetched result if the file has not changed since
+        it was submitted, and parsing it inline otherwise.
+        """
+        if filename in self._pending:
+            # Files are parsed in the order they were prefetched, so
+            # anything submitted before this one was a wrong guess
+            while True:
+                my_filename, (my_signature, my_result) = self._pending.popitem(last=False)
+                if my_filename == filename:
+                    break
+                logger.debug("discarding prefetched output file %s" % (my_filename))
+
+            if my_signature == self._signature(filename):
+                try:
+                    my_output = my_result.get()
+                    self.hits = self.hits + 1
+                    return my_output
+                except Exception, e:
+                    logger.warning("error parsing %s in worker process: %s" % (filename, e))
+
+        self.misses = self.misses + 1
+        return kickstart_parser.parse_stampede_file(filename)
+
+    def close(self):
+        """
+        This function stops the worker processes.
+        """
+        self._pending.clear()
+        self._pool.terminate()
+        self._pool.join()
+        logger.info("kickstart parser pool: %d workers, %d files prefetched, %d parsed inline"
+                    % (self._workers, self.hits, self.misses))
@@ -25,6 +25,7 @@ import sys
 import time
 import socket
 import logging
+import cPickle
 import traceback
 
 # Import other Pegasus modules
@@ -59,11 +60,25 @@ MONITORD_START_FILE = "monitord.started"   # filename for writing when monitord
 MONITORD_DONE_FILE = "monitord.done"       # filename for writing when monitord finishes
 MONITORD_STATE_FILE = "monitord.info"      # filename for writing monitord state information
 MONITORD_RECOVER_FILE = "monitord.recover" # filename for writing monitord recovery information
+MONITORD_CHECKPOINT_FILE = "monitord.checkpoint" # filename for writing monitord resume checkpoints
+MONITORD_CHECKPOINT_VERSION = 2            # format version of the checkpoint file
 PRESCRIPT_TASK_ID = -1                     # id for prescript tasks
 POSTSCRIPT_TASK_ID = -2                    # id for postscript tasks
 MAX_OUTPUT_LENGTH = 2**16-1                # in bytes, maximum we can put into the database for job's stdout and stderr
 UNKNOWN_FAILURE_CODE = 2                   # unknown failure code when inserting an END event betweeen consecutive workflow start events
 
+# Workflow attributes updated while parsing the dagman.out file, these
+# are saved in the checkpoint file so that we can resume from where we
+# stopped without reading the dagman.out file from the beginning. They
+# only hold plain values, except for _jobs, whose Job objects are saved
+# as dicts (see Job.get_checkpoint)
+CHECKPOINT_ATTRIBUTES = ["_line", "_jobs", "_jobs_map", "_job_submit_seq", "_job_counters",
+                         "_job_info", "_last_submitted_job", "_restart_count",
+                         "_skipping_recovery_lines", "_dagman_condor_id", "_dagman_pid",
+                         "_current_timestamp", "_dagman_exit_code", "_condorlog",
+                         "_multiline_file_flag", "_walltime", "_job_site",
+                         "_last_known_state", "_is_pmc_dag"]
+
 # Other variables
 condor_dagman_executable = None	# condor_dagman binary location
 
@@ -73,6 +88,73 @@ if condor_dagman_executable is None:
     # Default value
     condor_dagman_executable = "condor_dagman"
 
+def read_checkpoint_file(checkpoint_file):
+    """
+    This function reads the checkpoint file written by a previous
+    instance of pegasus-monitord. It returns the list of checkpoints
+    (one per workflow being tracked), or None if the file does not
+    exist or cannot be used to resume, e.g. because one of the
+    dagman.out files was replaced or truncated in the meantime.
+    """
+    if not os.access(checkpoint_file, os.F_OK):
+        return None
+
+    try:
+        CHECKPOINT = open(checkpoint_file, "rb")
+        try:
+            my_data = cPickle.load(CHECKPOINT)
+        finally:
+            CHECKPOINT.close()
+    except:
+        logger.warning("cannot read checkpoint file %s, ignoring it..." % (checkpoint_file))
+        return None
+
+    if not isinstance(my_data, dict) or my_data.get("version") != MONITORD_CHECKPOINT_VERSION:
+        logger.warning("unknown checkpoint format in %s, ignoring it..." % (checkpoint_file))
+        return None
+
+    for my_checkpoint in my_data["workflows"]:
+        if my_checkpoint["offset"] == 0:
+            # Nothing read from this file yet
+            continue
+        # Make sure we are looking at the same dagman.out file
+        try:
+            my_stat = os.stat(my_checkpoint["dagman_out"])
+        except OSError:
+            logger.warning("%s is gone, ignoring checkpoint file..." % (my_checkpoint["dagman_out"]))
+            return None
+        if my_stat.st_ino != my_checkpoint["inode"] or my_stat.st_size < my_checkpoint["offset"]:
+            logger.warning("%s has changed, ignoring checkpoint file..." % (my_checkpoint["dagman_out"]))
+            return None
+
+    return my_data["workflows"]
+
+def write_checkpoint_file(checkpoint_file, checkpoints):
+    """
+    This function writes the list of checkpoints to the checkpoint
+    file. The new file is written next to the old one and renamed
+    over it, so that a crash never leaves a partial checkpoint behind.
+    """
+    my_tmp_file = checkpoint_file + ".tmp"
+    try:
+        CHECKPOINT = open(my_tmp_file, "wb")
+        try:
+            cPickle.dump({"version": MONITORD_CHECKPOINT_VERSION,
+                          "timestamp": int(time.time()),
+                          "workflows": checkpoints},
+                         CHECKPOINT, cPickle.HIGHEST_PROTOCOL)
+            CHECKPOINT.flush()
+            os.fsync(CHECKPOINT.fileno())
+        finally:
+            CHECKPOINT.close()
+        os.rename(my_tmp_file, checkpoint_file)
+    except:
+        logger.error("cannot write checkpoint file %s" % (checkpoint_file))
+        logger.error(traceback.format_exc())
+        return False
+
+    return True
+
 class Workflow:
     """
     Class used to keep everything needed to track a particular workflow
@@ -477,6 +559,69 @@ class Workflow:
 
         return
 
+    def get_checkpoint(self, offset, partial_line):
+        """
+        This function returns a checkpoint with everything needed to
+        resume parsing this workflow's dagman.out file, without going
+        through it again: the byte offset we read up to, the partial
+        line still in our buffer, and the jobs' state.
+        """
+        my_state = {}
+        for my_attr in CHECKPOINT_ATTRIBUTES:
+            my_state[my_attr] = getattr(self, my_attr)
+
+        # Only plain values go to the checkpoint file, so that it does
+        # not depend on the Job class
+        my_state["_jobs"] = {}
+        for my_key, my_job in self._jobs.iteritems():
+            my_state["_jobs"][my_key] = my_job.get_checkpoint()
+
+        try:
+            my_inode = os.stat(self._out_file).st_ino
+        except OSError:
+            # The dagman.out file has not appeared yet
+            my_inode = None
+
+        return {"wf_uuid": self._wf_uuid,
+                "root_wf_uuid": self._root_workflow_id,
+                "parent_wf_uuid": self._parent_workflow_id,
+                "run_dir": self._run_dir,
+                "dagman_out": self._out_file,
+                "inode": my_inode,
+                "offset": offset,
+                "buffer": partial_line,
+                "state": my_state}
+
+    def restore_checkpoint(self, checkpoint):
+        """
+        This function restores the workflow state from a checkpoint
+        written by a previous instance of the monitoring daemon.
+        Returns True if the checkpoint was applied.
+        """
+        if checkpoint["wf_uuid"] != self._wf_uuid:
+            logger.warning("checkpoint for %s does not match workflow %s, ignoring it..." %
+                           (checkpoint["wf_uuid"], self._wf_uuid))
+            return False
+
+        for my_attr, my_value in checkpoint["state"].iteritems():
+            setattr(self, my_attr, my_value)
+
+        self._jobs = {}
+        for (my_jobid, my_job_submit_seq), my_job_state in checkpoint["state"]["_jobs"].iteritems():
+            my_job = Job(self._wf_uuid, my_jobid, my_job_state["_job_submit_dir"], my_job_submit_seq)
+            my_job.restore_checkpoint(my_job_state)
+            self._jobs[my_jobid, my_job_submit_seq] = my_job
+
+        # Everything up to this line was already processed and sent
+        # to the database, no need to go through it again
+        self._last_processed_line = self._line
+        self._previous_processed_line = 0
+        self._checkpoint_offset = checkpoint["offset"]
+        self._checkpoint_buffer = checkpoint["buffer"]
+        logger.info("resuming %s from byte %d (line %d)" % (self._out_file, self._checkpoint_offset, self._line))
+
+        return True
+
     def db_send_wf_info(self):
         """
         This function sends to the DB information about the workflow
@@ -738,12 +883,16 @@ class Workflow:
                  parent_id=None, parent_jobid=None, parent_jobseq=None,
                  enable_notifications=True, replay_mode=False,
                  store_stdout_stderr=True, output_dir=None,
-                 notifications_manager=None ):
+                 notifications_manager=None, checkpoint=None,
+                 parser_pool=None):
         """
         This function initializes the workflow object. It looks for
         the workflow configuration file (or for workflow_config_file,
         if specified). Here we also open the jobstate.log file, and
-        parse the dag.
+        parse the dag. If a checkpoint is given, the workflow resumes
+        from where a previous instance of the monitoring daemon stopped.
+        If a parser_pool is given, kickstart output files are parsed
+        through it.
         """
         # Initialize class variables from creator parameters
         self._out_file = outfile
@@ -758,6 +907,7 @@ class Workflow:
         self._enable_notifications = enable_notifications
         self._replay_mode = replay_mode
         self._notifications_manager = notifications_manager
+        self._parser_pool = parser_pool
         self._output_dir = output_dir
         self._store_stdout_stderr = store_stdout_stderr
         #self._last_known_state = last_known_state  #last known state of the workflow. updated whenever change_wf_state is called
@@ -807,6 +957,8 @@ class Workflow:
         self._job_site = {}                     # last site a job was planned for
         self._last_known_state = None           # last known state of the workflow. updated whenever change_wf_state is called
         self._is_pmc_dag = False                # boolean to track whether monitord is parsing a PMC DAG i.e pmc-only mode of Pegasus
+        self._checkpoint_offset = 0             # byte offset in the dagman.out file to resume from
+        self._checkpoint_buffer = ''            # partial line read before the checkpoint offset
 
         self.init_clean()
 
@@ -893,7 +1045,10 @@ class Workflow:
             # Recover state from a previous run
             self.read_workflow_state()
             self.read_workflow_progress()
-            if self._previous_processed_line != 0:
+            if checkpoint is not None and self.restore_checkpoint(checkpoint):
+                # Resuming from the checkpoint, nothing else to do
+                pass
+            elif self._previous_processed_line != 0:
                 # Recovery mode detected, reset last_processed_line so
                 # that we start from the beginning of the dagman.out
                 # file...
@@ -1723,43 +1878,86 @@ class Workflow:
 
 
 
+    def get_job_output_filename(self, my_job):
+        """
+        This function returns the name of the kickstart output file of
+        a given job, or None if the job is a subdag job, which has no
+        kickstart output.
+        """
+        # Check if this is a subdag job
+        if (my_job._exec_job_id in self._job_info and
+            self._job_info[my_job._exec_job_id][5] == True):
+            return None
+
+        # Compose kickstart output file name (base is the filename before rotation)
+        my_job_output_fn = os.path.join(my_job._job_submit_dir, my_job._exec_job_id) + ".out"
+
+        # PM-793 if there is a postscript associated then a job has rotated stdout|stderr
+        # OR we are in the PMC only mode where there are no postscripts associated, but
+        # still we have rotated logs
+        if self.job_has_postscript( my_job._exec_job_id) or self._is_pmc_dag:
+            my_job_output_fn = my_job_output_fn + ".%03d" % (my_job._job_output_counter)
+
+        return my_job_output_fn
+
+    def prefetch_job_output(self, jobid, job_state):
+        """
+        This function hands the kickstart output file that will be
+        parsed when jobid reaches job_state to the parser pool, so
+        that it is parsed while the main loop works on earlier lines.
+        It mirrors the checks done in update_job_state, but a wrong
+        guess only costs some wasted work in the pool. It returns
+        False if we have not seen jobid being submitted yet, so that
+        the caller can try again later.
+        """
+        if self._parser_pool is None:
+            return True
+
+        if self._sink is None and not self._enable_notifications:
+            # Kickstart output is not parsed at all
+            return True
+
+        my_job_submit_seq = self.find_jobid(jobid)
+        if my_job_submit_seq is None or not jobid in self._job_info:
+            return False
+
+        if job_state == "JOB_SUCCESS" or job_state == "JOB_FAILURE":
+            # PM-793 jobs with a postscript are parsed when the postscript finishes
+            if self.job_has_postscript(jobid) and not self._is_pmc_dag:
+                return True
+
+        my_job_output_fn = self.get_job_output_filename(self._jobs[jobid, my_job_submit_seq])
+        if my_job_output_fn is not None:
+            self._parser_pool.prefetch(my_job_output_fn)
+
+        return True
+
     def parse_job_output(self, my_job, job_state):
         """
         This function tries to parse the kickstart output file of a
         given job and collect information for the stampede schema.
         """
         my_output = []
-        parse_kickstart = True
 
         #a boolean to track if the job has rotated stdout/stderr files
         #used to track the case where we have rotated files for non kickstart jobs
         my_job_has_rotated_stdout_err_files = False
 
-        # Check if this is a subdag job
-        if (my_job._exec_job_id in self._job_info and
-            self._job_info[my_job._exec_job_id][5] == True):
-            # Disable kickstart_parsing...
-            parse_kickstart = False
+        my_job_output_fn = self.get_job_output_filename(my_job)
 
         # If job is a subdag job, skip looking for its kickstart output
-        if parse_kickstart:
-            # Compose kickstart output file name (base is the filename before rotation)
-            my_job_output_fn_base = os.path.join(my_job._job_submit_dir, my_job._exec_job_id) + ".out"
-
-            # PM-793 if there is a postscript associated then a job has rotated stdout|stderr
-            # OR we are in the PMC only mode where there are no postscripts associated, but
-            # still we have rotated logs
-            my_job_output_fn = my_job_output_fn_base
+        if my_job_output_fn is not None:
             if self.job_has_postscript( my_job._exec_job_id) or self._is_pmc_dag:
-                my_job_output_fn = my_job_output_fn_base + ".%03d" % (my_job._job_output_counter)
                 my_job._has_rotated_stdout_err_files = True
 
             # First assume we will find rotated file
-            my_parser = kickstart_parser.Parser(my_job_output_fn)
-            my_output = my_parser.parse_stampede()
+            if self._parser_pool is not None:
+                my_output, my_open_error = self._parser_pool.parse(my_job_output_fn)
+            else:
+                my_output, my_open_error = kickstart_parser.parse_stampede_file(my_job_output_fn)
 
             # Check if successful
-            if my_parser._open_error == True and not my_job.is_noop_job():
+            if my_open_error == True and not my_job.is_noop_job():
                 logger.error("unable to read output file %s for job %s" % (my_job_output_fn, my_job._exec_job_id))
 
         # Initialize task id counter
@@ -1870,8 +2068,8 @@ class Workflow:
             if self._store_stdout_stderr:
                 my_job.read_stdout_stderr_files(self._run_dir)
 
-            # parse_kickstart will be False for subdag jobs
-            if my_job._exec_job_id.startswith("subdax_") or not parse_kickstart:
+            # my_job_output_fn will be None for subdag jobs
+            if my_job._exec_job_id.startswith("subdax_") or my_job_output_fn is None:
                 # For subdag and subdax jobs, we also generate a host event
                 record = {}
                 record["hostname"] = socket.getfqdn()
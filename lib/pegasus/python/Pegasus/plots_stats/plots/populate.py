@@ -21,6 +21,7 @@ import pegasus_host_over_time
 import traceback
 
 from Pegasus.db.workflow.stampede_statistics import StampedeStatistics
+from Pegasus.db.workflow.stampede_columnar_statistics import StampedeColumnarStatistics
 from datetime import timedelta
 from datetime import datetime
 
@@ -39,6 +40,7 @@ global_braindb_submit_dir =None
 global_db_url = None
 global_top_wf_uuid =None
 global_wf_id_uuid_map = {}
+global_statistics_class = StampedeStatistics
 color_count =0
 
 def populate_individual_job_instance_details(job_states , job_stat , isFailed , retry_count):
@@ -149,7 +151,7 @@ def get_workflows_uuid():
 	"""
 	# expand = True
 	try:
-		expanded_workflow_stats = StampedeStatistics(global_db_url)
+		expanded_workflow_stats = global_statistics_class(global_db_url)
 	 	expanded_workflow_stats.initialize(global_top_wf_uuid)
 	 	expanded_workflow_stats.set_job_filter('all')
  	except:
@@ -157,7 +159,7 @@ def get_workflows_uuid():
 		sys.exit(1)
  	#expand = False
  	try:
-	 	root_workflow_stats = StampedeStatistics(global_db_url , False)
+	 	root_workflow_stats = global_statistics_class(global_db_url , False)
 	 	root_workflow_stats.initialize(global_top_wf_uuid)
 	 	root_workflow_stats.set_job_filter('all')
  	except:
@@ -332,7 +334,7 @@ def populate_transformation_details(workflow_stats , workflow_info):
 def get_wf_stats(wf_uuid,expand = False):
 	workflow_stampede_stats = None
 	try:
-		workflow_stampede_stats = StampedeStatistics(global_db_url , expand)
+		workflow_stampede_stats = global_statistics_class(global_db_url , expand)
 		workflow_stampede_stats.initialize(wf_uuid)
         except (connection.ConnectionError, DBAdminError), e:
                 logger.error("------------------------------------------------------")
@@ -373,50 +375,54 @@ def populate_time_details(workflow_stats, wf_info ):
 	@param workflow_info the WorkflowInfo object reference 
 	"""
 	workflow_stats.set_job_filter('nonsub')
-	# day is calculated from hour.
-	workflow_stats.set_time_filter('hour')
-	
-	job_stats_by_time = workflow_stats.get_jobs_run_by_time()
 	workflow_stats.set_transformation_filter(exclude=['condor::dagman'])
-	inv_stats_by_time = workflow_stats.get_invocation_by_time()
-	populate_job_invocation_time_details(wf_info,job_stats_by_time,inv_stats_by_time ,'hour')
-	populate_job_invocation_time_details(wf_info, job_stats_by_time,inv_stats_by_time ,'day')
+	utc_offsets = plot_utils.get_workflow_utc_offsets(workflow_stats)
+	for date_time_filter in ['hour', 'day']:
+		job_stats_by_time = workflow_stats.get_time_series('jobs', date_time_filter, utc_offset=utc_offsets)
+		inv_stats_by_time = workflow_stats.get_time_series('invocations', date_time_filter, utc_offset=utc_offsets)
+		populate_job_invocation_time_details(wf_info, job_stats_by_time, inv_stats_by_time, date_time_filter)
 	
 
 def populate_job_invocation_time_details(wf_info, job_stats, invocation_stats ,date_time_filter):
 	"""
 	Populates the job instances and invocation time and runtime statistics sorted by time.
 	@param workflow_info the WorkflowInfo object reference 
-	@param job_stats the job statistics by time tuple
-	@param invocation_stats the invocation statisctics by time tuple
+	@param job_stats the job statistics time series
+	@param invocation_stats the invocation statisctics time series
 	@param date_time_filter date time filter
 	"""
-	formatted_stats_list = plot_utils.convert_stats_to_base_time(job_stats , date_time_filter)
+	formatted_stats_list = plot_utils.convert_time_series(job_stats)
  	jobs_time_list =[]
 	for stats in formatted_stats_list:
 		content = [stats['date_format'] , stats['count'],stats['runtime']]
 		jobs_time_list.append(content)
 	wf_info.wf_job_instances_over_time_statistics[date_time_filter] = jobs_time_list
 	
-	formatted_stats_list = plot_utils.convert_stats_to_base_time(invocation_stats , date_time_filter)
+	formatted_stats_list = plot_utils.convert_time_series(invocation_stats)
 	invoc_time_list = []
 	for stats in formatted_stats_list:
 		content = [stats['date_format'] , stats['count'],stats['runtime']]
 		invoc_time_list.append(content)
 	wf_info.wf_invocations_over_time_statistics[date_time_filter] = invoc_time_list
 
-def setup(submit_dir , config_properties):
+def setup(submit_dir , config_properties, in_memory=False):
 	"""
 	Setup the populate module
 	@submit_dir submit directory path of the workflow run
 	@config_properties path to the propery file
+	@in_memory whether to compute the statistics in memory with NumPy
 	"""
 	# global reference
+	global global_statistics_class
 	global global_base_submit_dir
 	global global_braindb_submit_dir
 	global global_db_url
 	global global_top_wf_uuid
 	global_base_submit_dir = submit_dir
+	if in_memory:
+		global_statistics_class = StampedeColumnarStatistics
+	else:
+		global_statistics_class = StampedeStatistics
 	#Getting values from braindump file
 	config = utils.slurp_braindb(submit_dir)
 	if (config.has_key('submit_dir') or config.has_key('run')):
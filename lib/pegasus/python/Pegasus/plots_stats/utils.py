@@ -28,6 +28,8 @@ import math
 import tempfile
 import commands
 import shutil
+import time
+import calendar
 from datetime import datetime
 
 from Pegasus.tools import properties
@@ -237,8 +239,10 @@ def get_date_multiplier(date_filter):
 	@return multiplier for a given filter
 	"""
 	vals = {
+	'week': 604800,
 	'day': 86400,
-	'hour': 3600
+	'hour': 3600,
+	'minute': 60
 	}
 	return vals[date_filter]
 	
@@ -249,8 +253,11 @@ def get_date_format(date_filter):
 	@return the date format for a given filter
 	"""
 	vals = {
+	'month': '%Y-%m',
+	'week': '%Y-%m-%d',
 	'day': '%Y-%m-%d',
-	'hour': '%Y-%m-%d : %H'
+	'hour': '%Y-%m-%d : %H',
+	'minute': '%Y-%m-%d : %H:%M'
 	}
 	return vals[date_filter]
 
@@ -261,8 +268,11 @@ def get_date_print_format(date_filter):
 	@return the date format for a given filter
 	"""
 	vals = {
+	'month': '[YYYY-MM]',
+	'week': '[YYYY-MM-DD]',
 	'day': '[YYYY-MM-DD]',
-	'hour': '[YYYY-MM-DD : HH]'
+	'hour': '[YYYY-MM-DD : HH]',
+	'minute': '[YYYY-MM-DD : HH:MM]'
 	}
 	return vals[date_filter]
 
@@ -333,6 +343,78 @@ def convert_stats_to_base_time(stats_by_time, date_time_filter = 'hour', isHost
 				formatted_stats_by_day_list.append(formatted_stats_by_day)
 		return formatted_stats_by_day_list
 
+def get_utc_offset(timestamp=None):
+	"""
+	Utility for returning the offset of the local time zone from UTC
+	@param timestamp :  the unix timestamp, defaults to now
+	@return the offset in seconds east of UTC
+	"""
+	if timestamp is None:
+		timestamp = time.time()
+	timestamp = int(timestamp)
+	return calendar.timegm(time.localtime(timestamp)) - timestamp
+
+def get_utc_offsets(start, end):
+	"""
+	Utility for returning the offsets of the local time zone from UTC
+	between two timestamps, as expected by StampedeStatistics.get_time_series
+	@param start :  the unix timestamp to start from
+	@param end   :  the unix timestamp to end at
+	@return list of (timestamp, offset) tuples, one per daylight saving
+	        time change
+	"""
+	start = int(start)
+	offsets = [(start, get_utc_offset(start))]
+	# Time zones change at most once a day, find when with a binary search
+	day = 86400
+	timestamp = start
+	while timestamp < end:
+		next_timestamp = timestamp + day
+		offset = get_utc_offset(next_timestamp)
+		if offset != offsets[-1][1]:
+			low, high = timestamp, next_timestamp
+			while high - low > 1:
+				middle = (low + high) / 2
+				if get_utc_offset(middle) == offset:
+					high = middle
+				else:
+					low = middle
+			offsets.append((high, offset))
+		timestamp = next_timestamp
+	return offsets
+
+def get_workflow_utc_offsets(workflow_stats):
+	"""
+	Utility for returning the offsets of the local time zone from UTC
+	since the workflow started, to show its time series in local time
+	@param workflow_stats :  StampedeStatistics object reference
+	@return list of (timestamp, offset) tuples
+	"""
+	workflow_states = workflow_stats.get_workflow_states()
+	now = time.time()
+	if len(workflow_states) == 0:
+		return get_utc_offsets(now, now)
+	return get_utc_offsets(min([state.timestamp for state in workflow_states]), now)
+
+def convert_time_series(series):
+	"""
+	Converts a time series returned by StampedeStatistics.get_time_series
+	to the list of statistics returned by convert_stats_to_base_time
+	@param series :  the TimeSeries object
+	@return the stats list
+	"""
+	date_format = get_date_format(series.granularity)
+	formatted_stats_list = []
+	for row in series:
+		formatted_stats = {}
+		formatted_stats['date_format'] = datetime.utcfromtimestamp(row.bucket).strftime(date_format)
+		formatted_stats['count'] = row.count
+		formatted_stats['runtime'] = row.total_runtime
+		if row.host_name is not None:
+			formatted_stats['host'] = row.host_name
+		formatted_stats_list.append(formatted_stats)
+	return formatted_stats_list
+
 def round_decimal_to_str(value , to=3):
 	"""
         Utility method for rounding the decimal value to string to given digits
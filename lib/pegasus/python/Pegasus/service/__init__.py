@@ -12,6 +12,9 @@ if os.path.isfile(conf):
     app.config.from_pyfile(conf)
 del conf
 
+from Pegasus.db import connection
+connection.set_pool_options(pool_size=app.config["DB_POOL_SIZE"], pool_recycle=app.config["DB_POOL_RECYCLE"])
+
 # Find pegasus home
 def get_pegasus_home():
     home = os.getenv("PEGASUS_HOME", None)
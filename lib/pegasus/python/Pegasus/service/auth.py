@@ -110,17 +110,10 @@ def pull_username(endpoint, values):
         g.username = values['username']
 
 
-@app.before_request
-def before():
-
-    # Static files do not need to be authenticated.
-    if (request.script_root + request.path).startswith(url_for('static', filename='')):
-        return
-
-    #
-    # Authentication
-    #
-
+def authenticate():
+    """
+        Authenticate the user sending the request, and set it in g.user. Returns a response if authentication fails.
+    """
     cred = request.authorization
     username = cred.username if cred else None
     password = cred.password if cred else None
@@ -144,6 +137,24 @@ def before():
 
     log.info('Authenticated user %s', g.user.username)
 
+
+@app.before_request
+def before():
+
+    # Static files do not need to be authenticated.
+    if (request.script_root + request.path).startswith(url_for('static', filename='')):
+        return
+
+    #
+    # Authentication
+    #
+
+    # The sub-requests of a batch request run as the user who sent the batch
+    if 'user' not in g:
+        rv = authenticate()
+        if rv is not None:
+            return rv
+
     # If a username is not specified in the requested URI, then set username to the logged in user?
     if 'username' not in g:
         g.username = g.user.username
@@ -30,10 +30,12 @@ from werkzeug.routing import BaseConverter
 
 
 class PagedResponse(object):
-    def __init__(self, records, total, filtered):
+    def __init__(self, records, total, filtered, next_cursor=None, fields=None):
         self._records = records
         self._total = total
         self._filtered = filtered
+        self._next_cursor = next_cursor
+        self._fields = fields
 
     @property
     def records(self):
@@ -47,6 +49,59 @@ class PagedResponse(object):
     def total_filtered(self):
         return self._filtered
 
+    @property
+    def next_cursor(self):
+        return self._next_cursor
+
+    @property
+    def fields(self):
+        return self._fields
+
+
+class StreamedResponse(PagedResponse):
+    """
+    A PagedResponse whose records are an iterator over row tuples of `record_type`, instead of a list of objects.
+    """
+    def __init__(self, records, total, filtered, record_type, fields=None):
+        super(StreamedResponse, self).__init__(records, total, filtered, fields=fields)
+        self._record_type = record_type
+
+    @property
+    def record_type(self):
+        return self._record_type
+
+
+class ChangesResponse(object):
+    """
+    The workflow states, job states, and invocations loaded after a change feed watermark, and the watermark to
+    request the following changes with.
+    """
+    def __init__(self, workflow_states, job_states, invocations, since):
+        self._workflow_states = workflow_states
+        self._job_states = job_states
+        self._invocations = invocations
+        self._since = since
+
+    @property
+    def workflow_states(self):
+        return self._workflow_states
+
+    @property
+    def job_states(self):
+        return self._job_states
+
+    @property
+    def invocations(self):
+        return self._invocations
+
+    @property
+    def since(self):
+        return self._since
+
+    @property
+    def is_empty(self):
+        return not (self._workflow_states or self._job_states or self._invocations)
+
 
 class ErrorResponse(object):
     def __init__(self, code, message, errors=None):
@@ -95,6 +150,18 @@ class InvalidOrderError(ServiceError):
     pass
 
 
+class InvalidCursorError(ServiceError):
+    pass
+
+
+class InvalidFieldsError(ServiceError):
+    pass
+
+
+class InvalidWatermarkError(ServiceError):
+    pass
+
+
 class BaseQueryParser(object):
     """
     Base Query Parser class provides a basic implementation to parse the `query` argument
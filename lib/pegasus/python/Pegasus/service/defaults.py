@@ -13,6 +13,17 @@ PRIVATE_KEY = None
 # Max number of processes to fork when handling requests
 MAX_PROCESSES = 10
 
+# Database connections kept open per database, and seconds after which they are reopened
+DB_POOL_SIZE = 5
+DB_POOL_RECYCLE = 3600
+
+# Number of threads running the requests of a monitoring batch request concurrently
+BATCH_MAX_WORKERS = 4
+
+# Longest wait of a change feed long poll or event stream, and the interval at which it polls the database, in seconds
+CHANGES_MAX_TIMEOUT = 30
+CHANGES_POLL_INTERVAL = 1
+
 # Enable debugging
 DEBUG = False
 
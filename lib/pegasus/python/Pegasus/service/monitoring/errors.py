@@ -20,7 +20,8 @@ from flask import make_response
 
 from sqlalchemy.orm.exc import NoResultFound
 
-from Pegasus.service.base import ErrorResponse, InvalidQueryError, InvalidOrderError, InvalidJSONError
+from Pegasus.service.base import ErrorResponse, InvalidQueryError, InvalidOrderError, InvalidCursorError
+from Pegasus.service.base import InvalidFieldsError, InvalidWatermarkError, InvalidJSONError
 from Pegasus.service.monitoring import monitoring_routes
 from Pegasus.service.monitoring.utils import jsonify
 
@@ -73,6 +74,30 @@ def invalid_order_error(error):
     return make_response(response_json, 400, JSON_HEADER)
 
 
+@monitoring_routes.errorhandler(InvalidCursorError)
+def invalid_cursor_error(error):
+    e = ErrorResponse('INVALID_CURSOR', error.message)
+    response_json = jsonify(e)
+
+    return make_response(response_json, 400, JSON_HEADER)
+
+
+@monitoring_routes.errorhandler(InvalidFieldsError)
+def invalid_fields_error(error):
+    e = ErrorResponse('INVALID_FIELDS', error.message)
+    response_json = jsonify(e)
+
+    return make_response(response_json, 400, JSON_HEADER)
+
+
+@monitoring_routes.errorhandler(InvalidWatermarkError)
+def invalid_watermark_error(error):
+    e = ErrorResponse('INVALID_WATERMARK', error.message)
+    response_json = jsonify(e)
+
+    return make_response(response_json, 400, JSON_HEADER)
+
+
 @monitoring_routes.errorhandler(InvalidJSONError)
 def invalid_json_error(error):
     e = ErrorResponse('INVALID_JSON', error.message)
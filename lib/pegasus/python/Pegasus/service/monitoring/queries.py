@@ -14,9 +14,14 @@
 
 __author__ = 'Rajiv Mayani'
 
+import base64
 import hashlib
+import json
 
-from sqlalchemy.orm import aliased, defer
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.orm import aliased, class_mapper, defer
+from sqlalchemy.sql.expression import false
 from sqlalchemy.orm.exc import NoResultFound
 
 from Pegasus.db import connection
@@ -25,6 +30,8 @@ from Pegasus.db.errors import StampedeDBNotFoundError
 from Pegasus.db.admin.admin_loader import DBAdminError
 from Pegasus.service import cache
 from Pegasus.service.base import PagedResponse, BaseQueryParser, BaseOrderParser, InvalidQueryError, InvalidOrderError
+from Pegasus.service.base import InvalidCursorError, InvalidFieldsError, InvalidWatermarkError
+from Pegasus.service.base import StreamedResponse, ChangesResponse
 from Pegasus.service.base import OrderedSet, OrderedDict
 from Pegasus.service.monitoring.resources import RootWorkflowResource, RootWorkflowstateResource, CombinationResource
 from Pegasus.service.monitoring.resources import WorkflowResource, WorkflowMetaResource, WorkflowstateResource
@@ -36,7 +43,22 @@ from Pegasus.service.monitoring.utils import csv_to_json
 log = logging.getLogger(__name__)
 
 
+class CountMode:
+    """
+    Which record counts a collection query computes.
+
+    EXACT counts both the total and the filtered records, TOTAL skips the filtered count, and NONE skips both.
+    """
+    EXACT = 'exact'
+    TOTAL = 'total'
+    NONE = 'none'
+
+    modes = (EXACT, TOTAL, NONE)
+
+
 class WorkflowQueries(object):
+    STREAM_BATCH_SIZE = 1000
+
     def __init__(self, connection_string, use_cache=True):
         if connection_string is None:
             raise ValueError('Connection string is required')
@@ -74,7 +96,10 @@ class WorkflowQueries(object):
         cache_key = ' '.join([self._conn_string_csum, str(compiled)] + [str(params[k]) for k in sorted(params)])
         return hashlib.md5(cache_key).hexdigest()
 
-    def _get_count(self, q, use_cache=True, timeout=60):
+    def _get_count(self, q, use_cache=True, timeout=60, skip=False):
+        if skip:
+            return None
+
         cache_key = '%s.count' % self._cache_key_from_query(q)
         if use_cache and cache.get(cache_key):
             log.debug('Cache Hit: %s' % cache_key)
@@ -102,6 +127,67 @@ class WorkflowQueries(object):
 
         return record
 
+    @staticmethod
+    def _get_key_columns(entity):
+        """
+        Returns the names of the primary and foreign key columns of `entity`, which the resource links are built from.
+        """
+        mapper = class_mapper(entity)
+
+        return [prop.key for prop in mapper.column_attrs if any(c.primary_key or c.foreign_keys for c in prop.columns)]
+
+    @staticmethod
+    def _get_fields(fields, resource):
+        """
+        Returns the list of `resource` fields named in the comma separated `fields`, or None to return all fields.
+        """
+        if not fields:
+            return None
+
+        field_list = []
+
+        for field in fields.split(','):
+            field = field.strip()
+
+            if not resource.is_field_valid(field):
+                log.error('Invalid field %r' % field)
+                raise InvalidFieldsError('Invalid field %r' % field)
+
+            field_list.append(field.split('.', 1)[-1])
+
+        return field_list
+
+    @staticmethod
+    def _add_projection(q, entity, fields=None):
+        """
+        Defers loading the `entity` columns not listed in `fields`, so they are not selected. Key columns are always
+        loaded.
+        """
+        if not fields:
+            return q
+
+        keys = WorkflowQueries._get_key_columns(entity)
+        deferred = [defer(getattr(entity, prop.key)) for prop in class_mapper(entity).column_attrs
+                    if prop.key not in fields and prop.key not in keys]
+
+        return q.options(*deferred) if deferred else q
+
+    @staticmethod
+    def _get_stream(q, entity, resource, fields=None):
+        """
+        Returns an iterator over the records of `q`, which reads them in batches from a server-side cursor where the
+        database driver supports it. Records are tuples of the requested `resource` fields and of the key columns
+        the resource links are built from, so no ORM objects are loaded.
+        """
+        keys = OrderedSet(*(fields or resource.fields))
+
+        for key in WorkflowQueries._get_key_columns(entity):
+            keys.add(key)
+
+        q = q.with_entities(*[getattr(entity, key) for key in keys])
+
+        return q.yield_per(WorkflowQueries.STREAM_BATCH_SIZE)
+
     def _get_one(self, q, use_cache=True, timeout=60):
         cache_key = '%s.one' % self._cache_key_from_query(q)
         if use_cache and cache.get(cache_key):
@@ -174,6 +260,19 @@ class WorkflowQueries(object):
 
         return q
 
+    @staticmethod
+    def _get_sort_field(identifier, resource):
+        try:
+            if isinstance(resource, CombinationResource):
+                return resource.get_mapped_field(identifier)
+
+            else:
+                return resource.get_mapped_field(identifier, ignore_prefix=True)
+
+        except (KeyError, AttributeError):
+            log.exception('Invalid field %r' % identifier)
+            raise InvalidOrderError('Invalid field %r' % identifier)
+
     @staticmethod
     def _add_ordering(q, order, resource):
         if not q or not order or not resource:
@@ -183,34 +282,30 @@ class WorkflowQueries(object):
         sort_order = order_parser.get_sort_order()
 
         for identifier, sort_dir in sort_order:
-            try:
-                if isinstance(resource, CombinationResource):
-                    field = resource.get_mapped_field(identifier)
+            field = WorkflowQueries._get_sort_field(identifier, resource)
 
-                else:
-                    field = resource.get_mapped_field(identifier, ignore_prefix=True)
-
-                if sort_dir == 'ASC':
-                    q = q.order_by(field)
-                else:
-                    q = q.order_by(desc(field))
-
-            except (KeyError, AttributeError):
-                log.exception('Invalid field %r' % identifier)
-                raise InvalidOrderError('Invalid field %r' % identifier)
+            if sort_dir == 'ASC':
+                q = q.order_by(field)
+            else:
+                q = q.order_by(desc(field))
 
         return q
 
     @staticmethod
-    def _add_pagination(q, start_index=None, max_results=None, total_records=None):
+    def _add_pagination(q, start_index=None, max_results=None, total_records=None, keyset=None):
         """
         LIMIT <skip>, <count>       - Valid
         LIMIT <count> OFFSET <skip> - Valid
         OFFSET <skip>               - Invalid
 
         If only start_index is provided and total_records is known then we can compute both limit and offset to
-        effectively support OFFSET <skip>
+        effectively support OFFSET <skip>, otherwise SQLAlchemy renders the dialect specific unbounded LIMIT.
+
+        If a keyset is provided, the page starts after the cursor's record instead of skipping start_index records.
         """
+        if keyset:
+            return keyset.paginate(q, max_results)
+
         if start_index and max_results:
             q = q.offset(start_index)
             q = q.limit(max_results)
@@ -226,19 +321,270 @@ class WorkflowQueries(object):
                 q = q.offset(start_index)
                 q = q.limit(total_records)
 
+            else:
+                q = q.offset(start_index)
+
+        return q
+
+    @staticmethod
+    def _get_keyset(q, cursor=None, order=None, resource=None, key=None):
+        """
+        Returns a Keyset to paginate `q` with, or None when no cursor was requested.
+
+        An empty cursor requests the first page.
+        """
+        if cursor is None:
+            return None
+
+        return Keyset(q, cursor, order, resource, key)
+
+
+class Keyset(object):
+    """
+    Keyset pagination. Records are sorted on the `order` fields followed by the primary key of the queried entities,
+    and each page starts after the sort key of the last record of the previous page, which the client passes back as
+    an opaque cursor. Unlike OFFSET, the database does not have to read and discard the preceding records.
+    """
+
+    def __init__(self, q, cursor, order=None, resource=None, key=None):
+        """
+        :param q: Query to paginate, sorted by `order`
+        :param cursor: Cursor returned with the previous page, or an empty string for the first page
+        :param order: Sorting criteria
+        :param resource: Resource used to map the `order` fields
+        :param key: Unique key of the records, defaults to the primary keys of the queried entities
+        """
+        self._order = order or ''
+        self._fields = []
+
+        if order and resource:
+            for identifier, sort_dir in BaseOrderParser(order).get_sort_order():
+                self._fields.append((WorkflowQueries._get_sort_field(identifier, resource), sort_dir == 'ASC'))
+
+        self._key_index = len(self._fields)
+
+        if key is None:
+            key = []
+
+            for column in q.column_descriptions:
+                entity = column['expr']
+
+                if column['aliased'] or not isinstance(entity, type):
+                    continue
+
+                mapper = class_mapper(entity)
+                key.extend(getattr(entity, mapper.get_property_by_column(c).key) for c in mapper.primary_key)
+
+        self._fields.extend((field, True) for field in key)
+
+        # SQLite and MySQL sort NULL before any other value, PostgreSQL and Oracle after
+        self._null_first = q.session.get_bind().dialect.name not in ('postgresql', 'oracle')
+
+        self._values = self._decode(cursor) if cursor else None
+
+    def _decode(self, cursor):
+        try:
+            state = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            order = state['order']
+            values = [Decimal(v['decimal']) if isinstance(v, dict) else v for v in state['key']]
+
+        except (TypeError, ValueError, KeyError, InvalidOperation):
+            log.exception('Invalid cursor %r' % cursor)
+            raise InvalidCursorError('Invalid cursor %r' % cursor)
+
+        if order != self._order or len(values) != len(self._fields):
+            raise InvalidCursorError('Cursor was not issued for this query and order')
+
+        return values
+
+    def _encode(self, values):
+        values = [{'decimal': str(v)} if isinstance(v, Decimal) else v for v in values]
+        state = OrderedDict([('order', self._order), ('key', values)])
+
+        return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')))
+
+    def _after(self, field, ascending, value):
+        null_first = self._null_first == ascending
+
+        if value is None:
+            return field != None if null_first else false()
+
+        after = field > value if ascending else field < value
+        return after if null_first else or_(after, field == None)
+
+    def paginate(self, q, max_results=None):
+        for field, ascending in self._fields[self._key_index:]:
+            q = q.order_by(field)
+
+        if self._values is not None:
+            clauses = []
+
+            for i, (field, ascending) in enumerate(self._fields):
+                terms = [f == v for (f, a), v in zip(self._fields[:i], self._values[:i])]
+                terms.append(self._after(field, ascending, self._values[i]))
+                clauses.append(and_(*terms))
+
+            q = q.filter(or_(*clauses))
+
+        if max_results:
+            q = q.limit(max_results)
+
         return q
 
+    def next_cursor(self, records, max_results=None):
+        """
+        Returns the cursor of the page following `records`, or None if `records` is the last page.
+        """
+        if not records or not max_results or len(records) < max_results:
+            return None
+
+        record = records[-1]
+        entities = record if isinstance(record, tuple) else (record,)
+        values = []
+
+        for field, ascending in self._fields:
+            for entity in entities:
+                if isinstance(entity, field.class_):
+                    values.append(getattr(entity, field.key))
+                    break
+
+            else:
+                raise ValueError('Record has no value for sort field %s' % field)
+
+        return self._encode(values)
+
+
+class Watermark(object):
+    """
+    Change feed position, passed back by the client as an opaque string.
+
+    Invocations are inserted with increasing invocation ids, so their position is the last invocation id returned.
+    Workflow and job states have no row id, so their position is the last state timestamp returned, and the keys of
+    the states returned with that timestamp, as more states with the same timestamp can still be loaded.
+    """
+    LATEST = 'latest'
+
+    _order_fields = {
+        Workflowstate: 'timestamp',
+        Jobstate: 'timestamp',
+        Invocation: 'invocation_id'
+    }
+
+    def __init__(self, since=None):
+        """
+        :param since: Watermark returned with the previous changes, or None to start before the first row
+        """
+        self._positions = OrderedDict()
+
+        if since and since != Watermark.LATEST:
+            self._decode(since)
+
+    @staticmethod
+    def _get_fields(entity):
+        mapper = class_mapper(entity)
+        order_field = getattr(entity, Watermark._order_fields[entity])
+
+        keys = [mapper.get_property_by_column(c).key for c in mapper.primary_key]
+        key_fields = [getattr(entity, key) for key in keys if key != order_field.key]
+
+        return order_field, key_fields
+
+    @staticmethod
+    def _get_name(entity):
+        return class_mapper(entity).local_table.name
+
+    def _decode(self, since):
+        try:
+            state = json.loads(base64.urlsafe_b64decode(str(since)))
+
+            for entity in Watermark._order_fields:
+                name = Watermark._get_name(entity)
+
+                if name in state:
+                    after = state[name]['after']
+                    after = Decimal(after['decimal']) if isinstance(after, dict) else after
+                    self._positions[entity] = (after, [tuple(key) for key in state[name]['keys']])
+
+        except (TypeError, ValueError, KeyError, InvalidOperation):
+            log.exception('Invalid watermark %r' % since)
+            raise InvalidWatermarkError('Invalid watermark %r' % since)
+
+    def encode(self):
+        state = OrderedDict()
+
+        for entity, (after, keys) in self._positions.iteritems():
+            after = {'decimal': str(after)} if isinstance(after, Decimal) else after
+            state[Watermark._get_name(entity)] = OrderedDict([('after', after), ('keys', keys)])
+
+        return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')))
+
+    def filter(self, q, entity):
+        """
+        Restricts `q` to the `entity` rows after the watermark, in the order they are returned in.
+        """
+        order_field, key_fields = Watermark._get_fields(entity)
+
+        if entity in self._positions:
+            after, keys = self._positions[entity]
+
+            if key_fields:
+                q = q.filter(order_field >= after)
+                returned = [and_(order_field == after, *[f == v for f, v in zip(key_fields, key)]) for key in keys]
+
+                if returned:
+                    q = q.filter(not_(or_(*returned)))
+
+            else:
+                q = q.filter(order_field > after)
+
+        return q.order_by(order_field, *key_fields)
+
+    def advance(self, entity, records):
+        """
+        Moves the watermark past `records`, the `entity` rows returned by a query restricted with `filter`.
+        """
+        if not records:
+            return
+
+        order_field, key_fields = Watermark._get_fields(entity)
+        after = getattr(records[-1], order_field.key)
+        keys = []
+
+        if key_fields:
+            keys = [[getattr(r, f.key) for f in key_fields] for r in records if getattr(r, order_field.key) == after]
+
+            previous = self._positions.get(entity)
+
+            if previous and previous[0] == after:
+                keys = [list(key) for key in previous[1]] + keys
+
+        self._positions[entity] = (after, keys)
+
+    def seek_latest(self, q, entity):
+        """
+        Moves the watermark past the `entity` rows of `q` that are already loaded.
+        """
+        order_field, key_fields = Watermark._get_fields(entity)
+        record = q.order_by(desc(order_field)).first()
+
+        if record:
+            records = q.filter(order_field == getattr(record, order_field.key)).all() if key_fields else [record]
+            self.advance(entity, records)
+
 
 class MasterWorkflowQueries(WorkflowQueries):
-    def get_root_workflows(self, start_index=None, max_results=None, query=None, order=None, use_cache=True, **kwargs):
+    def get_root_workflows(self, start_index=None, max_results=None, query=None, order=None, use_cache=True,
+                           cursor=None, count=CountMode.EXACT, **kwargs):
         """
         Returns a collection of the Root Workflow objects.
 
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
 
         :return: Collection of tuples (DashboardWorkflow, DashboardWorkflowstate)
         """
@@ -248,7 +594,7 @@ class MasterWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(DashboardWorkflow)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             log.debug('total_records 0')
@@ -272,9 +618,9 @@ class MasterWorkflowQueries(WorkflowQueries):
             resource = CombinationResource(RootWorkflowResource(), RootWorkflowstateResource(alias))
 
             q = self._evaluate_query(q, query, resource)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -287,16 +633,18 @@ class MasterWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, RootWorkflowResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
         for i in range(len(records)):
             new_record = records[i][0]
             new_record.workflow_state = records[i][1]
             records[i] = new_record
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     def get_root_workflow(self, m_wf_id, use_cache=True):
         """
@@ -382,15 +730,19 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Workflow
 
     def get_workflows(self, m_wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=False,
-                      **kwargs):
+                      cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Workflow objects.
 
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Collection of Workflow objects
         """
@@ -401,7 +753,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(Workflow)
         q = q.filter(Workflow.root_wf_id == m_wf_id)
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -411,9 +763,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, WorkflowResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -426,11 +778,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, WorkflowResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, WorkflowResource())
+
+        if stream:
+            records = self._get_stream(q, Workflow, WorkflowResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Workflow, fields)
 
+        q = self._add_projection(q, Workflow, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_workflow(self, wf_id, use_cache=True):
         """
@@ -453,16 +814,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Workflow Meta
 
     def get_workflow_meta(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=False,
-                          **kwargs):
+                          cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Workflowstate objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Workflow Meta collection, total records count, total filtered records count
         """
@@ -473,7 +838,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(WorkflowMeta)
         q = q.filter(WorkflowMeta.wf_id == wf_id)
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -483,9 +848,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, WorkflowMetaResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -498,24 +863,35 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, WorkflowMetaResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, WorkflowMetaResource())
+
+        if stream:
+            records = self._get_stream(q, WorkflowMeta, WorkflowMetaResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, WorkflowMeta, fields)
 
+        q = self._add_projection(q, WorkflowMeta, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     # Workflow Files
 
     def get_workflow_files(self, wf_id, start_index=None, max_results=None, query=None, order=None,
-                           use_cache=False, **kwargs):
+                           use_cache=False, cursor=None, count=CountMode.EXACT, **kwargs):
         """
         Returns a collection of all files associated with the Workflow.
 
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
 
         :return: Collection of Workflow Files
         """
@@ -527,7 +903,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(WorkflowFiles)
         q = q.filter(WorkflowFiles.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -543,16 +919,17 @@ class StampedeWorkflowQueries(WorkflowQueries):
         if query:
             q_in = self._evaluate_query(q_in, query,
                                         CombinationResource(RCLFNResource(), RCPFNResource(), RCMetaResource()))
-            total_filtered = self._get_count(q_in, use_cache)
+            total_filtered = self._get_count(q_in, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q_in = WorkflowQueries._add_pagination(q_in, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q_in, cursor, key=[RCLFN.lfn_id])
+        q_in = WorkflowQueries._add_pagination(q_in, start_index, max_results, total_filtered, keyset)
 
         #
         # Finish Construction of Base SQLAlchemy Query `q`
@@ -588,12 +965,15 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
         records = csv_to_json(records, schema, index)
 
-        return PagedResponse(records, total_records, total_filtered)
+        # Pages of files are cut on lfn_id, whatever the order of the files within a page
+        next_cursor = keyset.next_cursor(sorted(records, key=lambda r: r.lfn_id), max_results) if keyset else None
+
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     # Workflow State
 
     def get_workflow_state(self, wf_id, recent=False, start_index=None, max_results=None, query=None, order=None,
-                           use_cache=True, **kwargs):
+                           use_cache=True, cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Workflowstate objects.
 
@@ -601,9 +981,13 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param recent: Get the most recent results
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Workflow States collection, total records count, total filtered records count
         """
@@ -618,7 +1002,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Workflowstate)
         q = q.filter(Workflowstate.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache, timeout=timeout)
+        total_records = total_filtered = self._get_count(q, use_cache, timeout=timeout, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -633,9 +1017,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query or recent:
             q = self._evaluate_query(q, query, WorkflowstateResource())
-            total_filtered = self._get_count(q, use_cache, timeout=timeout)
+            total_filtered = self._get_count(q, use_cache, timeout=timeout, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -648,11 +1032,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, WorkflowstateResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, WorkflowstateResource())
+
+        if stream:
+            records = self._get_stream(q, Workflowstate, WorkflowstateResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Workflowstate, fields)
 
+        q = self._add_projection(q, Workflowstate, fields)
         records = self._get_all(q, use_cache, timeout=timeout)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def _get_max_workflow_state(self, wf_id=None, ws=Workflowstate):
         qmax = self._get_recent_workflow_state(wf_id, ws)
@@ -678,16 +1071,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Job
 
     def get_workflow_jobs(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                          **kwargs):
+                          cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Job objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Jobs collection, total jobs count, filtered jobs count
         """
@@ -699,7 +1096,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Job)
         q = q.filter(Job.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -709,9 +1106,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, JobResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -724,11 +1121,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, JobResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
+        fields = self._get_fields(fields, JobResource())
+
+        if stream:
+            records = self._get_stream(q, Job, JobResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Job, fields)
+
+        q = self._add_projection(q, Job, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_job(self, job_id, use_cache=True):
         """
@@ -753,16 +1159,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Host
 
     def get_workflow_hosts(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                           **kwargs):
+                           cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Host objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: hosts collection, total jobs count, filtered jobs count
         """
@@ -774,7 +1184,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Host)
         q = q.filter(Host.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -784,9 +1194,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, HostResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -799,11 +1209,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, HostResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, HostResource())
 
+        if stream:
+            records = self._get_stream(q, Host, HostResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Host, fields)
+
+        q = self._add_projection(q, Host, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_host(self, host_id, use_cache=True):
         """
@@ -828,7 +1247,8 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Job State
 
     def get_job_instance_states(self, wf_id, job_id, job_instance_id, recent=False, start_index=None, max_results=None,
-                                query=None, order=None, use_cache=True, **kwargs):
+                                query=None, order=None, use_cache=True, cursor=None, count=CountMode.EXACT,
+                                stream=False, fields=None, **kwargs):
         """
         Returns a collection of the JobInstanceState objects.
 
@@ -838,9 +1258,13 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param recent: Get the most recent results
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: state record
         """
@@ -856,25 +1280,25 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(JobInstance.job_instance_id == job_instance_id)
         q = q.filter(Jobstate.job_instance_id == job_instance_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
 
         if recent:
-            qjsss = self._get_recent_job_state(job_instance_id)
-            qjsss = qjsss.subquery('max_jsss')
-            q = q.join(qjsss, and_(Jobstate.job_instance_id == qjsss.c.job_instance_id,
-                                   Jobstate.jobstate_submit_seq == qjsss.c.max_jsss))
+            # The loader keeps the latest jobstate_submit_seq of each job instance in job_instance_summary
+            q = q.join(JobInstanceSummary,
+                       and_(Jobstate.job_instance_id == JobInstanceSummary.job_instance_id,
+                            Jobstate.jobstate_submit_seq == JobInstanceSummary.jobstate_submit_seq))
 
         #
         # Construct SQLAlchemy Query `q` to filter.
         #
         if query or recent:
             q = self._evaluate_query(q, query, JobstateResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -887,37 +1311,38 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        keyset = self._get_keyset(q, cursor, order, JobstateResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
-        return PagedResponse(records, total_records, total_filtered)
+        fields = self._get_fields(fields, JobstateResource())
 
-    def _get_recent_job_state(self, job_instance_id=None, js=Jobstate):
-        q = self.session.query(js.job_instance_id)
-        q = q.add_column(func.max(js.jobstate_submit_seq).label('max_jsss'))
+        if stream:
+            records = self._get_stream(q, Jobstate, JobstateResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Jobstate, fields)
 
-        if job_instance_id:
-            log.debug('filter on job_instance_id')
-            q = q.filter(js.job_instance_id == job_instance_id)
-
-        q = q.group_by(js.job_instance_id)
+        q = self._add_projection(q, Jobstate, fields)
+        records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return q
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     # Task
 
     def get_workflow_tasks(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                           **kwargs):
+                           cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Task objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Collection of Task objects
         """
@@ -929,7 +1354,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Task)
         q = q.filter(Task.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -939,9 +1364,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, TaskResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -954,23 +1379,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, TaskResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
+        fields = self._get_fields(fields, TaskResource())
+
+        if stream:
+            records = self._get_stream(q, Task, TaskResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Task, fields)
+
+        q = self._add_projection(q, Task, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_job_tasks(self, wf_id, job_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                      **kwargs):
+                      cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Task objects.
 
         :param job_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Collection of Task objects
         """
@@ -981,7 +1419,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(Task.wf_id == wf_id)
         q = q.filter(Task.job_id == job_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -991,9 +1429,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, TaskResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1006,11 +1444,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, TaskResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, TaskResource())
 
+        if stream:
+            records = self._get_stream(q, Task, TaskResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Task, fields)
+
+        q = self._add_projection(q, Task, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_task(self, task_id, use_cache=True):
         """
@@ -1036,16 +1483,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Task Meta
 
     def get_task_meta(self, task_id, start_index=None, max_results=None, query=None, order=None, use_cache=False,
-                      **kwargs):
+                      cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the TaskMeta objects.
 
         :param task_id: Id of the task
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: Workflow Meta collection, total records count, total filtered records count
         """
@@ -1054,7 +1505,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(TaskMeta)
         q = q.filter(TaskMeta.task_id == task_id)
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1064,9 +1515,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, TaskMetaResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1079,16 +1530,25 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, TaskMetaResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, TaskMetaResource())
+
+        if stream:
+            records = self._get_stream(q, TaskMeta, TaskMetaResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, TaskMeta, fields)
 
+        q = self._add_projection(q, TaskMeta, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     # Job Instance
 
     def get_job_instances(self, wf_id, job_id, recent=False, start_index=None, max_results=None, query=None, order=None,
-                          use_cache=True, **kwargs):
+                          use_cache=True, cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the JobInstance objects.
 
@@ -1097,9 +1557,13 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param recent: Get the most recent results
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: job-instance collection, total jobs count, filtered jobs count
         """
@@ -1112,7 +1576,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(Job.wf_id == wf_id)
         q = q.filter(Job.job_id == job_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1127,9 +1591,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query or recent:
             q = self._evaluate_query(q, query, JobInstanceResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1142,11 +1606,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, JobInstanceResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
+        fields = self._get_fields(fields, JobInstanceResource())
+
+        if stream:
+            records = self._get_stream(q, JobInstance, JobInstanceResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, JobInstance, fields)
+
+        q = self._add_projection(q, JobInstance, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_job_instance(self, job_instance_id, use_cache=True, timeout=5):
         """
@@ -1188,16 +1661,21 @@ class StampedeWorkflowQueries(WorkflowQueries):
     # Invocation
 
     def get_workflow_invocations(self, wf_id, start_index=None, max_results=None, query=None, order=None,
-                                 use_cache=True, **kwargs):
+                                 use_cache=True, cursor=None, count=CountMode.EXACT, stream=False,
+                                 fields=None, **kwargs):
         """
         Returns a collection of the Invocation objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: invocations record
         """
@@ -1209,7 +1687,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Invocation)
         q = q.filter(Invocation.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1219,9 +1697,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, InvocationResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1234,14 +1712,24 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, InvocationResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, InvocationResource())
 
+        if stream:
+            records = self._get_stream(q, Invocation, InvocationResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Invocation, fields)
+
+        q = self._add_projection(q, Invocation, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_job_instance_invocations(self, wf_id, job_id, job_instance_id, start_index=None, max_results=None,
-                                     query=None, order=None, use_cache=True, **kwargs):
+                                     query=None, order=None, use_cache=True,
+                                     cursor=None, count=CountMode.EXACT, stream=False, fields=None, **kwargs):
         """
         Returns a collection of the Invocation objects.
 
@@ -1250,9 +1738,13 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param job_instance_id: Id of the job instance associated with the invocation
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
+        :param stream: Return the records as an iterator over a server-side cursor
+        :param fields: Comma separated resource fields to return, defaults to all fields
 
         :return: invocations record
         """
@@ -1265,7 +1757,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(Invocation.wf_id == wf_id)
         q = q.filter(Invocation.job_instance_id == job_instance_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1275,9 +1767,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, InvocationResource())
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1290,11 +1782,20 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, InvocationResource())
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
+
+        fields = self._get_fields(fields, InvocationResource())
 
+        if stream:
+            records = self._get_stream(q, Invocation, InvocationResource(), fields)
+            return StreamedResponse(records, total_records, total_filtered, Invocation, fields)
+
+        q = self._add_projection(q, Invocation, fields)
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor, fields)
 
     def get_invocation(self, invocation_id, use_cache=True):
         """
@@ -1316,19 +1817,75 @@ class StampedeWorkflowQueries(WorkflowQueries):
         except NoResultFound, e:
             raise e
 
+    def get_workflow_changes(self, wf_id, since=None, max_results=None, **kwargs):
+        """
+        Returns the workflow states, job states, and invocations of a workflow loaded after the watermark `since`.
+
+        :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
+        :param since: Watermark returned with the previous changes, None for all the rows loaded so far, or
+                      Watermark.LATEST to only get the watermark past the rows loaded so far
+        :param max_results: Return a maximum of `max_results` records of each resource
+
+        :return: ChangesResponse
+        """
+        # Long polls reuse the session, end its transaction so that rows loaded since the previous poll are visible
+        self.session.rollback()
+
+        wf_id = self.wf_uuid_to_wf_id(wf_id)
+        watermark = Watermark(since)
+
+        q_ws = self.session.query(Workflowstate)
+        q_ws = q_ws.filter(Workflowstate.wf_id == wf_id)
+
+        q_js = self.session.query(Jobstate)
+        q_js = q_js.join(JobInstance, JobInstance.job_instance_id == Jobstate.job_instance_id)
+        q_js = q_js.join(Job, Job.job_id == JobInstance.job_id)
+        q_js = q_js.filter(Job.wf_id == wf_id)
+
+        q_i = self.session.query(Invocation)
+        q_i = q_i.filter(Invocation.wf_id == wf_id)
+
+        queries = OrderedDict([
+            (Workflowstate, q_ws),
+            (Jobstate, q_js),
+            (Invocation, q_i)
+        ])
+
+        if since == Watermark.LATEST:
+            for entity, q in queries.iteritems():
+                watermark.seek_latest(q, entity)
+
+            return ChangesResponse([], [], [], watermark.encode())
+
+        changes = []
+
+        for entity, q in queries.iteritems():
+            q = watermark.filter(q, entity)
+
+            if max_results:
+                q = q.limit(max_results)
+
+            records = q.all()
+            watermark.advance(entity, records)
+            changes.append(records)
+
+        return ChangesResponse(changes[0], changes[1], changes[2], watermark.encode())
+
     # Views
 
     def get_running_jobs(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                         **kwargs):
+                         cursor=None, count=CountMode.EXACT, **kwargs):
         """
         Returns a collection of the running Job objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
 
         :return: Jobs collection, total jobs count, filtered jobs count
         """
@@ -1350,7 +1907,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
         q = q.join(qjss, and_(JobInstance.job_id == qjss.c.job_id, JobInstance.job_submit_seq == qjss.c.max_jss))
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1360,9 +1917,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, CombinationResource(JobResource(), JobInstanceResource()))
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1375,24 +1932,28 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, CombinationResource(JobResource(), JobInstanceResource()))
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     def get_successful_jobs(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                            **kwargs):
+                            cursor=None, count=CountMode.EXACT, **kwargs):
         """
         Returns a collection of the successful Job objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
 
         :return: Jobs collection, total jobs count, filtered jobs count
         """
@@ -1414,7 +1975,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
         q = q.join(qjss, and_(JobInstance.job_id == qjss.c.job_id, JobInstance.job_submit_seq == qjss.c.max_jss))
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1424,9 +1985,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, CombinationResource(JobResource(), JobInstanceResource()))
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1439,24 +2000,28 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, CombinationResource(JobResource(), JobInstanceResource()))
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     def get_failed_jobs(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                        **kwargs):
+                        cursor=None, count=CountMode.EXACT, **kwargs):
         """
         Returns a collection of the failed Job objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
 
         :return: Jobs collection, total jobs count, filtered jobs count
         """
@@ -1478,7 +2043,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
         q = q.join(qjss, and_(JobInstance.job_id == qjss.c.job_id, JobInstance.job_submit_seq == qjss.c.max_jss))
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1488,9 +2053,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, CombinationResource(JobResource(), JobInstanceResource()))
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1503,24 +2068,28 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, CombinationResource(JobResource(), JobInstanceResource()))
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     def get_failing_jobs(self, wf_id, start_index=None, max_results=None, query=None, order=None, use_cache=True,
-                         **kwargs):
+                         cursor=None, count=CountMode.EXACT, **kwargs):
         """
         Returns a collection of the failing Job objects.
 
         :param wf_id: wf_id is wf_id iff it consists only of digits, otherwise it is wf_uuid
         :param start_index: Return results starting from record `start_index`
         :param max_results: Return a maximum of `max_results` records
+        :param cursor: Return results after the record identified by `cursor`, instead of from `start_index`
         :param query: Filtering criteria
         :param order: Sorting criteria
         :param use_cache: If available, use cached results
+        :param count: Record counts to compute, see CountMode
 
         :return: Jobs collection, total jobs count, filtered jobs count
         """
@@ -1560,7 +2129,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
         q = q.filter(and_(JobInstance.job_id == qjss.c.job_id, JobInstance.job_submit_seq == qjss.c.max_jss))
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        total_records = total_filtered = self._get_count(q, use_cache, skip=count == CountMode.NONE)
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1570,9 +2139,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, CombinationResource(JobResource(), JobInstanceResource()))
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_count(q, use_cache, skip=count != CountMode.EXACT)
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (start_index and total_filtered is not None and start_index >= total_filtered):
                 log.debug('total_filtered is 0 or start_index >= total_filtered')
                 return PagedResponse([], total_records, total_filtered)
 
@@ -1585,12 +2154,14 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         # Construct SQLAlchemy Query `q` to paginate.
         #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
+        keyset = self._get_keyset(q, cursor, order, CombinationResource(JobResource(), JobInstanceResource()))
+        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered, keyset)
 
         records = self._get_all(q, use_cache)
+        next_cursor = keyset.next_cursor(records, max_results) if keyset else None
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     @staticmethod
     def _merge_job_instance(records):
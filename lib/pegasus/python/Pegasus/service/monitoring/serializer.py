@@ -22,7 +22,7 @@ from flask.json import JSONEncoder
 from sqlalchemy.orm.attributes import instance_state
 
 from Pegasus.db.schema import *
-from Pegasus.service.base import PagedResponse, ErrorResponse, OrderedSet, OrderedDict
+from Pegasus.service.base import PagedResponse, ChangesResponse, ErrorResponse, OrderedSet, OrderedDict
 from Pegasus.service.monitoring.resources import RootWorkflowResource, RootWorkflowstateResource
 from Pegasus.service.monitoring.resources import WorkflowResource, WorkflowMetaResource
 from Pegasus.service.monitoring.resources import WorkflowFilesResource, WorkflowstateResource
@@ -39,15 +39,31 @@ class PegasusServiceJSONEncoder(JSONEncoder):
     """
 
     def default(self, obj):
+        return self.serialize(obj, type(obj))
+
+    def serialize(self, obj, obj_type, field_set=None):
+        """
+        Serialize `obj` as an `obj_type` resource. `obj` is either an instance of `obj_type`, or a row tuple of the
+        `obj_type` columns as returned by a streamed query. If `field_set` is given, only those resource fields are
+        serialized.
+        """
         def obj_to_dict(resource, fields=None, ignore_unloaded=False, data=None):
             data = data if data else obj
             obj_dict = OrderedDict()
 
-            if ignore_unloaded:
+            if isinstance(data, tuple):
+                # Rows only have the columns that were selected
+                unloaded = set(resource.fields) - set(data.keys())
+                ignore_unloaded = True
+
+            elif ignore_unloaded:
                 unloaded = instance_state(data).unloaded
                 log.debug('ignore_unloaded is True, ignoring %s' % unloaded)
 
             for attribute in resource.fields:
+                if field_set and attribute not in field_set:
+                    continue
+
                 if not ignore_unloaded or (ignore_unloaded and attribute not in unloaded):
                     obj_dict[attribute] = getattr(data, attribute)
 
@@ -61,12 +77,17 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return obj_dict
 
-        if isinstance(obj, PagedResponse):
+        if issubclass(obj_type, PagedResponse):
+            records = obj.records
+
+            if obj.fields:
+                records = [self.serialize(record, type(record), obj.fields) for record in records]
+
             json_record = OrderedDict([
-                ('records', obj.records)
+                ('records', records)
             ])
 
-            if obj.total_records or obj.total_filtered:
+            if obj.total_records or obj.total_filtered or obj.next_cursor:
                 meta = OrderedDict()
 
                 if obj.total_records is not None:
@@ -75,11 +96,26 @@ class PegasusServiceJSONEncoder(JSONEncoder):
                 if obj.total_filtered is not None:
                     meta['records_filtered'] = obj.total_filtered
 
+                if obj.next_cursor is not None:
+                    meta['next_cursor'] = obj.next_cursor
+
                 json_record['_meta'] = meta
 
             return json_record
 
-        elif isinstance(obj, ErrorResponse):
+        elif issubclass(obj_type, ChangesResponse):
+            json_record = OrderedDict([
+                ('workflow_state', obj.workflow_states),
+                ('job_state', obj.job_states),
+                ('invocation', obj.invocations),
+                ('_meta', OrderedDict([
+                    ('since', obj.since)
+                ]))
+            ])
+
+            return json_record
+
+        elif issubclass(obj_type, ErrorResponse):
             json_record = OrderedDict([
                 ('code', obj.code),
                 ('message', obj.message)
@@ -90,7 +126,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, DashboardWorkflow):
+        elif issubclass(obj_type, DashboardWorkflow):
             json_record = obj_to_dict(RootWorkflowResource())
             json_record['workflow_state'] = obj.workflow_state
 
@@ -100,12 +136,12 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, DashboardWorkflowstate):
+        elif issubclass(obj_type, DashboardWorkflowstate):
             json_record = obj_to_dict(RootWorkflowstateResource())
 
             return json_record
 
-        elif isinstance(obj, Workflow):
+        elif issubclass(obj_type, Workflow):
             json_record = obj_to_dict(WorkflowResource())
             json_record['_links'] = OrderedDict([
                 ('workflow_meta', url_for('.get_workflow_meta', wf_id=obj.wf_id, _method='GET')),
@@ -118,7 +154,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, WorkflowMeta):
+        elif issubclass(obj_type, WorkflowMeta):
             json_record = obj_to_dict(WorkflowMetaResource())
             json_record['_links'] = OrderedDict([
                 ('workflow', url_for('.get_workflow', wf_id=obj.wf_id))
@@ -126,12 +162,12 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, WorkflowFiles):
+        elif issubclass(obj_type, WorkflowFiles):
             json_record = obj_to_dict(WorkflowFilesResource())
 
             return json_record
 
-        elif isinstance(obj, Workflowstate):
+        elif issubclass(obj_type, Workflowstate):
             json_record = obj_to_dict(WorkflowstateResource())
             json_record['_links'] = OrderedDict([
                 ('workflow', url_for('.get_workflow', wf_id=obj.wf_id))
@@ -139,7 +175,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, Job):
+        elif issubclass(obj_type, Job):
             json_record = obj_to_dict(JobResource())
 
             if hasattr(obj, 'job_instance'):
@@ -153,7 +189,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, Host):
+        elif issubclass(obj_type, Host):
             json_record = obj_to_dict(HostResource())
             json_record['_links'] = OrderedDict([
                 ('workflow', url_for('.get_workflows', m_wf_id=obj.wf_id, _method='GET'))
@@ -161,7 +197,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, Jobstate):
+        elif issubclass(obj_type, Jobstate):
             json_record = obj_to_dict(JobstateResource())
             json_record['_links'] = OrderedDict([
                 ('job_instance', url_for('.get_job_instance', job_instance_id=obj.job_instance_id))
@@ -169,7 +205,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, Task):
+        elif issubclass(obj_type, Task):
             json_record = obj_to_dict(TaskResource())
             json_record['_links'] = OrderedDict([
                 ('workflow', url_for('.get_workflow', wf_id=obj.wf_id)),
@@ -179,7 +215,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, TaskMeta):
+        elif issubclass(obj_type, TaskMeta):
             json_record = obj_to_dict(TaskMetaResource())
             json_record['_links'] = OrderedDict([
                 ('task', url_for('.get_task', task_id=obj.task_id))
@@ -187,7 +223,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, JobInstance):
+        elif issubclass(obj_type, JobInstance):
             json_record = obj_to_dict(JobInstanceResource(), ignore_unloaded=True)
             json_record['_links'] = OrderedDict([
                 ('job', url_for('.get_job', job_id=obj.job_id)),
@@ -201,7 +237,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, Invocation):
+        elif issubclass(obj_type, Invocation):
             json_record = obj_to_dict(InvocationResource())
             json_record['_links'] = OrderedDict([
                 ('workflow', url_for('.get_workflow', wf_id=obj.wf_id)),
@@ -210,7 +246,7 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, RCLFN):
+        elif issubclass(obj_type, RCLFN):
             json_record = obj_to_dict(RCLFNResource(), fields=['pfns', 'meta'])
 
             if hasattr(obj, 'extras'):
@@ -225,22 +261,22 @@ class PegasusServiceJSONEncoder(JSONEncoder):
 
             return json_record
 
-        elif isinstance(obj, RCPFN):
+        elif issubclass(obj_type, RCPFN):
             json_record = obj_to_dict(RCPFNResource())
 
             return json_record
 
-        elif isinstance(obj, RCMeta):
+        elif issubclass(obj_type, RCMeta):
             json_record = obj_to_dict(RCMetaResource())
 
             return json_record
 
-        elif isinstance(obj, OrderedSet):
+        elif issubclass(obj_type, OrderedSet):
             json_record = [item for item in obj]
 
             return json_record
 
-        elif isinstance(obj, Decimal):
+        elif issubclass(obj_type, Decimal):
             return float(obj)
 
         return JSONEncoder.default(self, obj)
@@ -34,6 +34,48 @@ def jsonify(obj, indent=5, separators=(',', ': '), cls=PegasusServiceJSONEncoder
     return response_json
 
 
+def jsonify_stream(response, ndjson=False, chunk_size=100, cls=PegasusServiceJSONEncoder):
+    """
+    Generator which serializes a StreamedResponse `chunk_size` records at a time, so memory use does not grow with
+    the number of records.
+
+    :param response: StreamedResponse to serialize
+    :param ndjson: Write one JSON record per line, instead of the JSON object jsonify would return
+    :param chunk_size: Number of records serialized per chunk
+    """
+    encoder = cls()
+    chunk = []
+
+    if not ndjson:
+        yield '{"records": ['
+
+    for i, record in enumerate(response.records):
+        record_json = encoder.encode(encoder.serialize(record, response.record_type, response.fields))
+
+        if ndjson:
+            chunk.append(record_json + '\n')
+        else:
+            chunk.append(',' + record_json if i else record_json)
+
+        if len(chunk) == chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+
+    if chunk:
+        yield ''.join(chunk)
+
+    if not ndjson:
+        meta = OrderedDict()
+
+        if response.total_records is not None:
+            meta['records_total'] = response.total_records
+
+        if response.total_filtered is not None:
+            meta['records_filtered'] = response.total_filtered
+
+        yield '], "_meta": %s}' % encoder.encode(meta) if meta else ']}'
+
+
 def csv_to_json(csv, schema, index):
     """
     Workflow has a 1-to-many relationship with Job
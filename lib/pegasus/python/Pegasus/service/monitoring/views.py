@@ -16,24 +16,38 @@ __author__ = 'Rajiv Mayani'
 
 import json
 
+import time
+
 import logging
 
 import hashlib
 
+import threading
+
+import Queue
+
 import StringIO
 
-from flask import g, request, make_response, current_app
+from flask import g, request, make_response, current_app, stream_with_context, Response
 
 from Pegasus.service import cache
-from Pegasus.service.base import InvalidJSONError, OrderedDict
+from Pegasus.service.base import InvalidJSONError, OrderedDict, StreamedResponse
 from Pegasus.service.monitoring import monitoring_routes
-from Pegasus.service.monitoring.utils import jsonify
-from Pegasus.service.monitoring.queries import MasterWorkflowQueries, StampedeWorkflowQueries
+from Pegasus.service.monitoring.utils import jsonify, jsonify_stream
+from Pegasus.service.monitoring.queries import MasterWorkflowQueries, StampedeWorkflowQueries, CountMode, Watermark
+from Pegasus.service.monitoring.serializer import PegasusServiceJSONEncoder
 
 log = logging.getLogger(__name__)
 
 JSON_HEADER = {'Content-Type': 'application/json'}
 
+NDJSON_HEADER = {'Content-Type': 'application/x-ndjson'}
+
+EVENT_STREAM_HEADER = {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'}
+
+# Seconds after which an event stream without changes sends a comment line, so idle connections are not closed
+EVENT_STREAM_HEARTBEAT = 15
+
 
 @monitoring_routes.url_value_preprocessor
 def pull_m_wf_id(endpoint, values):
@@ -83,18 +97,12 @@ def add_url_context(endpoint, values):
                 values.setdefault(key, value)
 
 
-@monitoring_routes.before_request
-def compute_stampede_db_url():
+def _get_root_workflow(master_db_url, m_wf_id):
     """
-    If the requested endpoint requires connecting to a STAMPEDE database, then determine STAMPEDE DB URL and store it
-    in g.stampede_db_url. Also, set g.m_wf_id to be the root workflow's uuid
+    Returns the root workflow identified by m_wf_id, from the cache or from the master database.
     """
-    if '/workflow' not in request.path or 'm_wf_id' not in g:
-        return
-
     md5sum = hashlib.md5()
-    md5sum.update(g.master_db_url)
-    m_wf_id = g.m_wf_id
+    md5sum.update(master_db_url)
 
     def _get_cache_key(key_suffix):
         return '%s.%s' % (md5sum.hexdigest(), key_suffix)
@@ -107,13 +115,31 @@ def compute_stampede_db_url():
 
     else:
         log.debug('Cache Miss: compute_stampede_db_url %s' % cache_key)
-        queries = MasterWorkflowQueries(g.master_db_url)
+        queries = MasterWorkflowQueries(master_db_url)
         root_workflow = queries.get_root_workflow(m_wf_id)
         queries.close()
 
         cache.set(_get_cache_key(root_workflow.wf_id), root_workflow, timeout=600)
         cache.set(_get_cache_key(root_workflow.wf_uuid), root_workflow, timeout=600)
 
+    return root_workflow
+
+
+@monitoring_routes.before_request
+def compute_stampede_db_url():
+    """
+    If the requested endpoint requires connecting to a STAMPEDE database, then determine STAMPEDE DB URL and store it
+    in g.stampede_db_url. Also, set g.m_wf_id to be the root workflow's uuid
+    """
+    if '/workflow' not in request.path or 'm_wf_id' not in g:
+        return
+
+    if 'batch' in g:
+        # Sub-requests of a batch request resolve each root workflow once
+        root_workflow = g.batch.get_root_workflow(g.master_db_url, g.m_wf_id)
+    else:
+        root_workflow = _get_root_workflow(g.master_db_url, g.m_wf_id)
+
     g.url_m_wf_id = root_workflow.wf_id
     g.m_wf_id = root_workflow.wf_uuid
     g.stampede_db_url = root_workflow.db_url
@@ -150,10 +176,41 @@ def get_query_args():
             e.codes = ('INVALID_QUERY_ARGUMENT', 400)
             raise e
 
+    def to_stream(q_arg, value):
+        value = value.strip().lower()
+
+        if value in set(['json', 'ndjson']):
+            return value
+
+        else:
+            log.exception('Query Argument %s = %s is not a valid stream format' % (q_arg, value))
+            e = ValueError('Expecting json or ndjson for argument %s, found %r' % (q_arg, str(value)))
+            e.codes = ('INVALID_QUERY_ARGUMENT', 400)
+            raise e
+
+    def to_count(q_arg, value):
+        value = value.strip().lower()
+
+        if value in CountMode.modes:
+            return value
+
+        else:
+            log.exception('Query Argument %s = %s is not a valid count mode' % (q_arg, value))
+            e = ValueError('Expecting one of %s for argument %s, found %r' % (', '.join(CountMode.modes), q_arg,
+                                                                              str(value)))
+            e.codes = ('INVALID_QUERY_ARGUMENT', 400)
+            raise e
+
     query_args = OrderedDict([
         ('pretty-print', to_bool),
         ('start-index', to_int),
         ('max-results', to_int),
+        ('cursor', to_str),
+        ('count', to_count),
+        ('stream', to_stream),
+        ('fields', to_str),
+        ('since', to_str),
+        ('timeout', to_int),
         ('query', to_str),
         ('order', to_str)
     ])
@@ -168,6 +225,21 @@ def get_query_args():
         if is_post and arg in request.form:
             g.query_args[arg.replace('-', '_')] = cast(arg, request.form[arg])
 
+    if 'cursor' in g.query_args and g.query_args.get('start_index'):
+        e = ValueError('Arguments start-index and cursor are mutually exclusive')
+        e.codes = ('INVALID_QUERY_ARGUMENT', 400)
+        raise e
+
+
+def _make_stream_response(paged_response):
+    """
+    Returns a response which writes the records of `paged_response` while they are read from the database.
+    """
+    ndjson = g.query_args.get('stream') == 'ndjson'
+    records = stream_with_context(jsonify_stream(paged_response, ndjson=ndjson))
+
+    return Response(records, 200, NDJSON_HEADER if ndjson else JSON_HEADER)
+
 
 """
 Root Workflow
@@ -202,6 +274,8 @@ def get_root_workflows(username):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response.
@@ -295,6 +369,10 @@ def get_workflows(username, m_wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -316,6 +394,9 @@ def get_workflows(username, m_wf_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -372,6 +453,10 @@ def get_workflow_meta(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -393,6 +478,9 @@ def get_workflow_meta(username, m_wf_id, wf_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -437,6 +525,8 @@ def get_workflow_files(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -492,6 +582,10 @@ def get_workflow_state(username, m_wf_id, wf_id, recent=False):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean recent: Get most recent workflow state
@@ -514,6 +608,9 @@ def get_workflow_state(username, m_wf_id, wf_id, recent=False):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -553,6 +650,10 @@ def get_workflow_jobs(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -574,6 +675,9 @@ def get_workflow_jobs(username, m_wf_id, wf_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -634,6 +738,10 @@ def get_workflow_hosts(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -655,6 +763,9 @@ def get_workflow_hosts(username, m_wf_id, wf_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -715,6 +826,10 @@ def get_job_instance_states(username, m_wf_id, wf_id, job_id, job_instance_id, r
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean recent: Get most recent job state
@@ -737,6 +852,9 @@ def get_job_instance_states(username, m_wf_id, wf_id, job_id, job_instance_id, r
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -772,6 +890,10 @@ def get_workflow_tasks(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -793,6 +915,9 @@ def get_workflow_tasks(username, m_wf_id, wf_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -809,6 +934,10 @@ def get_job_tasks(username, m_wf_id, wf_id, job_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -830,6 +959,9 @@ def get_job_tasks(username, m_wf_id, wf_id, job_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -886,6 +1018,10 @@ def get_task_meta(username, m_wf_id, wf_id, task_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -907,6 +1043,9 @@ def get_task_meta(username, m_wf_id, wf_id, task_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -957,6 +1096,10 @@ def get_job_instances(username, m_wf_id, wf_id, job_id, recent=False):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -978,6 +1121,9 @@ def get_job_instances(username, m_wf_id, wf_id, job_id, recent=False):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -1044,6 +1190,10 @@ def get_workflow_invocations(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
+    :query string stream: Stream all records as a JSON object (json) or as newline delimited JSON (ndjson)
+    :query string fields: Comma separated fields of the resource to return
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -1065,6 +1215,9 @@ def get_workflow_invocations(username, m_wf_id, wf_id):
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -1084,6 +1237,9 @@ def get_job_instance_invocations(username, m_wf_id, wf_id, job_id, job_instance_
         log.debug('Total records is 0; returning HTTP 204 No content')
         return make_response('', 204, JSON_HEADER)
 
+    if isinstance(paged_response, StreamedResponse):
+        return _make_stream_response(paged_response)
+
     #
     # Generate JSON Response
     #
@@ -1119,6 +1275,134 @@ def get_invocation(username, m_wf_id, wf_id, invocation_id):
     return make_response(response_json, 200, JSON_HEADER)
 
 
+"""
+Changes
+
+{
+    "workflow_state" : [ object:workflow_state, .. ],
+    "job_state"      : [ object:job_state, .. ],
+    "invocation"     : [ object:invocation, .. ],
+    "_meta"          : {
+        "since" : string:watermark
+    }
+}
+"""
+
+
+def _wait_for_changes(queries, wf_id, since, timeout, max_results=None):
+    """
+    Polls the database every CHANGES_POLL_INTERVAL seconds, for up to `timeout` seconds, until rows are loaded after
+    the watermark `since`. Returns the changes, which are empty if the timeout expired.
+    """
+    deadline = time.time() + timeout
+    interval = current_app.config['CHANGES_POLL_INTERVAL']
+
+    while True:
+        changes = queries.get_workflow_changes(wf_id, since=since, max_results=max_results)
+        remaining = deadline - time.time()
+
+        if not changes.is_empty or since == Watermark.LATEST or remaining <= 0:
+            return changes
+
+        time.sleep(min(interval, remaining))
+
+
+def _get_timeout(default=0):
+    timeout = g.query_args.get('timeout', default)
+
+    return max(0, min(timeout, current_app.config['CHANGES_MAX_TIMEOUT']))
+
+
+@monitoring_routes.route('/root/<string:m_wf_id>/workflow/<string:wf_id>/changes')
+def get_workflow_changes(username, m_wf_id, wf_id):
+    """
+    Returns the Workflow States, Job States, and Invocations of a workflow loaded after a watermark.
+
+    :query string since: Watermark returned with the previous changes, or latest; all changes if omitted
+    :query int max-results: Return a maximum of <max-results> records of each resource
+    :query int timeout: Wait up to <timeout> seconds for changes when there are none
+    :query boolean pretty-print: Return formatted JSON response
+
+    :statuscode 200: OK
+    :statuscode 204: No content; when no changes were loaded after the watermark.
+    :statuscode 400: Bad request
+    :statuscode 401: Authentication failure
+    :statuscode 403: Authorization failure
+
+    :return type: Changes
+    :return resource: WorkflowState, JobState, Invocation
+    """
+    queries = StampedeWorkflowQueries(g.stampede_db_url)
+
+    since = g.query_args.get('since')
+    changes = _wait_for_changes(queries, wf_id, since, _get_timeout(), g.query_args.get('max_results'))
+
+    if changes.is_empty and since != Watermark.LATEST:
+        log.debug('No changes; returning HTTP 204 No content')
+        return make_response('', 204, JSON_HEADER)
+
+    #
+    # Generate JSON Response
+    #
+    response_json = jsonify(changes)
+
+    return make_response(response_json, 200, JSON_HEADER)
+
+
+@monitoring_routes.route('/root/<string:m_wf_id>/workflow/<string:wf_id>/changes/events')
+def get_workflow_change_events(username, m_wf_id, wf_id):
+    """
+    Streams the Workflow States, Job States, and Invocations of a workflow as Server-Sent Events, while they are
+    loaded. Each event is a Changes object, and its id is the watermark after it.
+
+    :query string since: Watermark returned with the previous changes, or latest; all changes if omitted
+    :query int max-results: Return a maximum of <max-results> records of each resource per event
+    :query int timeout: Close the stream after <timeout> seconds, defaults to CHANGES_MAX_TIMEOUT
+
+    :reqheader Last-Event-ID: Watermark to resume from, sent by browsers when they reconnect; overrides since
+
+    :statuscode 200: OK
+    :statuscode 400: Bad request
+    :statuscode 401: Authentication failure
+    :statuscode 403: Authorization failure
+
+    :return type: Event stream
+    :return resource: Changes
+    """
+    queries = StampedeWorkflowQueries(g.stampede_db_url)
+
+    since = request.headers.get('Last-Event-ID') or g.query_args.get('since')
+    max_results = g.query_args.get('max_results')
+    deadline = time.time() + _get_timeout(current_app.config['CHANGES_MAX_TIMEOUT'])
+
+    # Validate the watermark before the response starts
+    changes = queries.get_workflow_changes(wf_id, since=since, max_results=max_results)
+
+    def events(changes):
+        encoder = PegasusServiceJSONEncoder()
+
+        # Browsers reconnect when the stream is closed, ask them to wait one poll interval
+        yield 'retry: %d\n\n' % (current_app.config['CHANGES_POLL_INTERVAL'] * 1000)
+
+        while True:
+            since = changes.since
+
+            if not changes.is_empty:
+                yield 'id: %s\nevent: changes\ndata: %s\n\n' % (since, encoder.encode(changes))
+            else:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ':\n\n'
+
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                break
+
+            changes = _wait_for_changes(queries, wf_id, since, min(remaining, EVENT_STREAM_HEARTBEAT), max_results)
+
+    return Response(stream_with_context(events(changes)), 200, EVENT_STREAM_HEADER)
+
+
 """
 Batch Request
 
@@ -1139,10 +1423,12 @@ Batch Response
 
 [
     {
+        "index"    : <int:index>,
         "status"   : <int:status_code>,
         "response" : <string:response>
     },
     {
+        "index"    : <int:index>,
         "status"   : <int:status_code>,
         "response" : <string:response>
     }
@@ -1151,6 +1437,36 @@ Batch Response
 """
 
 
+class _Batch(object):
+    """
+    State shared by the sub-requests of a batch request, which run concurrently.
+    """
+
+    def __init__(self, user, username, master_db_url):
+        self.user = user
+        self.username = username
+        self.master_db_url = master_db_url
+        self._root_workflows = {}
+        self._root_workflow_locks = {}
+        self._lock = threading.Lock()
+
+    def get_root_workflow(self, master_db_url, m_wf_id):
+        """
+        Returns the root workflow identified by m_wf_id, resolving it only once for all the sub-requests. Only the
+        sub-requests for the same root workflow wait for each other.
+        """
+        key = (master_db_url, m_wf_id)
+
+        with self._lock:
+            lock = self._root_workflow_locks.setdefault(key, threading.Lock())
+
+        with lock:
+            if key not in self._root_workflows:
+                self._root_workflows[key] = _get_root_workflow(master_db_url, m_wf_id)
+
+            return self._root_workflows[key]
+
+
 def _read_response(response):
     output = StringIO.StringIO()
     try:
@@ -1163,10 +1479,92 @@ def _read_response(response):
         output.close()
 
 
+def _dispatch(application, batch, req):
+    """
+    Runs the sub-request `req` of a batch request in its own request context, and returns its status code and its
+    body as a JSON value. Each view opens its own database session, so sub-requests can run in different threads.
+    """
+    with application.app_context():
+        with application.test_request_context(req['path'], method=req.get('method', 'GET'), data=req.get('body')):
+            g.batch = batch
+
+            # Sub-requests run as the user authenticated by the batch request, and for the same user unless their
+            # path says otherwise
+            g.user = batch.user
+            g.username = batch.username
+
+            # The master database is determined by the user whose workflows are requested
+            if request.view_args and request.view_args.get('username') == batch.username:
+                g.master_db_url = batch.master_db_url
+
+            try:
+                # Pre process Request
+                rv = application.preprocess_request()
+
+                if rv is None:
+                    # Main Dispatch
+                    rv = application.dispatch_request()
+
+            except Exception as e:
+                rv = application.handle_user_exception(e)
+
+            response = application.make_response(rv)
+
+            # Post process Request
+            response = application.process_response(response)
+
+            body = _read_response(response)
+
+            if not body:
+                body = 'null'
+            elif response.mimetype != 'application/json':
+                # e.g. the HTML error pages of Flask
+                body = json.dumps(body)
+
+            return response.status_code, body
+
+
+def _run_batch(application, batch, requests, workers):
+    """
+    Generator which runs the sub-requests on a pool of `workers` threads, and yields (index, status code, body) of
+    each sub-request as soon as it finishes.
+    """
+    pending = Queue.Queue()
+    finished = Queue.Queue()
+
+    for index, req in enumerate(requests):
+        pending.put((index, req))
+
+    def worker():
+        while True:
+            try:
+                index, req = pending.get_nowait()
+            except Queue.Empty:
+                return
+
+            try:
+                status, body = _dispatch(application, batch, req)
+            except Exception as e:
+                log.exception(e)
+                status, body = 500, json.dumps({'code': 'UNKNOWN', 'message': str(e)})
+
+            finished.put((index, status, body))
+
+    for i in range(min(workers, len(requests))):
+        thread = threading.Thread(target=worker, name='batch-worker-%d' % i)
+        thread.daemon = True
+        thread.start()
+
+    for i in range(len(requests)):
+        yield finished.get()
+
+
 @monitoring_routes.route('/batch', methods=['POST'])
 def batch(username):
     """
-    Execute multiple requests, submitted as a batch.
+    Execute multiple requests, submitted as a batch. The requests run concurrently, on up to BATCH_MAX_WORKERS
+    threads, and their responses are streamed as soon as they finish. The index of a response is the position of
+    its request in the batch.
 
     :statuscode 207: Multi status
     :statuscode 400: Bad request
@@ -1182,42 +1580,22 @@ def batch(username):
         log.exception('Invalid JSON')
         raise InvalidJSONError(e.message)
 
-    responses = StringIO.StringIO()
-    responses.write('[')
-    headers = [('Authorization', request.headers.get('Authorization'))] if request.authorization else []
+    if not isinstance(requests, list) or not all(isinstance(req, dict) and 'path' in req for req in requests):
+        raise InvalidJSONError('Expecting a list of requests with a path')
 
     application = current_app._get_current_object()
-    for index, req in enumerate(requests):
-        method = req['method']
-        path = req['path']
-        body = req.get('body', None)
-
-        with application.app_context():
-            with application.test_request_context(path, method=method, data=body, headers=headers):
-                try:
-                    # Pre process Request
-                    rv = application.preprocess_request()
-
-                    if rv is None:
-                        # Main Dispatch
-                        rv = application.dispatch_request()
-
-                except Exception as e:
-                    rv = application.handle_user_exception(e)
-
-                response = application.make_response(rv)
-
-                # Post process Request
-                response = application.process_response(response)
+    shared = _Batch(g.user, username, g.master_db_url)
+    workers = current_app.config['BATCH_MAX_WORKERS']
 
-        responses.write('{"status": %d,"response": %s}' % (response.status_code, _read_response(response)))
+    def responses():
+        yield '['
 
-        if index + 1 < len(requests):
-            responses.write(',')
+        for count, (index, status, body) in enumerate(_run_batch(application, shared, requests, workers)):
+            yield '%s{"index": %d, "status": %d, "response": %s}' % (',' if count else '', index, status, body)
 
-    responses.write(']')
+        yield ']'
 
-    return make_response(responses.getvalue(), 207, JSON_HEADER)
+    return Response(responses(), 207, JSON_HEADER)
 
 
 """
@@ -1233,6 +1611,8 @@ def get_running_jobs(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -1270,6 +1650,8 @@ def get_successful_jobs(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -1307,6 +1689,8 @@ def get_failed_jobs(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -1344,6 +1728,8 @@ def get_failing_jobs(username, m_wf_id, wf_id):
 
     :query int start-index: Return results starting from record <start-index> (0 indexed)
     :query int max-results: Return a maximum of <max-results> records
+    :query string cursor: Return results after the record identified by <cursor>; empty for the first page
+    :query string count: Record counts to return: exact (default), total, or none
     :query string query: Search criteria
     :query string order: Sorting criteria
     :query boolean pretty-print: Return formatted JSON response
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.db import connection
+from Pegasus.db.admin.admin_loader import DBAdminError
+from Pegasus.db.admin.analyze import analyze, existing_indexes, filter_columns, format_report, is_covered, \
+    missing_indexes
+from Pegasus.db.schema import *
+from Pegasus.test.db.test_stampede_statistics import create_test_db, WF_UUID
+
+class TestAnalyze(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dburi = "sqlite:///%s" % os.path.join(self.dir, "test.stampede.db")
+        create_test_db(self.dburi)
+        self.db = connection.connect(self.dburi, create=False, verbose=False)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def test_filter_columns(self):
+        q = select([st_invocation.c.transformation]).where(and_(st_invocation.c.wf_id == 1,
+                                                                st_invocation.c.start_time > 10,
+                                                                st_invocation.c.job_instance_id == st_job_instance.c.job_instance_id))
+        self.assertEquals(filter_columns(q, "invocation"), (["wf_id", "job_instance_id"], ["start_time"]))
+        self.assertEquals(filter_columns(q, "job_instance"), (["job_instance_id"], []))
+
+    def test_missing_indexes(self):
+        self.assertEquals(missing_indexes(self.db), [])
+        self.db.execute("DROP INDEX workflow_root_wf_id_COL")
+        self.assertEquals(missing_indexes(self.db), [("workflow", "workflow_root_wf_id_COL", ("root_wf_id",))])
+
+    def test_is_covered(self):
+        indexes = existing_indexes(self.db)["job_instance"]
+        self.assertTrue((("job_id", "job_submit_seq"), True) in indexes)
+        self.assertTrue(is_covered(["job_submit_seq", "job_id"], [], indexes))
+        self.assertTrue(is_covered(["job_id"], [], indexes))
+        # UNIQUE_JOB_INSTANCE already finds at most one row
+        self.assertTrue(is_covered(["exitcode", "job_id", "job_submit_seq"], [], indexes))
+        self.assertFalse(is_covered(["exitcode"], [], indexes))
+        self.assertFalse(is_covered(["job_id"], ["exitcode"], indexes))
+
+    def test_analyze(self):
+        analysis = analyze(self.db, self.dburi)
+        self.assertEquals(analysis["sample"]["wf_uuid"], WF_UUID)
+        self.assertTrue(len(analysis["statements"]) > 0)
+        for scan in analysis["scans"]:
+            self.assertTrue(scan.table in metadata.tables)
+        report = format_report(analysis)
+        self.assertTrue(report.startswith("Explained "))
+        self.assertFalse("an index on job_instance(" in report)
+
+        self.assertRaises(DBAdminError, analyze, self.db, self.dburi, "unknown")
+
+if __name__ == '__main__':
+    unittest.main()
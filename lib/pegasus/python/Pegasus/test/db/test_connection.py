@@ -7,6 +7,7 @@ import uuid
 from Pegasus.db import connection
 from Pegasus.db.admin.admin_loader import *
 from Pegasus.db.schema import *
+from Pegasus.tools import properties
 
 class TestConnection(unittest.TestCase):
 
@@ -60,6 +61,66 @@ class TestConnection(unittest.TestCase):
         db.close()
         _remove(filename)
 
+    def test_shared_engine(self):
+        filename = str(uuid.uuid4())
+        _silentremove(filename)
+        dburi = "sqlite:///%s" % filename
+        db1 = connection.connect(dburi, create=True, verbose=False)
+        db2 = connection.connect("sqlite:///%s" % os.path.abspath(filename), verbose=False)
+        self.assertTrue(db1.get_bind() is db2.get_bind())
+        self.assertEquals(db2.execute("PRAGMA journal_mode").scalar(), "wal")
+        self.assertEquals(db2.execute("PRAGMA busy_timeout").scalar(), connection.DEFAULT_SQLITE_TIMEOUT * 1000)
+        db2.close()
+
+        # The schema is only verified again after the database version changes
+        db1.execute("DROP TABLE rc_meta")
+        db1.commit()
+        db = connection.connect(dburi, verbose=False)
+        db.close()
+        db1.execute(db_version.insert(), {"version": 4.0, "version_number": 4, "version_timestamp": 0})
+        db1.commit()
+        self.assertRaises(DBAdminError, connection.connect, dburi, verbose=False)
+        db1.close()
+
+        connection.dispose_engines()
+        db = connection.connect(dburi, schema_check=False, verbose=False)
+        self.assertFalse(db.get_bind() is db1.get_bind())
+        db.close()
+        _remove(filename)
+
+    def test_sqlite_profile(self):
+        props = properties.Properties()
+        props.property(connection.PROP_CATALOG_WORKFLOW_SQLITE_PROFILE, val="performance")
+        filename = str(uuid.uuid4())
+        _silentremove(filename)
+        dburi = "sqlite:///%s" % filename
+        self.assertEquals(connection.get_sqlite_profile(dburi, props, connection.DBType.WORKFLOW),
+                          connection.SQLiteProfile.PERFORMANCE)
+        self.assertEquals(connection.get_sqlite_profile(dburi, props, connection.DBType.MASTER),
+                          connection.SQLiteProfile.DEFAULT)
+        self.assertEquals(connection.get_sqlite_profile("mysql://localhost/db", props, connection.DBType.WORKFLOW),
+                          connection.SQLiteProfile.DEFAULT)
+
+        db = connection.connect(dburi, create=True, props=props, db_type=connection.DBType.WORKFLOW, verbose=False)
+        self.assertEquals(db.execute("PRAGMA synchronous").scalar(), 1)
+        self.assertEquals(db.execute("PRAGMA temp_store").scalar(), 2)
+        db.close()
+        db = connection.connect(dburi, verbose=False)
+        self.assertEquals(db.execute("PRAGMA synchronous").scalar(), 2)
+        db.close()
+        _remove(filename)
+
+        props.property(connection.PROP_CATALOG_ALL_SQLITE_PROFILE, val="unknown")
+        self.assertRaises(connection.ConnectionError, connection.get_sqlite_profile, dburi, props,
+                          connection.DBType.MASTER)
+
+    def test_memory_engine(self):
+        db1 = connection.connect("sqlite://", create=True, verbose=False)
+        db2 = connection.connect("sqlite://", schema_check=False, verbose=False)
+        self.assertFalse(db1.get_bind() is db2.get_bind())
+        db1.close()
+        db2.close()
+
 
 def _silentremove(filename):
     try:
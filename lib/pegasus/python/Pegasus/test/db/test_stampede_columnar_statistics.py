@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from decimal import Decimal
+
+from Pegasus.db.workflow import stampede_columnar_statistics
+from Pegasus.db.workflow.stampede_columnar_statistics import StampedeColumnarStatistics
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics, TIME_GRANULARITIES
+from Pegasus.test.db.test_stampede_statistics import create_test_db, WF_UUID
+
+METHODS = [
+    "get_job_statistics",
+    "get_job_states",
+    "get_transformation_statistics",
+    "get_workflow_cum_job_wall_time",
+    "get_invocation_by_time",
+    "get_jobs_run_by_time",
+    "get_invocation_by_time_per_host",
+    "get_jobs_run_by_time_per_host",
+]
+
+FILTERS = [
+    lambda s: None,
+    lambda s: s.set_job_filter('nonsub'),
+    lambda s: s.set_job_filter('compute'),
+    lambda s: s.set_time_filter('hour'),
+    lambda s: s.set_host_filter('nonexistent'),
+    lambda s: s.set_transformation_filter(exclude=['pegasus::dirmanager']),
+    lambda s: s.set_transformation_filter(include='keg'),
+]
+
+def normalize(value):
+    if isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(v) for v in value)
+    return value
+
+@unittest.skipIf(not stampede_columnar_statistics.is_available(), "numpy not available")
+class TestStampedeColumnarStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dburi = "sqlite:///%s" % os.path.join(self.dir, "test.stampede.db")
+        create_test_db(self.dburi)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def compare(self, expand_workflow):
+        expected = StampedeStatistics(self.dburi, expand_workflow)
+        actual = StampedeColumnarStatistics(self.dburi, expand_workflow)
+        try:
+            expected.initialize(WF_UUID)
+            actual.initialize(WF_UUID)
+            for set_filter in FILTERS:
+                set_filter(expected)
+                set_filter(actual)
+                for method in METHODS:
+                    self.assertEquals(normalize(getattr(actual, method)()),
+                                      normalize(getattr(expected, method)()), method)
+                for granularity in TIME_GRANULARITIES:
+                    for kind in ("jobs", "invocations"):
+                        for per_host in (False, True):
+                            args = (kind, granularity, per_host, [(0, 3600), (1006, 7200)])
+                            self.assertEquals(normalize(list(actual.get_time_series(*args))),
+                                              normalize(list(expected.get_time_series(*args))), args)
+        finally:
+            expected.close()
+            actual.close()
+
+    def test_matches_sql(self):
+        self.compare(False)
+
+    def test_matches_sql_expanded(self):
+        self.compare(True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.db import connection
+from Pegasus.db.schema import *
+from Pegasus.db.workflow_loader import update_job_instance_summary
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics, time_bucket
+from sqlalchemy.dialects import oracle
+
+WF_UUID = "00000000-0000-0000-0000-000000000001"
+
+def create_test_db(dburi):
+    """
+    Creates a stampede DB with a workflow that has a retried job, a
+    clustered job and a job that never ran, and another workflow.
+    """
+    session = connection.connect(dburi, create=True, verbose=False)
+
+    session.execute(st_workflow.insert(), [
+        {"wf_id": 1, "wf_uuid": WF_UUID, "root_wf_id": 1},
+        {"wf_id": 2, "wf_uuid": "00000000-0000-0000-0000-000000000002", "root_wf_id": 2},
+    ])
+    session.execute(st_host.insert(), [
+        {"host_id": 1, "wf_id": 1, "site": "local", "hostname": "node1", "ip": "10.0.0.1"},
+    ])
+    job = {"wf_id": 1, "submit_file": "x.sub", "type_desc": "compute", "clustered": False,
+           "max_retries": 3, "executable": "/bin/true", "task_count": 1}
+    session.execute(st_job.insert(), [
+        dict(job, job_id=1, exec_job_id="retried"),
+        dict(job, job_id=2, exec_job_id="clustered", clustered=True, task_count=3),
+        dict(job, job_id=3, exec_job_id="never_ran"),
+        dict(job, job_id=4, exec_job_id="other_wf", wf_id=2),
+    ])
+    job_instance = {"host_id": None, "site": "local", "local_duration": None, "cluster_duration": None,
+                    "multiplier_factor": 1}
+    session.execute(st_job_instance.insert(), [
+        # First try of "retried" fails, and runs a postscript
+        dict(job_instance, job_instance_id=1, job_id=1, job_submit_seq=1, host_id=1, local_duration=10.5),
+        dict(job_instance, job_instance_id=2, job_id=2, job_submit_seq=2, local_duration=20.25,
+             cluster_duration=19.125, multiplier_factor=4),
+        dict(job_instance, job_instance_id=3, job_id=1, job_submit_seq=3, host_id=1, local_duration=5.0),
+        dict(job_instance, job_instance_id=4, job_id=3, job_submit_seq=4),
+        dict(job_instance, job_instance_id=5, job_id=4, job_submit_seq=1),
+    ])
+    jobstates = [
+        (1, "PRE_SCRIPT_STARTED", 1000.1), (1, "SUBMIT", 1001.2), (1, "GRID_SUBMIT", 1003.3),
+        (1, "EXECUTE", 1007.4), (1, "JOB_TERMINATED", 1020.5), (1, "POST_SCRIPT_STARTED", 1021.6),
+        (1, "POST_SCRIPT_TERMINATED", 1025.7),
+        (2, "SUBMIT", 1002.123456), (2, "EXECUTE", 1005.654321), (2, "JOB_TERMINATED", 1030.0),
+        (3, "SUBMIT", 1040.0), (3, "GLOBUS_SUBMIT", 1041.5), (3, "EXECUTE", 1042.25),
+        (3, "JOB_TERMINATED", 1050.0),
+        (4, "SUBMIT", 1060.0),
+        (5, "SUBMIT", 1000.0), (5, "EXECUTE", 1001.0),
+    ]
+    session.execute(st_jobstate.insert(), [
+        {"job_instance_id": ji, "state": state, "timestamp": ts, "jobstate_submit_seq": seq}
+        for seq, (ji, state, ts) in enumerate(jobstates)
+    ])
+    invocation = {"wf_id": 1, "start_time": 1000.0, "transformation": "keg", "executable": "/bin/keg",
+                  "remote_cpu_time": None}
+    session.execute(st_invocation.insert(), [
+        dict(invocation, job_instance_id=1, task_submit_seq=-1, remote_duration=0.5, exitcode=0,
+             transformation="dagman::pre"),
+        dict(invocation, job_instance_id=1, task_submit_seq=1, remote_duration=12.1, exitcode=256,
+             remote_cpu_time=11.9),
+        dict(invocation, job_instance_id=1, task_submit_seq=-2, remote_duration=0.5, exitcode=512,
+             transformation="dagman::post"),
+        dict(invocation, job_instance_id=2, task_submit_seq=1, remote_duration=6.1, exitcode=0,
+             remote_cpu_time=6.0),
+        dict(invocation, job_instance_id=2, task_submit_seq=2, remote_duration=6.2, exitcode=0),
+        dict(invocation, job_instance_id=2, task_submit_seq=3, remote_duration=6.3, exitcode=0,
+             remote_cpu_time=6.2),
+        dict(invocation, job_instance_id=3, task_submit_seq=1, remote_duration=4.9, exitcode=0,
+             remote_cpu_time=4.8),
+        dict(invocation, job_instance_id=5, task_submit_seq=1, remote_duration=1.0, exitcode=0, wf_id=2),
+    ])
+    update_job_instance_summary(session)
+    session.commit()
+    session.close()
+
+JOB_STATISTICS_FIELDS = ("job_id", "job_instance_id", "job_submit_seq", "job_name", "site", "condor_q_time",
+                         "resource_delay", "runtime", "kickstart", "post_time", "seqexec", "exit_code",
+                         "host_name", "multiplier_factor", "kickstart_multi", "remote_cpu_time")
+
+# The job statistics of the workflow created by create_test_db, worked
+# out by hand from the jobstates and invocations above
+EXPECTED_JOB_STATISTICS = [
+    (1, 1, 1, "retried", "local", 1003.3 - 1001.2, 1007.4 - 1003.3, 10.5, 12.1, 1025.7 - 1021.6,
+     None, 256, "node1", 1, 12.1, 11.9),
+    (2, 2, 2, "clustered", "local", 1005.654321 - 1002.123456, None, 20.25, 6.1 + 6.2 + 6.3, None,
+     19.125, 0, None, 4, (6.1 + 6.2 + 6.3) * 4, 6.0 + 6.2),
+    (1, 3, 3, "retried", "local", 1041.5 - 1040.0, 1042.25 - 1041.5, 5.0, 4.9, None,
+     None, 0, "node1", 1, 4.9, 4.8),
+    (3, 4, 4, "never_ran", "local", None, None, None, None, None,
+     None, None, None, 1, None, None),
+]
+
+class TestJobStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dburi = "sqlite:///%s" % os.path.join(self.dir, "test.stampede.db")
+        create_test_db(self.dburi)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_job_statistics(self):
+        stats = StampedeStatistics(self.dburi, expand_workflow=False)
+        try:
+            stats.initialize(WF_UUID)
+            rows = stats.get_job_statistics()
+        finally:
+            stats.close()
+
+        self.assertEquals(rows[0]._fields, JOB_STATISTICS_FIELDS)
+        self.assertEquals(len(rows), len(EXPECTED_JOB_STATISTICS))
+        for row, expected_row in zip(rows, EXPECTED_JOB_STATISTICS):
+            for value, expected_value in zip(row, expected_row):
+                if isinstance(expected_value, float):
+                    self.assertAlmostEquals(float(value), expected_value)
+                else:
+                    self.assertEquals(value, expected_value)
+
+    def test_merge_matches_summary(self):
+        stats = StampedeStatistics(self.dburi, expand_workflow=False)
+        try:
+            stats.initialize(WF_UUID)
+            rows = list(stats._iter_job_statistics_summary())
+            merged = list(stats._iter_job_statistics_merge())
+        finally:
+            stats.close()
+
+        self.assertEquals(len(merged), len(rows))
+        for merged_row, row in zip(merged, rows):
+            self.assertEquals(merged_row._fields, row._fields)
+            for merged_value, value in zip(merged_row, row):
+                if isinstance(value, float):
+                    self.assertAlmostEquals(merged_value, value)
+                else:
+                    self.assertEquals(merged_value, value)
+
+    def test_job_statistics_without_summary(self):
+        session = connection.connect(self.dburi, create=False, verbose=False)
+        try:
+            st_job_instance_summary.drop(session.get_bind())
+        finally:
+            session.close()
+
+        stats = StampedeStatistics(self.dburi, expand_workflow=False)
+        try:
+            stats.initialize(WF_UUID)
+            rows = stats.get_job_statistics()
+        finally:
+            stats.close()
+
+        self.assertEquals([row.job_instance_id for row in rows], [1, 2, 3, 4])
+        self.assertEquals(rows[0].exit_code, 256)
+        self.assertAlmostEquals(rows[1].kickstart_multi, (6.1 + 6.2 + 6.3) * 4)
+        self.assertEquals(rows[3].kickstart, None)
+
+    def test_iter_job_statistics(self):
+        stats = StampedeStatistics(self.dburi, expand_workflow=False)
+        try:
+            stats.initialize(WF_UUID)
+            rows = stats.iter_job_statistics()
+            self.assertEquals(rows.next().job_instance_id, 1)
+            self.assertEquals([row.job_instance_id for row in rows], [2, 3, 4])
+        finally:
+            stats.close()
+
+    def test_summary_refresh(self):
+        session = connection.connect(self.dburi, create=False, verbose=False)
+        try:
+            summary = session.query(JobInstanceSummary).get(1)
+            self.assertEquals(summary.state, "POST_SCRIPT_TERMINATED")
+            self.assertEquals(summary.max_exitcode, 256)
+            self.assertEquals(session.query(JobInstanceSummary).get(4).remote_duration, None)
+
+            # The summary only changes for the job instances we refresh
+            session.execute(st_jobstate.insert(), [
+                {"job_instance_id": 4, "state": "EXECUTE", "timestamp": 1061.0, "jobstate_submit_seq": 100},
+                {"job_instance_id": 5, "state": "JOB_TERMINATED", "timestamp": 1002.0, "jobstate_submit_seq": 101},
+            ])
+            session.execute(st_invocation.insert(), [
+                {"wf_id": 1, "job_instance_id": 4, "task_submit_seq": 1, "start_time": 1061.0,
+                 "remote_duration": 2.5, "remote_cpu_time": 2.0, "transformation": "keg",
+                 "executable": "/bin/keg", "exitcode": 1},
+            ])
+            update_job_instance_summary(session, [4])
+            session.commit()
+            session.expire_all()
+
+            summary = session.query(JobInstanceSummary).get(4)
+            self.assertEquals(summary.state, "EXECUTE")
+            self.assertEquals(summary.jobstate_submit_seq, 100)
+            self.assertEquals(float(summary.remote_duration), 2.5)
+            self.assertTrue(isinstance(summary.remote_duration_multi, float))
+            self.assertEquals(summary.remote_duration_multi, 2.5)
+            self.assertEquals(summary.max_exitcode, 1)
+            self.assertEquals(session.query(JobInstanceSummary).get(5).state, "EXECUTE")
+        finally:
+            session.close()
+
+    def test_expanded(self):
+        stats = StampedeStatistics(self.dburi)
+        try:
+            stats.initialize(WF_UUID)
+            self.assertEquals(stats.get_job_statistics(), [])
+        finally:
+            stats.close()
+
+class TestTimeSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dburi = "sqlite:///%s" % os.path.join(self.dir, "test.stampede.db")
+        create_test_db(self.dburi)
+        self.stats = StampedeStatistics(self.dburi)
+        self.stats.initialize(WF_UUID)
+
+    def tearDown(self):
+        self.stats.close()
+        shutil.rmtree(self.dir)
+
+    def test_granularities(self):
+        series = self.stats.get_time_series('jobs', 'minute')
+        self.assertEquals(list(series), [(960, None, 2, 30.75), (1020, None, 1, 5.0)])
+        self.assertEquals(series.buckets.tolist(), [960, 1020])
+
+        self.assertEquals(list(self.stats.get_time_series('jobs', 'hour')), [(0, None, 3, 35.75)])
+        self.assertEquals(list(self.stats.get_time_series('jobs', 'week')), [(-3 * 86400, None, 3, 35.75)])
+        self.assertEquals(list(self.stats.get_time_series('invocations', 'month', utc_offset=86400 * 31)),
+                          [(86400 * 31, None, 7, 36.6)])
+        self.assertRaises(ValueError, self.stats.get_time_series, 'jobs', 'year')
+        self.assertRaises(ValueError, self.stats.get_time_series, 'tasks', 'day')
+
+    def test_per_host(self):
+        self.assertEquals(list(self.stats.get_time_series('jobs', 'minute', per_host=True)),
+                          [(960, 'node1', 1, 10.5), (1020, 'node1', 1, 5.0)])
+
+        self.stats.set_host_filter('node2')
+        self.assertEquals(len(self.stats.get_time_series('invocations', 'day', per_host=True)), 0)
+
+    def test_utc_offsets(self):
+        # The jobs that run after 1006 are an hour ahead
+        series = self.stats.get_time_series('jobs', 'minute', utc_offset=[(0, 0), (1006, 3600)])
+        self.assertEquals(list(series), [(960, None, 1, 20.25), (4560, None, 1, 10.5), (4620, None, 1, 5.0)])
+
+    def test_dialects(self):
+        def compile(granularity, dialect):
+            q = select([time_bucket(st_jobstate.c.timestamp, granularity, 3600)])
+            return str(q.compile(dialect=dialect)).lower()
+
+        self.assertTrue("floor" in compile('day', postgresql.dialect()))
+        self.assertTrue("date_trunc" in compile('month', postgresql.dialect()))
+        self.assertTrue("timestampdiff" in compile('month', mysql.dialect()))
+        self.assertRaises(CompileError, compile, 'month', oracle.dialect())
+
+if __name__ == '__main__':
+    unittest.main()
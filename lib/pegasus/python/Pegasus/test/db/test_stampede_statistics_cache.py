@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.db import connection
+from Pegasus.db.schema import *
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics
+from Pegasus.db.workflow.stampede_statistics_cache import StampedeStatisticsCache, default_filename
+from Pegasus.test.db.test_stampede_statistics import create_test_db, WF_UUID
+
+class TestStampedeStatisticsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dburi = "sqlite:///%s" % os.path.join(self.dir, "test.stampede.db")
+        self.filename = default_filename(self.dburi)
+        create_test_db(self.dburi)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def update(self):
+        cache = StampedeStatisticsCache(self.filename)
+        session = connection.connect(self.dburi, create=False, verbose=False)
+        try:
+            cache.update(session, [WF_UUID])
+        finally:
+            session.close()
+        cache.save()
+        return cache
+
+    def assertMatchesDatabase(self, cache):
+        stats = StampedeStatistics(self.dburi, expand_workflow=False)
+        try:
+            stats.initialize(WF_UUID)
+            expected = stats.get_transformation_statistics()
+            expected_wall_time = stats.get_workflow_cum_job_wall_time()
+        finally:
+            stats.close()
+
+        rows = cache.get_transformation_statistics([WF_UUID])
+        self.assertEquals([row.transformation for row in rows], [row.transformation for row in expected])
+        for row, expected_row in zip(rows, expected):
+            for column in row._fields[1:]:
+                self.assertAlmostEquals(getattr(row, column), getattr(expected_row, column))
+
+        for value, expected_value in zip(cache.get_workflow_cum_job_wall_time([WF_UUID]), expected_wall_time):
+            self.assertAlmostEquals(value, expected_value)
+
+    def test_default_filename(self):
+        self.assertEquals(self.filename, os.path.join(self.dir, "test.stampede.db.statistics-cache"))
+        self.assertEquals(default_filename("mysql://user@localhost/stampede"), None)
+
+    def test_update(self):
+        cache = self.update()
+        self.assertMatchesDatabase(cache)
+        self.assertEquals(cache.get_dax_label(WF_UUID), None)
+        cache.set(WF_UUID, "status", {"jobs": 3})
+        cache.save()
+
+        # Nothing changed, the values are kept
+        cache = self.update()
+        self.assertEquals(cache.get(WF_UUID, "status"), {"jobs": 3})
+
+        # New invocations are folded in, and the values are dropped
+        session = connection.connect(self.dburi, create=False, verbose=False)
+        session.execute(st_invocation.insert(), [
+            {"wf_id": 1, "job_instance_id": 4, "task_submit_seq": 1, "start_time": 1061.0, "remote_duration": 0.25,
+             "remote_cpu_time": None, "transformation": "keg", "executable": "/bin/keg", "exitcode": 1},
+            {"wf_id": 1, "job_instance_id": 4, "task_submit_seq": 2, "start_time": 1061.0, "remote_duration": 2.0,
+             "remote_cpu_time": None, "transformation": "other", "executable": "/bin/other", "exitcode": 0},
+        ])
+        session.commit()
+        session.close()
+
+        cache = self.update()
+        self.assertEquals(cache.get(WF_UUID, "status"), None)
+        self.assertMatchesDatabase(cache)
+
+    def test_jobstate_change(self):
+        cache = self.update()
+        cache.set(WF_UUID, "status", {"jobs": 3})
+        cache.save()
+
+        session = connection.connect(self.dburi, create=False, verbose=False)
+        session.execute(st_jobstate.insert(), [
+            {"job_instance_id": 4, "state": "EXECUTE", "timestamp": 1061.0, "jobstate_submit_seq": 100},
+        ])
+        session.commit()
+        session.close()
+
+        cache = self.update()
+        self.assertEquals(cache.get(WF_UUID, "status"), None)
+
+    def test_reloaded_workflow(self):
+        self.update()
+
+        # The workflow is loaded again with a different wf_id, for
+        # instance by pegasus-monitord in replay mode
+        session = connection.connect(self.dburi, create=False, verbose=False)
+        session.execute(st_workflow.update().where(st_workflow.c.wf_id == 1).values(wf_uuid="old"))
+        session.execute(st_workflow.insert(), [{"wf_id": 3, "wf_uuid": WF_UUID, "root_wf_id": 3}])
+        session.commit()
+        session.close()
+
+        cache = self.update()
+        self.assertEquals(cache.get_transformation_statistics([WF_UUID]), [])
+        self.assertEquals(cache.get_workflow_cum_job_wall_time([WF_UUID]), (None, None, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.db.schema import *
+from Pegasus.db.workflow_loader import WorkflowCache, WorkflowLoader
+
+class TestWorkflowCache(unittest.TestCase):
+
+    def test_partitions(self):
+        cache = WorkflowCache(10)
+        cache.get(1)["job_a"] = 10
+        cache.get(2)["job_a"] = 20
+        self.assertEquals(cache.get(1)["job_a"], 10)
+        self.assertEquals(cache.get(2)["job_a"], 20)
+
+    def test_purge(self):
+        cache = WorkflowCache(10)
+        cache.get(1)["job_a"] = 10
+        cache.set_complete(1)
+        cache.get(2)["job_a"] = 20
+        cache.purge(1)
+        self.assertEquals(cache.get(1), {})
+        self.assertFalse(cache.is_complete(1))
+        self.assertEquals(cache.get(2)["job_a"], 20)
+
+        # Purging an unknown workflow is a no-op
+        cache.purge(3)
+
+    def test_lru(self):
+        cache = WorkflowCache(2)
+        cache.get(1)["job_a"] = 10
+        cache.set_complete(1)
+        cache.get(2)["job_a"] = 20
+        # Touch 1, so that 2 is the least recently used one
+        cache.get(1)
+        cache.get(3)["job_a"] = 30
+        self.assertEquals(cache.get(1)["job_a"], 10)
+        self.assertTrue(cache.is_complete(1))
+        self.assertEquals(cache.get(2), {})
+
+    def test_complete(self):
+        cache = WorkflowCache(10)
+        self.assertFalse(cache.is_complete(1))
+        cache.set_complete(1)
+        self.assertTrue(cache.is_complete(1))
+        cache.set_complete(1, False)
+        self.assertFalse(cache.is_complete(1))
+
+class TestWorkflowLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.loader = WorkflowLoader("sqlite:///%s" % os.path.join(self.dir, "test.stampede.db"), batch=True)
+        self.loader.session.execute(st_workflow.insert(), [{"wf_id": 1, "wf_uuid": "wf-uuid", "root_wf_id": 1}])
+        self.loader.session.commit()
+
+    def tearDown(self):
+        self.loader.disconnect()
+        shutil.rmtree(self.dir)
+
+    def job(self, exec_job_id):
+        self.loader.process({"event": "stampede.job.info", "xwf.id": "wf-uuid", "job.id": exec_job_id,
+                             "submit_file": exec_job_id + ".sub", "type_desc": "compute", "clustered": "0",
+                             "max_retries": "3", "executable": "/bin/true", "argv": "", "task_count": "0"})
+
+    def test_job_id_cache(self):
+        self.job("job_a")
+        self.loader.hard_flush()
+        self.assertEquals(self.loader.get_job_id(1, "job_a"), 1)
+
+        # The job_ids are loaded before the new job is written, the
+        # cache must not stay complete without it
+        self.job("job_b")
+        self.assertEquals(self.loader.get_job_id(1, "job_b"), None)
+        self.loader.hard_flush()
+        self.assertEquals(self.loader.get_job_id(1, "job_b"), 2)
+
+    def _test_bad_row(self):
+        def individual_commit(event, merge=False):
+            self.fail("Only the statement with the bad row should be split")
+        self.loader.individual_commit = individual_commit
+
+        self.job("job_a")
+        self.loader.hard_flush()
+
+        # job_a is already in the database, and violates UNIQUE_JOB
+        for exec_job_id in ["job_b", "job_c", "job_a", "job_d", "job_e"]:
+            self.job(exec_job_id)
+        self.loader.hard_flush()
+
+        rows = self.loader.session.query(Job.exec_job_id).order_by(Job.job_id)
+        self.assertEquals([row.exec_job_id for row in rows], ["job_a", "job_b", "job_c", "job_d", "job_e"])
+        self.assertEquals(self.loader._batch_cache['batch_events'], [])
+
+    def test_bad_row(self):
+        self._test_bad_row()
+
+    def test_bad_row_commit_batch(self):
+        self.loader._commit_batch = True
+        self._test_bad_row()
+
+    def job_instance(self, exec_job_id, job_submit_seq):
+        job_instance = {"xwf.id": "wf-uuid", "job.id": exec_job_id, "job_inst.id": job_submit_seq, "ts": "1000"}
+        self.loader.process(dict(job_instance, event="stampede.job_inst.submit.start", **{"sched.id": "1.0"}))
+        self.loader.process(dict(job_instance, event="stampede.job_inst.submit.end", status="0", **{"js.id": "1"}))
+        self.loader.process(dict(job_instance, event="stampede.inv.end", start_time="1000", dur="2.5",
+                                 exitcode="0", transformation="keg", executable="/bin/keg",
+                                 **{"inv.id": "1"}))
+
+    def test_batched_job_instances(self):
+        self.job("job_a")
+        self.job("job_b")
+        self.loader.hard_flush()
+
+        def insert_returning_id(o):
+            self.fail("Job instances should be inserted with the batch")
+        self.loader.insert_returning_id = insert_returning_id
+
+        self.job_instance("job_a", "1")
+        self.job_instance("job_b", "1")
+        self.job_instance("job_a", "2")
+        # Already queued
+        self.loader.process({"event": "stampede.job_inst.submit.start", "xwf.id": "wf-uuid", "job.id": "job_a",
+                             "job_inst.id": "2", "ts": "1000"})
+        self.assertEquals(self.loader.session.query(JobInstance).count(), 0)
+        self.loader.hard_flush()
+
+        rows = self.loader.session.query(JobInstance.job_id, JobInstance.job_submit_seq, JobInstance.job_instance_id)
+        job_instances = dict(((row.job_id, row.job_submit_seq), row.job_instance_id) for row in rows)
+        self.assertEquals(sorted(job_instances.keys()), [(1, 1), (1, 2), (2, 1)])
+        self.assertEquals(self.loader.job_instance_id_cache.get(1), job_instances)
+
+        rows = self.loader.session.query(Jobstate.job_instance_id, Jobstate.state)
+        self.assertEquals(sorted(rows), sorted((i, "SUBMIT") for i in job_instances.values()))
+        rows = self.loader.session.query(Invocation.job_instance_id)
+        self.assertEquals(sorted(row.job_instance_id for row in rows), sorted(job_instances.values()))
+        rows = self.loader.session.query(JobInstanceSummary.job_instance_id, JobInstanceSummary.state)
+        self.assertEquals(sorted(rows), sorted((i, "SUBMIT") for i in job_instances.values()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.db import connection
+from Pegasus.db.schema import *
+from Pegasus.monitoring import event_output
+
+WF_UUID = "a1b2c3d4-0000-0000-0000-000000000001"
+
+class TestThreadedDBEventSink(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dburi = "sqlite:///%s" % os.path.join(self.dir, "test.stampede.db")
+        self.sink = event_output.DBEventSink(self.dburi, threaded=True, queue_size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _send_workflow(self):
+        self.sink.send("wf.plan", {"xwf__id": WF_UUID,
+                                   "root__xwf__id": WF_UUID,
+                                   "submit__dir": self.dir,
+                                   "argv": "--dax test.dax",
+                                   "ts": 1})
+        for state in ["xwf.start", "xwf.end"]:
+            self.sink.send(state, {"xwf__id": WF_UUID, "ts": 1, "restart_count": 0, "status": 0})
+
+    def _count(self, table):
+        db = connection.connect(self.dburi)
+        try:
+            return db.query(table).count()
+        finally:
+            db.close()
+
+    def test_flush(self):
+        self._send_workflow()
+        self.sink.flush(force=True)
+        self.assertEquals(self._count(Workflow), 1)
+        self.assertEquals(self._count(Workflowstate), 2)
+        self.sink.close()
+
+    def test_close(self):
+        self._send_workflow()
+        self.sink.close()
+        self.assertEquals(self._count(Workflowstate), 2)
+
+        stats = self.sink.stats()
+        self.assertEquals(stats["events"], 3)
+        self.assertEquals(stats["queue_depth"], 0)
+        self.assertTrue(stats["max_queue_depth"] <= 2)
+        self.assertTrue(stats["max_latency"] >= stats["mean_latency"])
+
+    def _send_bad_event(self):
+        # The loader fails to convert the timestamp
+        self.sink.send("xwf.start", {"xwf__id": WF_UUID, "ts": "bad", "restart_count": 0, "status": 0})
+
+    def test_error(self):
+        # Errors are not raised by later, unrelated events
+        self._send_workflow()
+        self._send_bad_event()
+        self._send_workflow()
+        # A forced flush reports them, so that nothing relies on events
+        # that were not loaded
+        self.assertRaises(ValueError, self.sink.flush, force=True)
+        self.sink.flush(force=True)
+        self.assertEquals(self._count(Workflowstate), 2)
+        self.sink.close()
+
+    def test_close_error(self):
+        self._send_workflow()
+        self._send_bad_event()
+        self.assertRaises(ValueError, self.sink.close)
+        self.assertEquals(self._count(Workflowstate), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.monitoring import file_watcher
+
+class TestFileWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "test.dag.dagman.out")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def append(self, filename, text="line\n"):
+        f = open(filename, "a")
+        f.write(text)
+        f.close()
+
+    def test_polling(self):
+        watcher = file_watcher.PollingWatcher()
+        watcher.watch(self.filename)
+        start = time.time()
+        self.assertFalse(watcher.wait(0.1))
+        self.assertTrue(time.time() - start >= 0.1)
+
+    @unittest.skipIf(file_watcher.libc is None, "inotify not available")
+    def test_inotify(self):
+        watcher = file_watcher.create_file_watcher()
+        self.assertTrue(isinstance(watcher, file_watcher.InotifyWatcher))
+        try:
+            watcher.watch(self.filename)
+
+            # Files showing up and growing wake us up
+            self.append(self.filename)
+            self.assertTrue(watcher.wait(5))
+            self.append(self.filename)
+            self.assertTrue(watcher.wait(5))
+
+            # Other files in the same directory do not
+            self.append(os.path.join(self.dir, "jobstate.log"))
+            self.assertFalse(watcher.wait(0.1))
+
+            watcher.unwatch(self.filename)
+            self.append(self.filename)
+            self.assertFalse(watcher.wait(0.1))
+        finally:
+            watcher.close()
+
+    @unittest.skipIf(file_watcher.libc is None, "inotify not available")
+    def test_inotify_missing_dir(self):
+        watcher = file_watcher.create_file_watcher()
+        try:
+            # Directories that do not exist yet are picked up on a later call
+            filename = os.path.join(self.dir, "subwf", "subwf.dag.dagman.out")
+            watcher.watch(filename)
+            os.mkdir(os.path.dirname(filename))
+            watcher.watch(filename)
+            self.append(filename)
+            self.assertTrue(watcher.wait(5))
+        finally:
+            watcher.close()
+
+    def test_fallback(self):
+        self.assertTrue(isinstance(file_watcher.create_file_watcher(use_inotify=False),
+                                   file_watcher.PollingWatcher))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.tools import kickstart_parser
+from Pegasus.monitoring.kickstart_pool import KickstartParserPool
+
+dirname = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exitcode")
+
+class TestKickstartParserPool(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.pool = KickstartParserPool(2)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.dir)
+
+    def test_prefetch(self):
+        files = sorted(glob.glob(os.path.join(dirname, "*.out")))[:6]
+        for filename in files:
+            self.pool.prefetch(filename)
+        for filename in files:
+            self.assertEquals(self.pool.parse(filename), kickstart_parser.parse_stampede_file(filename))
+        self.assertEquals(self.pool.hits, len(files))
+        self.assertEquals(self.pool.misses, 0)
+
+    def test_full(self):
+        files = sorted(glob.glob(os.path.join(dirname, "*.out")))
+        for filename in files:
+            self.pool.prefetch(filename)
+        self.assertTrue(self.pool.full())
+        self.pool.parse(files[0])
+        self.assertFalse(self.pool.full())
+
+    def test_skipped(self):
+        # Files prefetched before the one being parsed are discarded
+        files = sorted(glob.glob(os.path.join(dirname, "*.out")))[:3]
+        for filename in files:
+            self.pool.prefetch(filename)
+        self.pool.parse(files[1])
+        self.pool.parse(files[0])
+        self.assertEquals(self.pool.hits, 1)
+        self.assertEquals(self.pool.misses, 1)
+
+    def test_changed(self):
+        # Files that changed after being prefetched are parsed again
+        filename = os.path.join(self.dir, "job.out")
+        shutil.copy(os.path.join(dirname, "ok.out"), filename)
+        self.pool.prefetch(filename)
+        f = open(filename, "a")
+        f.write("[cluster-task id=1, status=0]\n")
+        f.close()
+        self.assertEquals(self.pool.parse(filename), kickstart_parser.parse_stampede_file(filename))
+        self.assertEquals(self.pool.misses, 1)
+
+    def test_missing(self):
+        filename = os.path.join(self.dir, "missing.out")
+        self.pool.prefetch(filename)
+        self.assertEquals(self.pool.parse(filename), ([], True))
+        self.assertEquals(self.pool.misses, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.monitoring import workflow
+from Pegasus.monitoring.job import Job
+
+class TestCheckpointFile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dagman_out = os.path.join(self.dir, "test.dag.dagman.out")
+        self.checkpoint_file = os.path.join(self.dir, workflow.MONITORD_CHECKPOINT_FILE)
+        f = open(self.dagman_out, "w")
+        f.write("line 1\nline 2\npartial")
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _checkpoint(self, offset=21):
+        job = Job("wf-uuid", "job_1", self.dir, 1)
+        job._job_state = "EXECUTE"
+        job._sched_id = "12.0"
+        return {"wf_uuid": "wf-uuid",
+                "root_wf_uuid": "wf-uuid",
+                "parent_wf_uuid": None,
+                "run_dir": self.dir,
+                "dagman_out": self.dagman_out,
+                "inode": os.stat(self.dagman_out).st_ino,
+                "offset": offset,
+                "buffer": "partial",
+                "state": {"_line": 2,
+                          "_jobs": {("job_1", 1): job.get_checkpoint()},
+                          "_jobs_map": {"job_1": ("job_1", 1)}}}
+
+    def test_roundtrip(self):
+        self.assertTrue(workflow.write_checkpoint_file(self.checkpoint_file, [self._checkpoint()]))
+        self.assertFalse(os.path.exists(self.checkpoint_file + ".tmp"))
+
+        checkpoints = workflow.read_checkpoint_file(self.checkpoint_file)
+        self.assertEquals(len(checkpoints), 1)
+        self.assertEquals(checkpoints[0]["offset"], 21)
+        self.assertEquals(checkpoints[0]["buffer"], "partial")
+        self.assertEquals(checkpoints[0]["state"]["_line"], 2)
+        self.assertEquals(checkpoints[0]["state"]["_jobs"][("job_1", 1)],
+                          {"_job_submit_dir": self.dir, "_job_state": "EXECUTE", "_sched_id": "12.0"})
+
+    def test_job_checkpoint(self):
+        job = Job("wf-uuid", "job_1", self.dir, 1)
+        job.set_job_state("EXECUTE", "12.0", 1000, 0)
+        restored = Job("wf-uuid", "job_1", self.dir, 1)
+        restored.restore_checkpoint(job.get_checkpoint())
+        self.assertEquals(restored.__dict__, job.__dict__)
+
+    def test_missing_file(self):
+        self.assertEquals(workflow.read_checkpoint_file(self.checkpoint_file), None)
+
+    def test_invalid_file(self):
+        f = open(self.checkpoint_file, "w")
+        f.write("garbage")
+        f.close()
+        self.assertEquals(workflow.read_checkpoint_file(self.checkpoint_file), None)
+
+    def test_truncated_dagman_out(self):
+        workflow.write_checkpoint_file(self.checkpoint_file, [self._checkpoint(offset=1000)])
+        self.assertEquals(workflow.read_checkpoint_file(self.checkpoint_file), None)
+
+    def test_replaced_dagman_out(self):
+        workflow.write_checkpoint_file(self.checkpoint_file, [self._checkpoint()])
+        # Keep the old file around, so the new one gets a different inode
+        os.rename(self.dagman_out, self.dagman_out + ".000")
+        shutil.copy(self.dagman_out + ".000", self.dagman_out)
+        self.assertEquals(workflow.read_checkpoint_file(self.checkpoint_file), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -246,6 +246,28 @@ class TestMasterWorkflowQueries(NoAuthFlaskTestCase):
 
         self.assertEqual(len(root_workflows['records']), 2)
 
+    def test_cursor_with_start_index(self):
+        rv = self.get_context('/api/v1/user/%s/root?start-index=1&cursor=' % self.user, pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 400)
+
+    def test_invalid_cursor(self):
+        rv = self.get_context('/api/v1/user/%s/root?cursor=abc' % self.user, pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(self.read_json_response(rv)['code'], 'INVALID_CURSOR')
+
+    def test_count_none(self):
+        rv = self.get_context('/api/v1/user/%s/root?count=none&max-results=2' % self.user,
+                              pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+
+        root_workflows = self.read_json_response(rv)
+
+        self.assertEqual(len(root_workflows['records']), 2)
+        self.assertFalse('_meta' in root_workflows)
+
     def test_get_root_workflow_id(self):
         rv = self.get_context('/api/v1/user/%s/root/1' % self.user, pre_callable=self.pre_callable)
 
@@ -421,6 +443,32 @@ class TestStampedeJobQueries(NoAuthFlaskTestCase):
         self.assertEqual(len(jobs['records']), jobs['_meta']['records_total'])
         self.assertEqual(jobs['_meta']['records_total'], jobs['_meta']['records_filtered'])
 
+    def test_get_workflow_jobs_cursor(self):
+        uri = '/api/v1/user/%s/root/1/workflow/1/job?query=j.max_retries = 3&order=type_desc DESC' % self.user
+
+        # Cursor pagination breaks ties on the primary key
+        rv = self.get_context(uri + ', job_id', pre_callable=self.pre_callable)
+        expected = [job['job_id'] for job in self.read_json_response(rv)['records']]
+
+        job_ids = []
+        cursor = ''
+
+        while cursor is not None:
+            rv = self.get_context('%s&max-results=3&count=total&cursor=%s' % (uri, cursor),
+                                  pre_callable=self.pre_callable)
+
+            self.assertEqual(rv.status_code, 200)
+
+            jobs = self.read_json_response(rv)
+
+            self.assertEqual(jobs['_meta']['records_total'], 14)
+            self.assertFalse('records_filtered' in jobs['_meta'])
+
+            job_ids.extend(job['job_id'] for job in jobs['records'])
+            cursor = jobs['_meta'].get('next_cursor')
+
+        self.assertEqual(job_ids, expected)
+
     def test_get_job(self):
         rv = self.get_context('/api/v1/user/%s/root/1/workflow/1/job/1' % self.user, pre_callable=self.pre_callable)
 
@@ -577,6 +625,27 @@ class TestStampedeJobInstanceQueries(NoAuthFlaskTestCase):
         self.assertEqual(len(job_instances['records']), job_instances['_meta']['records_total'])
         self.assertEqual(job_instances['_meta']['records_total'], job_instances['_meta']['records_filtered'])
 
+    def test_get_job_instances_fields(self):
+        uri = '/api/v1/user/%s/root/1/workflow/1/job/6/job-instance?fields=ji.exitcode, site' % self.user
+
+        for stream in ('', '&stream=json'):
+            rv = self.get_context(uri + stream, pre_callable=self.pre_callable)
+
+            self.assertEqual(rv.status_code, 200)
+
+            job_instances = self.read_json_response(rv)
+
+            self.assertEqual(len(job_instances['records']), 16)
+
+            for job_instance in job_instances['records']:
+                self.assertEqual(set(job_instance.keys()), set(['site', 'exitcode', '_links']))
+
+        rv = self.get_context('/api/v1/user/%s/root/1/workflow/1/job/6/job-instance?fields=stdout' % self.user,
+                              pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(self.read_json_response(rv)['code'], 'INVALID_FIELDS')
+
     def test_get_recent_job_instance(self):
         rv = self.get_context('/api/v1/user/%s/root/1/workflow/1/job/6/job-instance;recent=true' % self.user,
                               pre_callable=self.pre_callable)
@@ -622,6 +691,25 @@ class TestStampedeInvocationQueries(NoAuthFlaskTestCase):
         self.assertEqual(len(invocations['records']), invocations['_meta']['records_total'])
         self.assertEqual(invocations['_meta']['records_total'], invocations['_meta']['records_filtered'])
 
+    def test_stream_workflow_invocations(self):
+        uri = '/api/v1/user/%s/root/1/workflow/1/invocation?order=exitcode DESC' % self.user
+
+        invocations = self.read_json_response(self.get_context(uri, pre_callable=self.pre_callable))
+
+        rv = self.get_context(uri + '&stream=json', pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.content_type.lower(), 'application/json')
+        self.assertEqual(self.read_json_response(rv), invocations)
+
+        rv = self.get_context(uri + '&stream=ndjson&count=none', pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.content_type.lower(), 'application/x-ndjson')
+
+        records = [json.loads(line) for line in self.read_response(rv).splitlines()]
+        self.assertEqual(records, invocations['records'])
+
     def test_get_job_instance_invocations(self):
         rv = self.get_context('/api/v1/user/%s/root/1/workflow/1/job/6/job-instance/21/invocation' % self.user,
                               pre_callable=self.pre_callable)
@@ -651,3 +739,117 @@ class TestStampedeInvocationQueries(NoAuthFlaskTestCase):
                               pre_callable=self.pre_callable)
 
         self.assertEqual(rv.status_code, 404)
+
+
+class TestStampedeChangesQueries(NoAuthFlaskTestCase):
+    def test_get_workflow_changes(self):
+        uri = '/api/v1/user/%s/root/1/workflow/1/changes' % self.user
+
+        rv = self.get_context(uri, pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.content_type.lower(), 'application/json')
+
+        changes = self.read_json_response(rv)
+
+        self.assertEqual(len(changes['workflow_state']), 8)
+        self.assertEqual(len(changes['job_state']), 160)
+        self.assertEqual(len(changes['invocation']), 41)
+
+        # Read the same changes a few records at a time
+        paged_changes = {'workflow_state': [], 'job_state': [], 'invocation': []}
+        since = ''
+
+        while True:
+            rv = self.get_context(uri + '?max-results=7&since=%s' % since, pre_callable=self.pre_callable)
+
+            if rv.status_code == 204:
+                break
+
+            page = self.read_json_response(rv)
+            since = page['_meta']['since']
+
+            for resource, records in paged_changes.iteritems():
+                self.assertTrue(len(page[resource]) <= 7)
+                records.extend(page[resource])
+
+        for resource, records in paged_changes.iteritems():
+            self.assertEqual(records, changes[resource])
+
+    def test_get_workflow_changes_by_uuid(self):
+        rv = self.get_context('/api/v1/user/%s/root/1/workflow/7193de8c-a28d-4eca-b576-1b1c3c4f668b/changes' % self.user,
+                              pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+
+        changes = self.read_json_response(rv)
+
+        self.assertEqual(len(changes['workflow_state']), 8)
+        self.assertEqual(len(changes['job_state']), 160)
+        self.assertEqual(len(changes['invocation']), 41)
+
+    def test_get_latest_workflow_changes(self):
+        uri = '/api/v1/user/%s/root/1/workflow/1/changes' % self.user
+
+        rv = self.get_context(uri + '?since=latest', pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+
+        changes = self.read_json_response(rv)
+
+        self.assertEqual(changes['job_state'], [])
+
+        rv = self.get_context(uri + '?since=%s' % changes['_meta']['since'], pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 204)
+
+        rv = self.get_context(uri + '?since=latest-1', pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(self.read_json_response(rv)['code'], 'INVALID_WATERMARK')
+
+    def test_get_workflow_change_events(self):
+        rv = self.get_context('/api/v1/user/%s/root/1/workflow/1/changes/events?timeout=0' % self.user,
+                              pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.content_type.lower(), 'text/event-stream')
+
+        events = self.read_response(rv).split('\n\n')
+        event = dict(line.split(': ', 1) for line in events[1].splitlines())
+
+        self.assertEqual(event['event'], 'changes')
+        self.assertEqual(len(json.loads(event['data'])['invocation']), 41)
+        self.assertEqual(event['id'], json.loads(event['data'])['_meta']['since'])
+
+
+class TestBatchRequests(NoAuthFlaskTestCase):
+    def test_batch(self):
+        paths = ['/root', '/root/1', '/root/1000000000', '/root?order=r.wf_id des', '/root?order=wf_id desc']
+        requests = [{'method': 'GET', 'path': '/api/v1/user/%s%s' % (self.user, path)} for path in paths]
+        requests.append({'method': 'GET', 'path': '/api/v1/user/%s/unknown' % self.user})
+
+        rv = self.post_context('/api/v1/user/%s/batch' % self.user, data=json.dumps(requests),
+                               pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 207)
+        self.assertEqual(rv.content_type.lower(), 'application/json')
+
+        # The responses are in the order the requests finished
+        responses = sorted(self.read_json_response(rv), key=lambda response: response['index'])
+
+        self.assertEqual([response['index'] for response in responses], range(len(requests)))
+        # The unknown path is still checked as the batch's user, whoever runs the tests
+        self.assertEqual([response['status'] for response in responses], [200, 200, 404, 400, 200, 404])
+
+        self.assertEqual(len(responses[0]['response']['records']), 5)
+        self.assertEqual(responses[1]['response']['wf_id'], 1)
+        self.assertEqual(responses[2]['response']['code'], 'NOT_FOUND')
+        self.assertEqual(responses[4]['response']['records'][0]['wf_id'], 5)
+
+    def test_invalid_batch(self):
+        rv = self.post_context('/api/v1/user/%s/batch' % self.user, data=json.dumps([{'method': 'GET'}]),
+                               pre_callable=self.pre_callable)
+
+        self.assertEqual(rv.status_code, 400)
+        self.assertEqual(self.read_json_response(rv)['code'], 'INVALID_JSON')
@@ -0,0 +1,72 @@
+import os
+import glob
+import shutil
+import tempfile
+import unittest
+
+from Pegasus.tools import kickstart_parser
+
+dirname = os.path.abspath(os.path.dirname(__file__))
+
+class KickstartParserTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, text):
+        filename = os.path.join(self.dir, "job.out")
+        f = open(filename, "w")
+        f.write(text)
+        f.close()
+        return filename
+
+    def parse(self, filename, streaming):
+        return kickstart_parser.Parser(filename, streaming=streaming).parse_stampede()
+
+    def test_streaming_matches(self):
+        # Both modes return the same records for all our kickstart files
+        files = glob.glob(os.path.join(dirname, "exitcode", "*.out"))
+        self.assertTrue(len(files) > 0)
+        for filename in files:
+            self.assertEquals(self.parse(filename, False), self.parse(filename, True), filename)
+            self.assertEquals(kickstart_parser.Parser(filename).parse_stdout_stderr(),
+                              kickstart_parser.Parser(filename, streaming=True).parse_stdout_stderr(),
+                              filename)
+
+    def test_clustered(self):
+        invocation = open(os.path.join(dirname, "exitcode", "ok.out")).read()
+        invocation = invocation[invocation.index("<invocation"):invocation.index("</invocation>") + 13]
+        text = ""
+        for i in range(1, 4):
+            text += '[cluster-task id=%d, start="2012-01-01T00:00:00.000-08:00", duration=1.0, status=0, app="/bin/true"]\n' % i
+            text += invocation + "\n"
+        text += "[cluster-task id=4, status=0\n"
+        text += '[cluster-summary stat="ok", tasks=3, succeeded=3, failed=0, duration=3.0]\n'
+        filename = self.write(text)
+
+        records = self.parse(filename, True)
+        self.assertEquals(records, self.parse(filename, False))
+        self.assertEquals(len(records), 7)
+        self.assertEquals(records[0]["id"], "1")
+        self.assertTrue(records[1]["invocation"])
+        self.assertEquals(records[-1]["succeeded"], "3")
+
+    def test_empty(self):
+        filename = self.write("")
+        self.assertEquals(self.parse(filename, True), [])
+
+    def test_truncated(self):
+        # An incomplete record at the end of the file is skipped
+        filename = self.write('[cluster-task id=1, status=0]\n<invocation version="2.1">\n<mainjob')
+        self.assertEquals(self.parse(filename, True), self.parse(filename, False))
+        self.assertEquals(len(self.parse(filename, True)), 1)
+
+    def test_missing(self):
+        parser = kickstart_parser.Parser(os.path.join(self.dir, "missing.out"), streaming=True)
+        self.assertEquals(parser.parse_stampede(), [])
+        self.assertTrue(parser._open_error)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,6 +28,7 @@ Pegasus utility functions for pasing a kickstart output file and return wanted i
 from xml.parsers import expat
 import re
 import sys
+import mmap
 import logging
 import traceback
 import os
@@ -35,6 +36,10 @@ import os
 # Regular expressions used in the kickstart parser
 re_parse_props = re.compile(r'(\S+)\s*=\s*([^",]+)')
 re_parse_quoted_props = re.compile(r'(\S+)\s*=\s*"([^"]+)"')
+re_record_start = re.compile(r'<invocation|\[(?:cluster|seqexec)-(?:task|summary)')
+
+# Header prepended to invocation records before parsing them
+XML_HEADER = '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
 
 logger = logging.getLogger(__name__)
 
@@ -44,12 +49,16 @@ class Parser:
     requested information.
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, streaming=False):
         """
         This function initializes the Parser class with the kickstart
-        output file that should be parsed.
+        output file that should be parsed. In streaming mode, the file
+        is read in a single pass with read_records, and all invocation
+        records are fed to the same expat parser.
         """
         self._kickstart_output_file = filename
+        self._streaming = streaming
+        self._my_parser = None
         self._parsing_job_element = False
         self._parsing_arguments = False
         self._parsing_main_job = False
@@ -205,6 +214,60 @@ class Parser:
         #return buffer[:end]
 
 
+    def read_records(self):
+        """
+        This function works like read_record, but is a generator
+        returning all the records in the kickstart output file. It
+        makes a single pass over the memory-mapped file, finding the
+        beginning of each record with one regular expression.
+        """
+        try:
+            data = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (EnvironmentError, ValueError):
+            # Empty file, or not something we can map
+            data = self._fh.read()
+
+        try:
+            pos = 0
+            while True:
+                match = re_record_start.search(data, pos)
+                if match is None:
+                    break
+
+                self._record_number += 1
+                token = match.group(0)
+                start = match.start()
+                eol = data.find("\n", start)
+
+                if token == "<invocation":
+                    end = data.find("</invocation>", start)
+                    if end == -1:
+                        # End of file, record not found
+                        break
+                    end = end + len("</invocation>")
+                    if end > eol:
+                        eol = data.find("\n", end)
+                else:
+                    # clustered and task records should be in a single line!
+                    end = data.find("]", start)
+                    if end == -1 or (eol != -1 and end > eol):
+                        logger.warning("%s: %s line is malformed... ignoring it..." % (self._kickstart_output_file, token))
+                        if eol == -1:
+                            break
+                        pos = eol + 1
+                        continue
+                    end = end + len("]")
+
+                yield data[start:end]
+
+                # Like read_record, skip what is left of the line
+                if eol == -1:
+                    break
+                pos = eol + 1
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
     def is_invocation_record(self, buffer=''):
         """
         Returns True if buffer contains an invocation record.
@@ -380,17 +443,24 @@ class Parser:
         # Add invocation key to our response
         self._keys["invocation"] = True
 
-        # Prepend XML header
-        buffer = '<?xml version="1.0" encoding="ISO-8859-1"?>\n' + buffer
+        if self._streaming:
+            if self._my_parser is None:
+                # Records are parsed as children of a wrapper element,
+                # so the same parser is reused for all of them
+                self._my_parser = self.create_expat_parser()
+                self._my_parser.Parse(XML_HEADER + "<records>", False)
+            # Expat calls our handlers for the complete record
+            # before returning
+            self._my_parser.Parse(buffer, False)
+        else:
+            # Prepend XML header
+            buffer = XML_HEADER + buffer
 
-        # Create parser
-        self._my_parser = expat.ParserCreate()
-        self._my_parser.StartElementHandler = self.start_element
-        self._my_parser.EndElementHandler = self.end_element
-        self._my_parser.CharacterDataHandler = self.char_data
+            # Create parser
+            self._my_parser = self.create_expat_parser()
 
-        # Parse everything!
-        output = self._my_parser.Parse(buffer)
+            # Parse everything!
+            output = self._my_parser.Parse(buffer)
 
         # Add cwd, arguments, stdout, and stderr to keys
         if "cwd" in self._ks_elements:
@@ -407,6 +477,16 @@ class Parser:
 
         return self._keys
 
+    def create_expat_parser(self):
+        """
+        Returns an expat parser calling our element handlers.
+        """
+        my_parser = expat.ParserCreate()
+        my_parser.StartElementHandler = self.start_element
+        my_parser.EndElementHandler = self.end_element
+        my_parser.CharacterDataHandler = self.char_data
+        return my_parser
+
     def parse_clustered_record(self, buffer=''):
         """
         Parses the clustered record in buffer, returning all found keys
@@ -474,11 +554,14 @@ class Parser:
         logger.debug( "Started reading records from kickstart file %s" %(self._kickstart_output_file))
 
         self._record_number = 0
-        # Read first record
-        my_buffer = self.read_record()
+        self._my_parser = None
+        if self._streaming:
+            my_records = self.read_records()
+        else:
+            my_records = iter(self.read_record, None)
 
         # Loop while we still have record to read
-        while my_buffer is not None:
+        for my_buffer in my_records:
             if self.is_invocation_record(my_buffer) == True:
                 # We have an invocation record, parse it!
                 try:
@@ -508,10 +591,8 @@ class Parser:
                 # Just skip it
                 pass
 
-            # Read next record
-            my_buffer = self.read_record()
-
         # Lastly, close the file
+        self._my_parser = None
         self.close()
 
         return my_reply
@@ -557,6 +638,18 @@ class Parser:
 
         return self.parse(stdout_stderr_elements, tasks=False, clustered=False)
 
+def parse_stampede_file(filename):
+    """
+    This function parses a kickstart output file according to the
+    Stampede schema, and returns a tuple with the list of records and
+    a flag telling if the file could not be opened. It is a module
+    level function so that it can be called in worker processes.
+    """
+    my_parser = Parser(filename, streaming=True)
+    my_output = my_parser.parse_stampede()
+
+    return my_output, my_parser._open_error
+
 
 if __name__ == "__main__":
 
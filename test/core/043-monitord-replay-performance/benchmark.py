@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks pegasus-monitord by replaying a synthetic workflow created
+with generate.py. The workflow is replayed in three stages:
+
+  parse     - no events, measures reading and parsing the dagman.out files
+  events    - events written to a file, adds kickstart parsing and
+              event generation
+  database  - events loaded into a SQLite database
+
+For each stage, it reports dagman.out lines/sec, events/sec, database
+rows/sec and the peak RSS of pegasus-monitord, and it can save the
+results as JSON so that they can be compared across releases. The
+database stage can be run once per SQLite profile, to compare their
+insert throughput.
+
+Usage: benchmark.py [options] <number of jobs>
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import sqlite3
+import optparse
+import tempfile
+import subprocess
+
+import generate
+
+STAGES = ["parse", "events", "database"]
+SQLITE_PROFILES = ["default", "performance"]
+
+def count_lines(filename):
+    f = open(filename)
+    try:
+        return sum(1 for line in f)
+    finally:
+        f.close()
+
+def count_rows(db_file):
+    """
+    Returns the total number of rows in all tables of a SQLite database.
+    """
+    db = sqlite3.connect(db_file)
+    try:
+        tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return sum(db.execute('SELECT count(*) FROM "%s"' % table).fetchone()[0] for table in tables)
+    finally:
+        db.close()
+
+def pegasus_version(monitord):
+    """
+    Returns the version of the Pegasus installation pegasus-monitord comes from.
+    """
+    version = os.path.join(os.path.dirname(os.path.abspath(monitord)), "pegasus-version")
+    if not os.path.exists(version):
+        version = "pegasus-version"
+    try:
+        p = subprocess.Popen([version], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    output = p.communicate()[0].strip()
+    if p.returncode != 0:
+        return None
+    return output
+
+def write_conf(conf, work_dir, properties):
+    """
+    Writes the properties file passed to pegasus-monitord.
+    """
+    f = open(conf, "w")
+    # Keep the dashboard database next to the others, instead of
+    # in the user's home directory
+    f.write("pegasus.dashboard.output=sqlite:///%s\n" % os.path.join(work_dir, "dashboard.db"))
+    for prop in properties:
+        f.write("%s\n" % prop)
+    f.close()
+
+def run_stage(stage, name, monitord, submit_dir, work_dir, conf, n_lines):
+    """
+    Replays the workflow once, and returns the metrics for this stage.
+    Output files are named after the run.
+    """
+    events_file = os.path.join(work_dir, "%s.bp" % name)
+    db_file = os.path.join(work_dir, "%s.stampede.db" % name)
+    for filename in (events_file, db_file):
+        if os.path.exists(filename):
+            os.unlink(filename)
+
+    cmd = [monitord, "-r", "--no-notifications", "--conf", conf]
+    if stage == "parse":
+        cmd.append("--no-events")
+    elif stage == "events":
+        cmd.extend(["-d", "file://" + events_file])
+    else:
+        cmd.extend(["-d", "sqlite:///" + db_file])
+    cmd.append(os.path.join(submit_dir, "synthetic-0.dag.dagman.out"))
+
+    log = open(os.path.join(work_dir, "%s.log" % name), "w")
+    start = time.time()
+    p = subprocess.Popen(cmd, cwd=submit_dir, stdout=log, stderr=subprocess.STDOUT)
+    # wait4 gives us the resource usage of this one child
+    pid, status, rusage = os.wait4(p.pid, 0)
+    duration = max(time.time() - start, 0.001)
+    log.close()
+
+    result = {
+        "exitcode": os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status),
+        "seconds": round(duration, 3),
+        "cpu_seconds": round(rusage.ru_utime + rusage.ru_stime, 3),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": rusage.ru_maxrss,
+        "lines": n_lines,
+        "lines_per_sec": round(n_lines / duration, 1),
+    }
+
+    if stage == "events":
+        result["events"] = count_lines(events_file)
+        result["events_per_sec"] = round(result["events"] / duration, 1)
+    elif stage == "database":
+        result["rows"] = count_rows(db_file)
+        result["rows_per_sec"] = round(result["rows"] / duration, 1)
+
+    return result
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] <number of jobs>")
+    parser.add_option("-c", "--cluster-size", action="store", type="int", dest="cluster_size", default=1,
+                      help="number of tasks in each job, 1 disables clustering, default is %default")
+    parser.add_option("-d", "--depth", action="store", type="int", dest="depth", default=0,
+                      help="number of nested sub-workflows, default is %default")
+    parser.add_option("-s", "--stage", action="append", dest="stages", choices=STAGES,
+                      help="stage to run, repeatable: %s, default is all of them" % " | ".join(STAGES))
+    parser.add_option("-P", "--sqlite-profile", action="append", dest="sqlite_profiles", choices=SQLITE_PROFILES,
+                      help="SQLite profile to run the database stage with, repeatable: %s, "
+                           "default is the one in the properties" % " | ".join(SQLITE_PROFILES))
+    parser.add_option("-p", "--property", action="append", dest="properties", default=[], metavar="KEY=VALUE",
+                      help="property passed to pegasus-monitord, repeatable")
+    parser.add_option("-m", "--monitord", action="store", dest="monitord", default="pegasus-monitord",
+                      help="pegasus-monitord to benchmark, default is the one in the PATH")
+    parser.add_option("-w", "--work-dir", action="store", dest="work_dir",
+                      help="directory for the synthetic workflow and outputs, default is a temporary one which is removed at the end")
+    parser.add_option("-o", "--output", action="store", dest="output",
+                      help="file to save the results to, as JSON")
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("the number of jobs is required")
+    n_jobs = int(args[0])
+    stages = options.stages or STAGES
+
+    # Runs, as (stage, name, extra properties)
+    runs = []
+    for stage in stages:
+        if stage == "database" and options.sqlite_profiles:
+            for profile in options.sqlite_profiles:
+                runs.append((stage, "%s-%s" % (stage, profile), ["pegasus.catalog.*.sqlite.profile=%s" % profile]))
+        else:
+            runs.append((stage, stage, []))
+
+    work_dir = options.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="monitord-benchmark-")
+    work_dir = os.path.abspath(work_dir)
+    submit_dir = os.path.join(work_dir, "submit")
+    keep_work_dir = options.work_dir is not None
+
+    try:
+        if os.path.exists(submit_dir):
+            shutil.rmtree(submit_dir)
+        start = time.time()
+        dagman_outs = generate.generate(submit_dir, n_jobs, options.cluster_size, options.depth)
+        n_lines = sum(count_lines(dagman_out) for dagman_out in dagman_outs)
+        sys.stderr.write("Generated %d workflow(s), %d dagman.out lines, in %.1f seconds\n"
+                         % (len(dagman_outs), n_lines, time.time() - start))
+
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "hostname": socket.gethostname(),
+            "pegasus_version": pegasus_version(options.monitord),
+            "jobs": n_jobs,
+            "cluster_size": options.cluster_size,
+            "depth": options.depth,
+            "workflows": len(dagman_outs),
+            "properties": options.properties,
+            "sqlite_profiles": options.sqlite_profiles,
+            "stages": {},
+        }
+
+        failed = False
+        for stage, name, properties in runs:
+            sys.stderr.write("Running stage %s...\n" % name)
+            conf = os.path.join(work_dir, "%s.properties" % name)
+            # Properties given on the command line come last, so they win
+            write_conf(conf, work_dir, properties + options.properties)
+            result = run_stage(stage, name, options.monitord, submit_dir, work_dir, conf, n_lines)
+            results["stages"][name] = result
+            failed = failed or result["exitcode"] != 0
+
+        # The database stage loads the same events as the events stage
+        for stage, name, properties in runs:
+            if stage == "database" and "events" in results["stages"]:
+                result = results["stages"][name]
+                result["events"] = results["stages"]["events"]["events"]
+                result["events_per_sec"] = round(result["events"] / result["seconds"], 1)
+
+        # Report
+        print "%-20s %10s %12s %12s %12s %12s" % ("stage", "seconds", "lines/sec", "events/sec", "rows/sec", "peak RSS MB")
+        for stage, name, properties in runs:
+            result = results["stages"][name]
+            print "%-20s %10.2f %12.0f %12s %12s %12.1f" % (name, result["seconds"], result["lines_per_sec"],
+                                                           "%.0f" % result["events_per_sec"] if "events_per_sec" in result else "-",
+                                                           "%.0f" % result["rows_per_sec"] if "rows_per_sec" in result else "-",
+                                                           result["peak_rss_kb"] / 1024.0)
+
+        if options.output is not None:
+            f = open(options.output, "w")
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+            f.close()
+
+        if failed:
+            keep_work_dir = True
+            sys.stderr.write("Error: pegasus-monitord failed, see the logs in %s\n" % work_dir)
+            sys.exit(1)
+    finally:
+        if not keep_work_dir:
+            shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+"""
+Generates a synthetic submit directory with a large dagman.out file,
+which can be replayed with pegasus-monitord -r for benchmarking.
+
+Every job gets a submit file and a kickstart output file. Jobs can be
+clustered, in which case their kickstart output has one record per
+task, and the workflow can contain a chain of sub-workflows, each one
+with the same number of jobs as the top level workflow.
+
+Usage: generate.py [options] <submit dir> <number of jobs>
+"""
+
+import os
+import time
+import uuid
+import optparse
+
+INVOCATION = """<invocation xmlns="http://pegasus.isi.edu/schema/invocation" version="2.1" start="%(start)s" duration="1.000" transformation="synthetic::keg:1.0" derivation="%(derivation)s" resource="local" hostaddr="127.0.0.1" hostname="localhost" pid="1000" uid="1000" user="pegasus" gid="1000" group="pegasus" umask="0022">
+  <mainjob start="%(start)s" duration="1.000" pid="1001">
+    <usage utime="0.500" stime="0.100" maxrss="1024" minflt="100" majflt="0" nswap="0" inblock="0" outblock="0" msgsnd="0" msgrcv="0" nsignals="0" nvcsw="1" nivcsw="1"/>
+    <status raw="0"><regular exitcode="0"/></status>
+    <statcall error="0">
+      <file name="/bin/true"/>
+      <statinfo mode="0100755" size="27168" inode="1" nlink="1" blksize="4096" blocks="56" mtime="%(start)s" atime="%(start)s" ctime="%(start)s" uid="0" user="root" gid="0" group="root"/>
+    </statcall>
+    <argument-vector>
+      <arg nr="1">-i</arg>
+      <arg nr="2">f.a</arg>
+    </argument-vector>
+  </mainjob>
+  <cwd>/tmp</cwd>
+  <usage utime="0.010" stime="0.010" maxrss="1024" minflt="100" majflt="0" nswap="0" inblock="0" outblock="0" msgsnd="0" msgrcv="0" nsignals="0" nvcsw="1" nivcsw="1"/>
+  <statcall error="0" id="stdout">
+    <temporary name="/tmp/ks.out.000001" descriptor="3"/>
+    <statinfo mode="0100600" size="6" inode="2" nlink="1" blksize="4096" blocks="8" mtime="%(start)s" atime="%(start)s" ctime="%(start)s" uid="1000" user="pegasus" gid="1000" group="pegasus"/>
+    <data>hello
+</data>
+  </statcall>
+  <statcall error="0" id="stderr">
+    <temporary name="/tmp/ks.err.000001" descriptor="4"/>
+    <statinfo mode="0100600" size="0" inode="3" nlink="1" blksize="4096" blocks="0" mtime="%(start)s" atime="%(start)s" ctime="%(start)s" uid="1000" user="pegasus" gid="1000" group="pegasus"/>
+  </statcall>
+</invocation>
+"""
+
+def iso(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts)) + ".000+00:00"
+
+def stamp(ts):
+    return time.strftime("%m/%d/%y %H:%M:%S", time.localtime(ts))
+
+def write_kickstart(filename, ts, derivation, cluster_size):
+    """
+    Writes a kickstart output file. Clustered jobs get one invocation
+    record per task, surrounded by the seqexec task and summary records.
+    """
+    out = open(filename, "w")
+    out.write('<?xml version="1.0" encoding="ISO-8859-1"?>\n')
+    if cluster_size <= 1:
+        out.write(INVOCATION % {"start": iso(ts), "derivation": derivation})
+    else:
+        for task in range(1, cluster_size + 1):
+            out.write('[cluster-task id=%d, start="%s", duration=1.000, status=0, app="/bin/true", '
+                      'hostname="localhost", slot=1, cpus=1, memory=0]\n' % (task, iso(ts)))
+            out.write(INVOCATION % {"start": iso(ts), "derivation": "%s_%d" % (derivation, task)})
+        out.write('[cluster-summary stat="ok", lines=%d, tasks=%d, succeeded=%d, failed=0, extra=0, '
+                  'start="%s", duration=%d.000, pid=1000, app="/usr/bin/pegasus-cluster"]\n'
+                  % (cluster_size, cluster_size, cluster_size, iso(ts), cluster_size))
+    out.close()
+
+def generate(submit_dir, n_jobs, cluster_size=1, depth=0, level=0, root_uuid=None, now=None):
+    """
+    Generates the submit directory for one workflow, and recursively for
+    its sub-workflows. Returns the list of dagman.out files generated.
+    """
+    if not os.path.isdir(submit_dir):
+        os.makedirs(submit_dir)
+
+    wf_uuid = str(uuid.uuid4())
+    if root_uuid is None:
+        root_uuid = wf_uuid
+    if now is None:
+        now = int(time.time())
+
+    name = "synthetic-%d" % level
+    dag_file = os.path.join(submit_dir, name + ".dag")
+    dagman_out = dag_file + ".dagman.out"
+
+    # compute jobs, plus a job planning and running the next sub-workflow
+    jobs = ["job_%d" % i for i in range(n_jobs)]
+    subwf_job = None
+    if level < depth:
+        subwf_job = "subdax_synthetic_%d" % (level + 1)
+        jobs.append(subwf_job)
+
+    # braindump file
+    braindump = open(os.path.join(submit_dir, "braindump.txt"), "w")
+    braindump.write("wf_uuid %s\n" % wf_uuid)
+    braindump.write("root_wf_uuid %s\n" % root_uuid)
+    braindump.write("dax_label synthetic\n")
+    braindump.write("dax_index %d\n" % level)
+    braindump.write("dax_version 3.6\n")
+    braindump.write("dax %s\n" % os.path.join(submit_dir, "synthetic.dax"))
+    braindump.write("dag %s\n" % os.path.basename(dag_file))
+    braindump.write("submit_dir %s\n" % submit_dir)
+    braindump.write("timestamp %s\n" % time.strftime("%Y%m%dT%H%M%S%z", time.localtime(now)))
+    braindump.write("planner_version 4.7.0\n")
+    braindump.write("planner_arguments \"--dax synthetic.dax\"\n")
+    braindump.write("user pegasus\n")
+    braindump.write("submit_hostname localhost\n")
+    braindump.write("grid_dn null\n")
+    braindump.close()
+
+    # static events, so that jobs are in the database before they run
+    static_bp = open(os.path.join(submit_dir, name + ".static.bp"), "w")
+    ts = time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", time.gmtime(now))
+    static_bp.write("ts=%s event=static.start level=Info xwf.id=%s\n" % (ts, wf_uuid))
+    for job in jobs:
+        if job == subwf_job:
+            job_type, type_desc, clustered, task_count = 10, "dax", 0, 0
+        else:
+            job_type, type_desc = 1, "compute"
+            clustered = int(cluster_size > 1)
+            task_count = cluster_size if cluster_size > 1 else 0
+        static_bp.write("ts=%s event=job.info level=Info executable=/bin/true type_desc=%s argv=\"-i f.a\" "
+                        "clustered=%d max_retries=3 task_count=%d job.id=%s submit_file=%s.sub type=%d xwf.id=%s\n"
+                        % (ts, type_desc, clustered, task_count, job, job, job_type, wf_uuid))
+    static_bp.write("ts=%s event=static.end level=Info xwf.id=%s\n" % (ts, wf_uuid))
+    static_bp.close()
+
+    # dag file, all jobs are independent
+    dag = open(dag_file, "w")
+    for job in jobs:
+        dag.write("JOB %s %s.sub\n" % (job, job))
+        dag.write("RETRY %s 3\n" % job)
+    dag.close()
+
+    # minimal submit files, so that monitord can pick up job information
+    subwf_dir = None
+    for i, job in enumerate(jobs):
+        sub = open(os.path.join(submit_dir, "%s.sub" % job), "w")
+        sub.write("universe = vanilla\n")
+        sub.write("executable = /bin/true\n")
+        sub.write("arguments = \"-i f.a\"\n")
+        sub.write("+pegasus_site = \"local\"\n")
+        sub.write("+pegasus_wf_xformation = \"synthetic::keg:1.0\"\n")
+        sub.write("+pegasus_wf_dax_job_id = \"ID%07d\"\n" % i)
+        if job == subwf_job:
+            # monitord follows the sub-workflow in the first retry directory
+            subwf_dir = os.path.join(submit_dir, "synthetic-%d" % (level + 1))
+            sub.write("environment = \"_CONDOR_DAGMAN_LOG=%s\"\n"
+                      % os.path.join(subwf_dir, "synthetic-%d.dag.dagman.out" % (level + 1)))
+        sub.write("output = %s.out\n" % job)
+        sub.write("error = %s.err\n" % job)
+        sub.write("queue\n")
+        sub.close()
+
+        write_kickstart(os.path.join(submit_dir, "%s.out" % job), now + i, "ID%07d" % i,
+                        1 if job == subwf_job else cluster_size)
+
+    # dagman.out file, every job goes through submit, execute and termination
+    out = open(dagman_out, "w")
+
+    out.write("%s ******************************************************\n" % stamp(now))
+    out.write("%s ** condor_scheduniv_exec.1.0 (CONDOR_DAGMAN) STARTING UP\n" % stamp(now))
+    out.write("%s ** PID = 1\n" % stamp(now))
+    out.write("%s Parsing 1 dagfiles\n" % stamp(now))
+    out.write("%s Parsing %s ...\n" % (stamp(now), dag_file))
+    out.write("%s Dag contains %d total jobs\n" % (stamp(now), len(jobs)))
+
+    for i, job in enumerate(jobs):
+        ts = now + i
+        cluster = "(%d.0.0)" % (i + 2)
+        out.write("%s Submitting HTCondor Node %s job(s)...\n" % (stamp(ts), job))
+        out.write("%s Adding a DAGMan workflow log /tmp/synthetic.log\n" % stamp(ts))
+        out.write("%s Masking the events recorded in the DAGMAN workflow log\n" % stamp(ts))
+        out.write("%s submitting: /usr/bin/condor_submit -a dag_node_name' '=' '%s %s.sub\n" % (stamp(ts), job, job))
+        out.write("%s From submit: Submitting job(s).\n" % stamp(ts))
+        out.write("%s From submit: 1 job(s) submitted to cluster %d.\n" % (stamp(ts), i + 2))
+        out.write("%s 	assigned HTCondor ID %s\n" % (stamp(ts), cluster))
+        out.write("%s Just submitted 1 job this cycle...\n" % stamp(ts))
+        out.write("%s Event: ULOG_SUBMIT for HTCondor Node %s %s {%s}\n" % (stamp(ts), job, cluster, stamp(ts)))
+        out.write("%s Number of idle job procs: 1\n" % stamp(ts))
+        out.write("%s Event: ULOG_EXECUTE for HTCondor Node %s %s {%s}\n" % (stamp(ts), job, cluster, stamp(ts)))
+        out.write("%s Number of idle job procs: 0\n" % stamp(ts))
+        out.write("%s Event: ULOG_JOB_TERMINATED for HTCondor Node %s %s {%s}\n" % (stamp(ts), job, cluster, stamp(ts)))
+        out.write("%s Node %s job proc %s completed successfully.\n" % (stamp(ts), job, cluster))
+        out.write("%s Node %s job completed\n" % (stamp(ts), job))
+        out.write("%s DAG status: 0 (DAG_STATUS_OK)\n" % stamp(ts))
+
+    ts = now + len(jobs)
+    out.write("%s All jobs Completed!\n" % stamp(ts))
+    out.write("%s **** condor_scheduniv_exec.1.0 (condor_DAGMAN) pid 1 EXITING WITH STATUS 0\n" % stamp(ts))
+    out.close()
+
+    dagman_outs = [dagman_out]
+    if subwf_job is not None:
+        dagman_outs.extend(generate(subwf_dir + ".000", n_jobs, cluster_size, depth, level + 1, root_uuid, now))
+
+    return dagman_outs
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] <submit dir> <number of jobs>")
+    parser.add_option("-c", "--cluster-size", action="store", type="int", dest="cluster_size", default=1,
+                      help="number of tasks in each job, 1 disables clustering, default is %default")
+    parser.add_option("-d", "--depth", action="store", type="int", dest="depth", default=0,
+                      help="number of nested sub-workflows, each with the same number of jobs, default is %default")
+    (options, args) = parser.parse_args()
+
+    if len(args) != 2:
+        parser.error("a submit directory and a number of jobs are required")
+
+    generate(os.path.abspath(args[0]), int(args[1]), options.cluster_size, options.depth)
+
+if __name__ == "__main__":
+    main()
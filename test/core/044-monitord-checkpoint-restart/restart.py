@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+Checks that pegasus-monitord resumes from its checkpoint after being
+stopped, instead of reading the dagman.out file again from the
+beginning.
+
+A synthetic workflow (see 043-monitord-replay-performance) is followed
+by pegasus-monitord while DAGMan has only written the first half of the
+dagman.out file. pegasus-monitord is then stopped with SIGTERM, the
+rest of the dagman.out file is written, and a new pegasus-monitord is
+started. The new instance has to seek to where the first one stopped,
+and every job has to end up in the jobstate.log file exactly once.
+
+Usage: restart.py [options] <number of jobs>
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import signal
+import optparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "043-monitord-replay-performance"))
+import generate
+
+TIMEOUT = 120
+
+def wait_for(condition, timeout=TIMEOUT):
+    """
+    Waits until condition() returns True, or the timeout expires.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.5)
+    return False
+
+def read_file(filename):
+    if not os.path.exists(filename):
+        return ""
+    f = open(filename)
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+def start_monitord(monitord, submit_dir, work_dir, dagman_out, name):
+    conf = os.path.join(work_dir, "monitord.properties")
+    f = open(conf, "w")
+    f.write("pegasus.dashboard.output=sqlite:///%s\n" % os.path.join(work_dir, "dashboard.db"))
+    f.close()
+
+    cmd = [monitord, "-v", "--no-notifications", "--conf", conf,
+           "-d", "sqlite:///" + os.path.join(work_dir, "stampede.db"), dagman_out]
+    log_file = os.path.join(work_dir, "%s.log" % name)
+    log = open(log_file, "w")
+    p = subprocess.Popen(cmd, cwd=submit_dir, stdout=log, stderr=subprocess.STDOUT)
+    log.close()
+    return p, log_file
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] <number of jobs>")
+    parser.add_option("-m", "--monitord", action="store", dest="monitord", default="pegasus-monitord",
+                      help="pegasus-monitord to test, default is the one in the PATH")
+    parser.add_option("-w", "--work-dir", action="store", dest="work_dir",
+                      help="directory for the synthetic workflow and outputs, default is a temporary one which is removed at the end")
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("the number of jobs is required")
+    n_jobs = int(args[0])
+
+    work_dir = options.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="monitord-restart-")
+    work_dir = os.path.abspath(work_dir)
+    submit_dir = os.path.join(work_dir, "submit")
+    keep_work_dir = options.work_dir is not None
+
+    try:
+        if os.path.exists(submit_dir):
+            shutil.rmtree(submit_dir)
+        dagman_out = generate.generate(submit_dir, n_jobs)[0]
+        jobstate_log = os.path.join(submit_dir, "jobstate.log")
+        checkpoint_file = os.path.join(submit_dir, "monitord.checkpoint")
+
+        # DAGMan is us, so that pegasus-monitord sees it alive. The
+        # dagman.out file is cut at the job in the middle of the workflow
+        content = read_file(dagman_out).replace("** PID = 1\n", "** PID = %d\n" % os.getpid())
+        half = content.index("Submitting HTCondor Node job_%d " % (n_jobs / 2))
+        half = content.rindex("\n", 0, half) + 1
+        f = open(dagman_out, "w")
+        f.write(content[:half])
+        f.close()
+
+        # Follow the first half, and stop once it has caught up
+        p, first_log = start_monitord(options.monitord, submit_dir, work_dir, dagman_out, "first")
+        last_job = re.compile(r" job_%d JOB_SUCCESS " % (n_jobs / 2 - 1))
+        if not wait_for(lambda: last_job.search(read_file(jobstate_log))):
+            p.kill()
+            sys.stderr.write("Error: pegasus-monitord did not process the first half of the dagman.out file\n")
+            return 1
+        os.kill(p.pid, signal.SIGTERM)
+        p.wait()
+        if not os.path.exists(checkpoint_file):
+            sys.stderr.write("Error: pegasus-monitord did not leave a checkpoint behind when stopped\n")
+            return 1
+
+        # DAGMan goes on, and a new pegasus-monitord picks it up
+        f = open(dagman_out, "a")
+        f.write(content[half:])
+        f.close()
+        p, second_log = start_monitord(options.monitord, submit_dir, work_dir, dagman_out, "second")
+        if not wait_for(lambda: p.poll() is not None):
+            p.kill()
+            sys.stderr.write("Error: pegasus-monitord did not finish the workflow\n")
+            return 1
+
+        resumed = re.search(r"resuming \S+ from byte (\d+)", read_file(second_log))
+        if resumed is None or int(resumed.group(1)) != half:
+            sys.stderr.write("Error: pegasus-monitord did not resume from byte %d, see %s\n" % (half, second_log))
+            return 1
+
+        jobstate = read_file(jobstate_log)
+        for i in range(n_jobs):
+            count = len(re.findall(r" job_%d JOB_SUCCESS " % i, jobstate))
+            if count != 1:
+                sys.stderr.write("Error: job_%d succeeded %d time(s) in %s\n" % (i, count, jobstate_log))
+                return 1
+
+        sys.stderr.write("pegasus-monitord resumed from byte %d of %d\n" % (half, len(content)))
+        return 0
+    finally:
+        if not keep_work_dir:
+            shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    sys.exit(main())